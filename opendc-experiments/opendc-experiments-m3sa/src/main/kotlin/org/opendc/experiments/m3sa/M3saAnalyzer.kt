@@ -22,7 +22,19 @@
 
 package org.opendc.experiments.m3sa
 
+import kotlinx.serialization.json.Json
+import kotlinx.serialization.json.buildJsonObject
+import kotlinx.serialization.json.jsonObject
+import kotlinx.serialization.json.jsonPrimitive
+import kotlinx.serialization.json.put
+import java.io.IOException
+import java.net.StandardProtocolFamily
+import java.net.UnixDomainSocketAddress
+import java.nio.channels.Channels
+import java.nio.channels.SocketChannel
+import java.util.concurrent.atomic.AtomicLong
 import kotlin.io.path.Path
+import kotlin.io.path.exists
 
 /**
  * This constant variable should be changed depending on the root folder that is being run.
@@ -32,16 +44,38 @@ import kotlin.io.path.Path
 public val ANALYSIS_SCRIPTS_DIRECTORY: String = "./opendc-experiments/opendc-experiments-m3sa/src/main/python"
 public val ABSOLUTE_SCRIPT_PATH: String =
     Path("$ANALYSIS_SCRIPTS_DIRECTORY/main.py").toAbsolutePath().normalize().toString()
+public val ABSOLUTE_WATCH_SCRIPT_PATH: String =
+    Path("$ANALYSIS_SCRIPTS_DIRECTORY/watch.py").toAbsolutePath().normalize().toString()
 public val SCRIPT_LANGUAGE: String = Path("$ANALYSIS_SCRIPTS_DIRECTORY/venv/bin/python3").toAbsolutePath().normalize().toString()
 
+/**
+ * The project root, against which the analysis resolves its paths; passed explicitly, such that the script does not
+ * search for it.
+ */
+public val PROJECT_ROOT: String = Path("").toAbsolutePath().normalize().toString()
+
+/**
+ * The Unix domain socket of the M3SA analysis server (server.py), started with `python server.py` from the
+ * [ANALYSIS_SCRIPTS_DIRECTORY]. When it runs, analyses are submitted to it instead of starting a new Python process.
+ */
+public val SERVER_SOCKET_PATH: String = Path("$ANALYSIS_SCRIPTS_DIRECTORY/m3sa.sock").toAbsolutePath().normalize().toString()
+
+private val requestIds = AtomicLong()
+
 public fun m3saAnalyze(
     outputFolderPath: String,
     m3saSetupPath: String,
 ) {
+    if (m3saAnalyzeOnServer(outputFolderPath, m3saSetupPath)) {
+        return
+    }
+
     val process =
         ProcessBuilder(
             SCRIPT_LANGUAGE,
             ABSOLUTE_SCRIPT_PATH,
+            "--root",
+            PROJECT_ROOT,
             outputFolderPath,
             m3saSetupPath,
         ).directory(Path(ANALYSIS_SCRIPTS_DIRECTORY).toFile())
@@ -55,3 +89,101 @@ public fun m3saAnalyze(
         println("[M3SA says] Exit code $exitCode; Error(s): $errors")
     }
 }
+
+/**
+ * Submits an analysis to the M3SA analysis server, which keeps the Python libraries and the recently loaded models in
+ * memory across analyses, and waits for it to complete.
+ *
+ * @param outputFolderPath The path of the simulation output, relative to the project root.
+ * @param m3saSetupPath The path of the M3SA setup file, relative to the project root.
+ * @param socketPath The path of the server's socket.
+ * @return `false` if no server listens on [socketPath], such that the caller runs the analysis in a new process;
+ * `true` once the server has answered.
+ */
+public fun m3saAnalyzeOnServer(
+    outputFolderPath: String,
+    m3saSetupPath: String,
+    socketPath: String = SERVER_SOCKET_PATH,
+): Boolean {
+    val socketFile = Path(socketPath)
+    if (!socketFile.exists()) {
+        return false
+    }
+
+    val channel =
+        try {
+            SocketChannel.open(StandardProtocolFamily.UNIX).apply { connect(UnixDomainSocketAddress.of(socketFile)) }
+        } catch (e: IOException) {
+            println("[M3SA says] M3SA server at $socketPath unreachable (${e.message}); analyzing in a new process.")
+            return false
+        }
+
+    val request =
+        buildJsonObject {
+            put("jsonrpc", "2.0")
+            put("id", requestIds.incrementAndGet())
+            put("method", "analyze")
+            put(
+                "params",
+                buildJsonObject {
+                    put("output_folder_path", outputFolderPath)
+                    put("setup_path", m3saSetupPath)
+                },
+            )
+        }
+
+    val answer =
+        channel.use {
+            val writer = Channels.newWriter(channel, Charsets.UTF_8)
+            writer.write("$request\n")
+            writer.flush()
+            Channels.newReader(channel, Charsets.UTF_8).buffered().readLine()
+        } ?: return false
+
+    val error = Json.parseToJsonElement(answer).jsonObject["error"]
+    if (error == null) {
+        println("[M3SA says] M3SA operation(s) completed successfully.")
+    } else {
+        println("[M3SA says] Error(s): ${error.jsonObject["message"]?.jsonPrimitive?.content}")
+    }
+    return true
+}
+
+/**
+ * Starts the M3SA watch mode (watch.py), which analyzes the models of the simulation output as the simulations finish,
+ * and refreshes the analysis artifacts on a throttled schedule. The watcher runs until [m3saStopWatch] is called.
+ *
+ * @param outputFolderPath The path of the simulation output, relative to the project root.
+ * @param m3saSetupPath The path of the M3SA setup file, relative to the project root.
+ * @return The process of the watcher.
+ */
+public fun m3saWatch(
+    outputFolderPath: String,
+    m3saSetupPath: String,
+): Process =
+    ProcessBuilder(
+        SCRIPT_LANGUAGE,
+        ABSOLUTE_WATCH_SCRIPT_PATH,
+        "--root",
+        PROJECT_ROOT,
+        outputFolderPath,
+        m3saSetupPath,
+    ).directory(Path(ANALYSIS_SCRIPTS_DIRECTORY).toFile())
+        .inheritIO()
+        .start()
+
+/**
+ * Stops the M3SA watch mode once the simulations are done: the watcher is terminated (SIGTERM), upon which it reads the
+ * remaining simulation output and refreshes the analysis artifacts one last time, and is waited for.
+ *
+ * @param process The process of the watcher, as started by [m3saWatch].
+ */
+public fun m3saStopWatch(process: Process) {
+    process.destroy()
+    val exitCode = process.waitFor()
+    if (exitCode == 0) {
+        println("[M3SA says] M3SA operation(s) completed successfully.")
+    } else {
+        println("[M3SA says] Exit code $exitCode; see the error(s) above.")
+    }
+}
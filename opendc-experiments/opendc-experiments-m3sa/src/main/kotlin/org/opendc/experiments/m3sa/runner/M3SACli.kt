@@ -27,12 +27,15 @@ package org.opendc.experiments.m3sa.runner
 import com.github.ajalt.clikt.core.CliktCommand
 import com.github.ajalt.clikt.parameters.options.default
 import com.github.ajalt.clikt.parameters.options.defaultLazy
+import com.github.ajalt.clikt.parameters.options.flag
 import com.github.ajalt.clikt.parameters.options.option
 import com.github.ajalt.clikt.parameters.types.file
 import com.github.ajalt.clikt.parameters.types.int
 import org.opendc.experiments.base.runner.runExperiment
 import org.opendc.experiments.base.scenario.getExperiment
 import org.opendc.experiments.m3sa.m3saAnalyze
+import org.opendc.experiments.m3sa.m3saStopWatch
+import org.opendc.experiments.m3sa.m3saWatch
 import org.opendc.experiments.m3sa.scenario.getOutputFolder
 import java.io.File
 
@@ -63,13 +66,29 @@ internal class M3SACommand : CliktCommand(name = "experiment") {
         .file(canBeDir = false, canBeFile = true)
         .defaultLazy { File("") }
 
+    /**
+     * Whether to analyze the models while the simulations run, as each of them finishes (see watch.py).
+     */
+    private val watch by option("-w", "--watch", help = "analyze the models as the simulations finish").flag()
+
     override fun run() {
         println("The provided m3saPath is $m3saPath")
 
         val experiment = getExperiment(scenarioPath)
+        val watcher =
+            if (watch && m3saPath.toString().isNotEmpty()) {
+                m3saWatch(
+                    outputFolderPath = getOutputFolder(scenarioPath),
+                    m3saSetupPath = m3saPath.toString(),
+                )
+            } else {
+                null
+            }
         runExperiment(experiment, parallelism)
 
-        if (m3saPath.toString().isNotEmpty()) {
+        if (watcher != null) {
+            m3saStopWatch(watcher)
+        } else if (m3saPath.toString().isNotEmpty()) {
             m3saAnalyze(
                 outputFolderPath = getOutputFolder(scenarioPath),
                 m3saSetupPath = m3saPath.toString(),
@@ -1,6 +1,10 @@
 import numpy as np
+import pandas as pd
+
+from alignment import align
 
 from models.MetaModel import MetaModel
+from models.MultiModel import is_meta_model
 
 
 def accuracy_evaluator(
@@ -9,69 +13,134 @@ def accuracy_evaluator(
     compute_mape=True,
     compute_nad=True,
     compute_rmsle=True,
+    compute_mae=True,
+    compute_rmse=True,
     rmsle_hyperparameter=0.5,
-    only_metamodel=False
+    only_metamodel=False,
+    table_format="csv",
+    real_timestamps=None
 ):
     """
     :param real_data: the real-world data of the simulation
-    :param multi_model: the Multi-Model, containing individual models (possibly also a Meta-Model, with id=101)
-    :param MAPE: whether to calculate Mean Absolute Percentage Error (MAPE)
-    :param NAD: whether to calculate Normalized Absolute Differences (NAD)
-    :param RMSLE: whether to calculate Root Mean Square Logarithmic Error (RMSLE)
+    :param multi_model: the Multi-Model, containing individual models (possibly also a Meta-Model, with id=-101). If
+        the Meta-Model is missing, it is computed (but not plotted) from the Multi-Model.
+    :param compute_mape: whether to calculate Mean Absolute Percentage Error (MAPE)
+    :param compute_nad: whether to calculate Normalized Absolute Differences (NAD)
+    :param compute_rmsle: whether to calculate Root Mean Square Logarithmic Error (RMSLE)
+    :param compute_mae: whether to calculate Mean Absolute Error (MAE)
+    :param compute_rmse: whether to calculate Root Mean Square Error (RMSE)
     :param rmsle_hyperparameter: the hyperparameter that balances the ration underestimations:overestimations
         - default is 0.5 (balanced penalty)
         - < 0.5: more penalty for overestimations
         - > 0.5: more penalty for underestimations
         e.g., RMSLE_hyperparameter=0.3 -> 30% penalty for overestimations, 70% penalty for underestimations (3:7 ratio)
-    :return: None, but prints the accuracy metrics
+    :param only_metamodel: whether to evaluate only the Meta-Model
+    :param table_format: the format of the machine-readable report, either 'csv' or 'parquet'
+    :param real_timestamps: the simulation timestamps of the real-world samples, if known; the real-world data is then
+        aligned on the models' timestamps (see alignment.py), instead of sample by sample
+    :return: pd.DataFrame: the accuracy metrics, with one row per evaluated model; also written to the text report
+        (accuracy_report.txt) and to the machine-readable report (accuracy_report.csv or accuracy_report.parquet)
+    """
+
+    models = [model for model in multi_model.models if not is_meta_model(model)]
+    meta_models = [model for model in multi_model.models if is_meta_model(model)]
+    if meta_models:
+        models.append(meta_models[0])
+    else:
+        models.append(MetaModel(multimodel=multi_model).meta_model)
+
+    if only_metamodel:
+        models = models[-1:]
+
+    if real_timestamps is not None:
+        real_data = align(np.asarray(real_data, dtype=np.float64), np.asarray(real_timestamps),
+                          multi_model.timestamps, fill_value=np.nan)
+    real_data, simulation_data = truncate_to_common_length(real_data, [model.raw_sim_data for model in models])
+
+    metrics = {
+        "model": [model.id for model in models],
+        "samples": np.count_nonzero(~np.isnan(simulation_data), axis=1),
+    }
+    if compute_mape:
+        metrics["mape"] = mape(real_data=real_data, simulation_data=simulation_data)
+    if compute_nad:
+        metrics["nad"] = nad(real_data=real_data, simulation_data=simulation_data)
+    if compute_rmsle:
+        metrics["rmsle"] = rmsle(real_data=real_data, simulation_data=simulation_data, alpha=rmsle_hyperparameter)
+    if compute_mae:
+        metrics["mae"] = mae(real_data=real_data, simulation_data=simulation_data)
+    if compute_rmse:
+        metrics["rmse"] = rmse(real_data=real_data, simulation_data=simulation_data)
+    report = pd.DataFrame(metrics)
+
+    write_text_report(report, multi_model, rmsle_hyperparameter)
+    if table_format == "parquet":
+        report.to_parquet(multi_model.output_folder_path + "/accuracy_report.parquet", index=False)
+    elif table_format == "csv":
+        report.to_csv(multi_model.output_folder_path + "/accuracy_report.csv", index=False)
+    else:
+        raise ValueError("Table format not recognized. Please select between 'csv' and 'parquet'.")
+
+    return report
+
+
+def truncate_to_common_length(real_data, simulations):
+    """
+    Truncates the real-world data and the simulations to their common length, sample by sample, once for all
+    simulations; the samples are positions on the models' timestamp axis (see alignment.py), on which the simulations,
+    and the real-world data if its timestamps are given, are already aligned. Each simulation is evaluated over the
+    samples it shares with the real-world data; the samples past its end are NaN, and are ignored by the (NaN-aware)
+    metrics.
+
+    :param real_data: Array of real values
+    :param simulations: List of arrays of simulated values, one per model
+    :return: tuple: the truncated real values, and the (models x samples) matrix of simulated values
     """
+    real_data = np.asarray(real_data, dtype=np.float64)
+    length = min(len(real_data), max(len(simulation) for simulation in simulations))
 
-    meta_model = MetaModel(multimodel=multi_model)
-    multi_model.models.append(meta_model.meta_model)  # metamodel
-    # multi_model.models.append(Model(raw_host_data=real_data, id=-1, path=None))  # real-world data
+    simulation_data = np.full((len(simulations), length), np.nan)
+    for row, simulation in enumerate(simulations):
+        samples = min(length, len(simulation))
+        simulation_data[row, :samples] = simulation[:samples]
 
+    return real_data[:length], simulation_data
+
+
+def write_text_report(report, multi_model, rmsle_hyperparameter):
+    """
+    Appends the accuracy metrics to the human-readable accuracy report.
+
+    :param report: DataFrame of accuracy metrics, with one row per model
+    :param multi_model: the Multi-Model, whose output folder holds the report
+    :param rmsle_hyperparameter: the alpha used for RMSLE
+    :return: None
+    """
     with open(multi_model.output_folder_path + "/accuracy_report.txt", "a") as f:
         f.write("====================================\n")
         f.write("Accuracy Report, against ground truth\n")
 
-        for model in multi_model.models:
-            if only_metamodel and model.id != 101:
-                continue
-
-            if model.id == -1:
+        for row in report.itertuples(index=False):
+            if row.model == -1:
                 f.write("Real-World data")
-            elif model.id == 101:
+            elif row.model == MetaModel.META_MODEL_ID:
                 f.write(
-                    f"Meta-Model, meta-function: {multi_model.user_input['meta_function']}, window_size: {meta_model.multi_model.window_size}")
+                    f"Meta-Model, meta-function: {multi_model.user_input['meta_function']}, window_size: {multi_model.window_size}")
             else:
-                f.write(f"Model {model.id}")
-
-            simulation_data = model.raw_sim_data
-            min_len = min(len(real_data), len(simulation_data))
-            real_data = real_data[:min_len]
-            simulation_data = simulation_data[:min_len]
-            if compute_mape:
-                accuracy_mape = mape(
-                    real_data=real_data,
-                    simulation_data=simulation_data
-                )
-                f.write(f"\nMean Absolute Percentage Error (MAPE): {accuracy_mape}%")
-
-            if compute_nad:
-                accuracy_nad = nad(
-                    real_data=real_data,
-                    simulation_data=simulation_data
-                )
-                f.write(f"\nNormalized Absolute Differences (NAD): {accuracy_nad}%")
-
-            if compute_rmsle:
-                accuracy_rmsle = rmsle(
-                    real_data=real_data,
-                    simulation_data=simulation_data,
-                    alpha=rmsle_hyperparameter
-                )
+                f.write(f"Model {row.model}")
+
+            if "mape" in report:
+                f.write(f"\nMean Absolute Percentage Error (MAPE): {row.mape}%")
+            if "nad" in report:
+                f.write(f"\nNormalized Absolute Differences (NAD): {row.nad}%")
+            if "mae" in report:
+                f.write(f"\nMean Absolute Error (MAE): {row.mae}")
+            if "rmse" in report:
+                f.write(f"\nRoot Mean Square Error (RMSE): {row.rmse}")
+            if "rmsle" in report:
                 f.write(
-                    f"\nRoot Mean Square Logarithmic Error (RMSLE), alpha={rmsle_hyperparameter}:{accuracy_rmsle}\n\n")
+                    f"\nRoot Mean Square Logarithmic Error (RMSLE), alpha={rmsle_hyperparameter}:{row.rmsle}")
+            f.write("\n\n")
 
         f.write("====================================\n")
 
@@ -80,35 +149,62 @@ def mape(real_data, simulation_data):
     """
     Calculate Mean Absolute Percentage Error (MAPE)
     :param real_data: Array of real values
-    :param simulation_data: Array of simulated values
-    :return: MAPE value
+    :param simulation_data: Array of simulated values, or (models x samples) matrix; NaN samples are ignored
+    :return: MAPE value, one per model
     """
-    real_data = np.array(real_data)
-    simulation_data = np.array(simulation_data)
-    return round(np.mean(np.abs((real_data - simulation_data) / real_data)) * 100, 3)
+    real_data = np.asarray(real_data)
+    simulation_data = np.asarray(simulation_data)
+    return np.round(np.nanmean(np.abs((real_data - simulation_data) / real_data), axis=-1) * 100, 3)
 
 
 def nad(real_data, simulation_data):
     """
     Calculate Normalized Absolute Differences (NAD)
     :param real_data: Array of real values
-    :param simulation_data: Array of simulated values
-    :return: NAD value
+    :param simulation_data: Array of simulated values, or (models x samples) matrix; NaN samples are ignored
+    :return: NAD value, one per model
     """
-    real_data = np.array(real_data)
-    simulation_data = np.array(simulation_data)
-    return round(np.sum(np.abs(real_data - simulation_data)) / np.sum(real_data) * 100, 3)
+    real_data = np.asarray(real_data)
+    simulation_data = np.asarray(simulation_data)
+    compared_real_data = np.where(np.isnan(simulation_data), np.nan, real_data)
+    return np.round(
+        np.nansum(np.abs(real_data - simulation_data), axis=-1) / np.nansum(compared_real_data, axis=-1) * 100, 3
+    )
 
 
 def rmsle(real_data, simulation_data, alpha=0.5):
     """
     Calculate Root Mean Square Logarithmic Error (RMSLE) with an adjustable alpha parameter
     :param real_data: Array of real values
-    :param simulation_data: Array of simulated values
+    :param simulation_data: Array of simulated values, or (models x samples) matrix; NaN samples are ignored
     :param alpha: Hyperparameter that balances the penalty between underestimations and overestimations
-    :return: RMSLE value
+    :return: RMSLE value, one per model
     """
-    real_data = np.array(real_data)
-    simulation_data = np.array(simulation_data)
+    real_data = np.asarray(real_data)
+    simulation_data = np.asarray(simulation_data)
     log_diff = alpha * np.log(real_data) - (1 - alpha) * np.log(simulation_data)
-    return round(np.sqrt(np.mean(log_diff ** 2)) * 100, 3)
+    return np.round(np.sqrt(np.nanmean(log_diff ** 2, axis=-1)) * 100, 3)
+
+
+def mae(real_data, simulation_data):
+    """
+    Calculate Mean Absolute Error (MAE)
+    :param real_data: Array of real values
+    :param simulation_data: Array of simulated values, or (models x samples) matrix; NaN samples are ignored
+    :return: MAE value, one per model
+    """
+    real_data = np.asarray(real_data)
+    simulation_data = np.asarray(simulation_data)
+    return np.round(np.nanmean(np.abs(real_data - simulation_data), axis=-1), 3)
+
+
+def rmse(real_data, simulation_data):
+    """
+    Calculate Root Mean Square Error (RMSE)
+    :param real_data: Array of real values
+    :param simulation_data: Array of simulated values, or (models x samples) matrix; NaN samples are ignored
+    :return: RMSE value, one per model
+    """
+    real_data = np.asarray(real_data)
+    simulation_data = np.asarray(simulation_data)
+    return np.round(np.sqrt(np.nanmean((real_data - simulation_data) ** 2, axis=-1)), 3)
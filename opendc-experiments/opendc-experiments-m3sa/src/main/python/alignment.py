@@ -0,0 +1,121 @@
+import hashlib
+
+import numpy as np
+
+from constants import MODEL_ALIGNMENTS
+
+"""
+Timestamp alignment of the models. Each simulation data file is reduced to one value per timestamp (see ingestion.py),
+and the models are stacked on their timestamps, rather than truncated to the shortest model sample by sample: a model
+which starts later, ends earlier, or misses samples in between, is placed at the positions of its own timestamps on a
+timestamp axis common to all the models. The common axis is either the intersection of the models' timestamps (the
+timestamps all the models cover) or their union (the 'outer' join, with the samples a model lacks filled in).
+
+The timestamps are sorted, such that the axis is built, and every series placed on it, with vectorized sorted-merge
+operations (binary searches over the axis), and a series already on the axis is placed without searching.
+"""
+
+
+def common_timestamps(timestamps_per_series, alignment="intersect"):
+    """
+    :param timestamps_per_series (list of np.array): The sorted, distinct int64 timestamps of each series.
+    :param alignment (str): 'intersect' for the timestamps of all the series, 'outer' for those of any series.
+    :return: np.array: The sorted int64 timestamps of the common axis; the timestamps of the first series themselves,
+        if all the series have the same timestamps.
+    :raise ValueError: If the alignment is not recognized.
+    """
+    if alignment not in MODEL_ALIGNMENTS:
+        raise ValueError(f"Model alignment not recognized. Please select between {MODEL_ALIGNMENTS}.")
+    if not timestamps_per_series:
+        return np.empty(0, dtype=np.int64)
+
+    first = timestamps_per_series[0]
+    if all(same_timestamps(timestamps, first) for timestamps in timestamps_per_series[1:]):
+        return first
+    if alignment == "outer":
+        return np.unique(np.concatenate(timestamps_per_series))
+
+    common = first
+    for timestamps in timestamps_per_series[1:]:
+        common = np.intersect1d(common, timestamps, assume_unique=True)
+    return common
+
+
+def same_timestamps(timestamps, other):
+    """
+    :param timestamps (np.array): Sorted timestamps.
+    :param other (np.array): Other sorted timestamps.
+    :return: bool: Whether both hold the same timestamps.
+    """
+    return timestamps is other or (len(timestamps) == len(other) and np.array_equal(timestamps, other))
+
+
+def align(series, timestamps, axis_timestamps, fill_value=0.0, out=None):
+    """
+    Places the samples of a series at the positions of their timestamps on a timestamp axis: the positions are found
+    by one binary search over the axis, for all the samples at once. The samples whose timestamp is not on the axis are
+    dropped, and the positions of the axis which the series lacks are filled.
+
+    :param series (np.array): The series, or a (rows x samples) block of series sharing the same timestamps (e.g., the
+        seeds of a model).
+    :param timestamps (np.array): The sorted timestamps of the samples.
+    :param axis_timestamps (np.array): The sorted timestamps of the axis.
+    :param fill_value (float): The value of the positions the series lacks.
+    :param out (np.array): The array in which to place the samples, e.g., the row of a matrix; a new array in the type
+        of the series if None.
+    :return: np.array: The series on the axis, with one sample per timestamp of the axis.
+    """
+    if out is None:
+        out = np.empty(series.shape[:-1] + (len(axis_timestamps),), dtype=series.dtype)
+    if same_timestamps(timestamps, axis_timestamps):
+        out[...] = series
+        return out
+
+    positions = np.searchsorted(axis_timestamps, timestamps)
+    on_axis = positions < len(axis_timestamps)
+    on_axis[on_axis] = axis_timestamps[positions[on_axis]] == timestamps[on_axis]
+    out[...] = fill_value
+    out[..., positions[on_axis]] = series[..., on_axis]
+    return out
+
+
+def stack_aligned(series_per_row, timestamps_per_row, alignment="intersect", fill_value=0.0, dtype=None):
+    """
+    Stacks series into one contiguous matrix, aligned on their common timestamps (see common_timestamps).
+
+    :param series_per_row (list of np.array): The series of each row.
+    :param timestamps_per_row (list of np.array): The sorted timestamps of each series.
+    :param alignment (str): 'intersect' or 'outer'.
+    :param fill_value (float): The value of the timestamps a series lacks, with the 'outer' alignment.
+    :param dtype (type): The type of the matrix; the type of the first series if None.
+    :return: tuple: The timestamps of the common axis, and the (rows x timestamps) matrix.
+    """
+    axis_timestamps = common_timestamps(timestamps_per_row, alignment)
+    dtype = dtype or np.asarray(series_per_row[0]).dtype
+    matrix = np.empty((len(series_per_row), len(axis_timestamps)), dtype=dtype)
+    for row, (series, timestamps) in enumerate(zip(series_per_row, timestamps_per_row)):
+        align(series, timestamps, axis_timestamps, fill_value, out=matrix[row])
+    return axis_timestamps, matrix
+
+
+def sample_range(axis_timestamps, timestamp_min=None, timestamp_max=None):
+    """
+    Resolves a range of simulation time to the range of samples of a timestamp axis, by binary search.
+
+    :param axis_timestamps (np.array): The sorted timestamps of the axis.
+    :param timestamp_min (int): Inclusive lower bound of the time range, or None for no bound.
+    :param timestamp_max (int): Inclusive upper bound of the time range, or None for no bound.
+    :return: tuple: The first sample of the range, and the sample after its last one.
+    """
+    start = 0 if timestamp_min is None else int(np.searchsorted(axis_timestamps, timestamp_min, side="left"))
+    stop = len(axis_timestamps) if timestamp_max is None else int(
+        np.searchsorted(axis_timestamps, timestamp_max, side="right"))
+    return start, max(start, stop)
+
+
+def timestamps_digest(timestamps):
+    """
+    :param timestamps (np.array): The timestamps of an axis.
+    :return: str: The hexadecimal digest of the timestamps, e.g., for the key of a series placed on the axis.
+    """
+    return hashlib.sha1(np.ascontiguousarray(timestamps, dtype=np.int64).tobytes()).hexdigest()
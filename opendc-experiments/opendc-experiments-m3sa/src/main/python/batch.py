@@ -0,0 +1,158 @@
+import copy
+import itertools
+import os
+
+from input_parser import parse_input, read_input
+
+"""
+Batch mode of M3SA. Runs several analysis variants (setup files, or points of a parameter grid) against the same
+simulation output, reading the simulation data only once per group of variants which load the same data.
+"""
+
+SWEEP_KEY = "sweep"
+METRIC_SETTINGS_KEY = "metric_settings"
+
+"""
+The settings which determine the simulation data files read, and the rows read from them. Variants which agree on all
+of them read their metrics in a single pass over the files.
+"""
+SOURCE_KEYS = ["seed", "timestamp_min", "timestamp_max", "model_filters"]
+
+"""
+The settings which determine the loaded (raw) data, aligned on the models' timestamps, and how it is stored: its
+floating-point precision, whether it is memory-mapped (out_of_core), and whether the models keep aggregate pyramids.
+Variants which agree on all of them share the loaded models.
+"""
+INGESTION_KEYS = ["metric", "unit_scaling_magnitude", "model_alignment", "alignment_fill_value", "precision",
+                  "out_of_core", "aggregate_pyramids"] + SOURCE_KEYS
+
+
+def expand_variants(setup_paths, overrides=None):
+    """
+    Reads the setup files and expands them into analysis variants. A setup file may list several metrics; it then
+    expands into one variant per metric, with the settings of the metric's entry in 'metric_settings' (if any) applied
+    over the file's other settings. A setup file may also hold a 'sweep' object, mapping setting names to lists of
+    values; it then expands into one variant per combination of values (the cartesian product), for each metric.
+
+    When the batch holds more than one variant of a metric, each variant is named (after its setup file and swept
+    values), and its plot and Meta-Model files are suffixed with that name, such that no variant overwrites the output
+    of another. The variants of different metrics write to different folders and files, and need no name.
+
+    :param setup_paths (list of str): The paths of the setup files.
+    :param overrides (dict): Settings applied to every variant, over those of the setup files (e.g., from the command
+        line).
+    :return: list of dict: The validated user input of each variant.
+    """
+    variants = []
+    for setup_path in setup_paths:
+        user_input = read_input(setup_path)
+        user_input.update(overrides or {})
+        sweep = user_input.pop(SWEEP_KEY, None) or {}
+        metric_settings = user_input.pop(METRIC_SETTINGS_KEY, None) or {}
+        metrics = user_input["metric"] if isinstance(user_input["metric"], list) else [user_input["metric"]]
+        setup_name = os.path.splitext(os.path.basename(setup_path.strip().strip(',')))[0]
+
+        for metric, values in itertools.product(metrics, itertools.product(*sweep.values())):
+            variant = copy.deepcopy(user_input)
+            variant["metric"] = metric
+            variant.update(copy.deepcopy(metric_settings.get(metric, {})))
+            variant.update(zip(sweep.keys(), values))
+            variant["variant"] = "_".join([setup_name] + [f"{key}={value}" for key, value in zip(sweep.keys(), values)])
+            variants.append(parse_input(variant))
+
+    metrics = [variant["metric"] for variant in variants]
+    if all(metrics.count(metric) == 1 for metric in metrics):
+        for variant in variants:
+            variant["variant"] = ""
+    else:
+        names = [(variant["metric"], variant["variant"]) for variant in variants]
+        for i, variant in enumerate(variants):
+            if names.count((variant["metric"], variant["variant"])) > 1:
+                variant["variant"] += f"_{i}"
+
+    return variants
+
+
+def ingestion_key(user_input):
+    """
+    :param user_input (dict): The user input of a variant.
+    :return: tuple: The values of the settings which determine the loaded data.
+    """
+    return tuple(hashable(user_input[key]) for key in INGESTION_KEYS)
+
+
+def source_key(user_input):
+    """
+    :param user_input (dict): The user input of a variant.
+    :return: tuple: The values of the settings which determine the simulation data files and rows read.
+    """
+    return tuple(hashable(user_input[key]) for key in SOURCE_KEYS)
+
+
+def hashable(value):
+    """
+    :param value: The value of a setting.
+    :return: The value, with a list (e.g., a list of seeds) turned into a tuple, and a dict (e.g., the model filters)
+        into a sorted tuple of its items.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, hashable(item)) for key, item in value.items()))
+    return tuple(value) if isinstance(value, list) else value
+
+
+def run_batch(path, setup_paths, analysis, loaded_models=None, overrides=None):
+    """
+    Runs the analysis for every variant of the setup files. The variants are grouped by the data they load; the first
+    variant of a group reads the simulation data, and the others share its models. The first variant reading from a
+    source (see source_key) also reads, in the same pass over the files, the other metrics of the batch from that
+    source, whose models are not loaded yet; the variants of those metrics then start from the series read.
+
+    With several render workers (the largest 'render_workers' of the variants), the figures of the batch are not
+    rendered one after the other by their analyses, but queued, and rendered at the end, in parallel processes.
+
+    :param path (str): Path where the simulation output is stored, and where the analysis is written.
+    :param setup_paths (list of str): The paths of the setup files.
+    :param analysis (function): The analysis run on each MultiModel, after loading and windowed aggregation.
+    :param loaded_models (dict): The models loaded so far from this path, per ingestion key (see ingestion_key). A
+        long-lived caller (see server.py) passes the same dictionary across batches, to keep the models warm; the
+        models loaded by this batch are added to it.
+    :param overrides (dict): Settings applied to every variant, over those of the setup files.
+    :return: None
+    :side effect: Writes the analysis output of every variant, and the queued figures.
+    """
+    from ingestion import TIMESTAMP_COLUMN
+    from models.MultiModel import MultiModel
+    from rendering import render_figures
+
+    if loaded_models is None:
+        loaded_models = {}
+    variants = expand_variants(setup_paths, overrides)
+
+    metrics_to_read = {}
+    for user_input in variants:
+        metrics = metrics_to_read.setdefault(source_key(user_input), [])
+        if ingestion_key(user_input) not in loaded_models and user_input["metric"] not in metrics:
+            metrics.append(user_input["metric"])
+
+    render_workers = max(user_input["render_workers"] for user_input in variants)
+    render_queue = [] if render_workers > 1 else None
+
+    read_series = {}
+    for user_input in variants:
+        key = ingestion_key(user_input)
+        series = read_series.setdefault(source_key(user_input), {})
+        multimodel = MultiModel(
+            user_input=user_input,
+            path=path,
+            models=loaded_models.get(key),
+            raw_series=series.get(user_input["metric"]),
+            timestamps=series.get(TIMESTAMP_COLUMN),
+            extra_metrics=[metric for metric in metrics_to_read[source_key(user_input)] if metric not in series],
+        )
+        series.update(multimodel.extra_series)
+        loaded_models.setdefault(key, multimodel.models[:])
+        multimodel.render_queue = render_queue
+        analysis(multimodel)
+
+    if render_queue:
+        render_figures(render_queue, render_workers)
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from accuracy_evaluator import accuracy_evaluator
+from benchmarks.synthetic_output import generate_output
+from input_parser import parse_input
+from models.MetaModel import MetaModel
+from models.MultiModel import MultiModel
+from profiling import peak_rss_mb
+
+"""
+Benchmark suite of the M3SA analysis. Generates synthetic OpenDC output at several scales, times the stages of the
+analysis on it, and compares the results against a stored baseline, to catch performance regressions.
+
+Usage (from the python directory):
+    python -m benchmarks.benchmark_suite --scales small,medium --output results.json
+    python -m benchmarks.benchmark_suite --scales small --baseline results.json --tolerance 0.25
+"""
+
+SCALES = {
+    "small": {"models": 5, "hosts": 16, "timestamps": 2_000, "row_group_size": 65_536},
+    "medium": {"models": 20, "hosts": 32, "timestamps": 10_000, "row_group_size": 65_536},
+    "large": {"models": 50, "hosts": 64, "timestamps": 50_000, "row_group_size": 131_072},
+}
+
+BENCHMARKS = ["init_models", "compute_windowed_aggregation", "MetaModel.compute", "accuracy_evaluator", "generate_plot"]
+
+
+def setup(window_size):
+    """
+    :param window_size: The window size of the benchmarked analysis.
+    :return: dict: The user input of the benchmarked analysis. Caching and aggregate pyramids are disabled, such that
+        every run reads the data, and windows every sample.
+    """
+    return parse_input({
+        "metric": "power_draw",
+        "metamodel": True,
+        "window_size": window_size,
+        "current_unit": "W",
+        "unit_scaling_magnitude": 3,
+        "cache": False,
+        "aggregate_pyramids": False,
+    })
+
+
+def time_call(function, repeat):
+    """
+    :param function: The function to time, called without arguments.
+    :param repeat: The number of runs.
+    :return: float: The fastest wall time of the runs, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def traced_peak_mb(function):
+    """
+    :param function: The function to measure, called without arguments.
+    :return: float: The peak memory allocated through Python and NumPy while running the function, in megabytes.
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_scale(name, scale, window_size, repeat):
+    """
+    Generates the synthetic output of a scale, and benchmarks each stage of the analysis on it.
+
+    :param name: The name of the scale.
+    :param scale: The parameters of the synthetic output (see SCALES).
+    :param window_size: The window size of the analysis.
+    :param repeat: The number of timed runs of each stage; the fastest is kept.
+    :return: list of dict: One result per benchmark.
+    """
+    working_directory = os.getcwd()
+    output_folder_path = tempfile.mkdtemp(prefix="m3sa-benchmark-")
+    try:
+        rows = generate_output(output_folder_path, **scale)
+        multimodel = MultiModel(user_input=setup(window_size), path=os.path.relpath(output_folder_path, working_directory))
+        real_data = multimodel.models[0].raw_sim_data * 1.05
+
+        def init_models():
+            multimodel.models = []
+            multimodel.init_models()
+
+        def compute_windowed_aggregation():
+            for model in multimodel.models:
+                model.processed_window = None
+            multimodel.compute_windowed_aggregation()
+
+        def meta_model_compute():
+            MetaModel(multimodel).compute()
+
+        def evaluate_accuracy():
+            accuracy_evaluator(real_data, multimodel)
+
+        def generate_plot():
+            multimodel.generate_plot()
+
+        functions = {
+            "init_models": init_models,
+            "compute_windowed_aggregation": compute_windowed_aggregation,
+            "MetaModel.compute": meta_model_compute,
+            "accuracy_evaluator": evaluate_accuracy,
+            "generate_plot": generate_plot,
+        }
+
+        results = []
+        for benchmark in BENCHMARKS:
+            seconds = time_call(functions[benchmark], repeat)
+            results.append({
+                "scale": name,
+                **scale,
+                "benchmark": benchmark,
+                "seconds": round(seconds, 6),
+                "rows_per_second": round(rows / seconds) if seconds > 0 else None,
+                "models_per_second": round(scale["models"] / seconds, 3) if seconds > 0 else None,
+                "peak_traced_mb": traced_peak_mb(functions[benchmark]),
+                "peak_rss_mb": peak_rss_mb(),
+            })
+            print(f"[{name}] {benchmark}: {seconds:.4f}s", file=sys.stderr)
+        return results
+    finally:
+        shutil.rmtree(output_folder_path, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the results against a baseline, benchmark by benchmark and scale by scale.
+
+    :param results: The results of this run.
+    :param baseline: The results of the baseline run.
+    :param tolerance: The allowed relative slowdown, e.g., 0.2 for 20%.
+    :return: list of str: A description of each regression; empty if there is none.
+    """
+    baseline_seconds = {(result["scale"], result["benchmark"]): result["seconds"] for result in baseline}
+    regressions = []
+    for result in results:
+        reference = baseline_seconds.get((result["scale"], result["benchmark"]))
+        if reference is None or reference <= 0:
+            continue
+        result["baseline_seconds"] = reference
+        result["speedup"] = round(reference / result["seconds"], 3) if result["seconds"] > 0 else None
+        if result["seconds"] > reference * (1 + tolerance):
+            regressions.append(
+                f"[{result['scale']}] {result['benchmark']}: {result['seconds']:.4f}s vs. {reference:.4f}s baseline"
+            )
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the M3SA analysis on synthetic OpenDC output.")
+    parser.add_argument("--scales", default="small", help=f"comma-separated scales, out of {list(SCALES)}")
+    parser.add_argument("--models", type=int, help="custom scale: number of models")
+    parser.add_argument("--hosts", type=int, help="custom scale: number of hosts per model")
+    parser.add_argument("--timestamps", type=int, help="custom scale: number of timestamps per model")
+    parser.add_argument("--row-group-size", type=int, default=65_536, help="custom scale: rows per row group")
+    parser.add_argument("--window-size", type=int, default=10, help="window size of the analysis")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark; the fastest is kept")
+    parser.add_argument("--output", default="benchmark_results.json", help="file the results are written to")
+    parser.add_argument("--baseline", help="results file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown against the baseline")
+    args = parser.parse_args(args)
+
+    scales = {name: SCALES[name] for name in args.scales.split(",") if name}
+    if args.models and args.hosts and args.timestamps:
+        scales = {"custom": {
+            "models": args.models,
+            "hosts": args.hosts,
+            "timestamps": args.timestamps,
+            "row_group_size": args.row_group_size,
+        }}
+
+    results = []
+    for name, scale in scales.items():
+        results += benchmark_scale(name, scale, args.window_size, args.repeat)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+
+    with open(args.output, "w") as f:
+        json.dump({"created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, f, indent=2)
+
+    for regression in regressions:
+        print("Performance regression: " + regression, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_output import generate_output
+from input_parser import find_root_dir
+
+"""
+Startup-time regression check of the M3SA command line. Runs main.py in fresh interpreters, in its fast modes (setup
+validation, and a headless analysis of a small synthetic output), and fails if a mode starts slower than the limit, or
+imports a library it does not need.
+
+Usage (from the python directory):
+    python -m benchmarks.startup_time
+    python -m benchmarks.startup_time --repeat 10 --limit 0.8
+"""
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+"""
+Per mode, the extra command line arguments of main.py, and the libraries which the mode must not import. (A headless
+run which reads simulation data does load pandas, through the PyArrow group-by; it is not imported by M3SA itself.)
+"""
+MODES = {
+    "validate-only": (["--validate-only"], ["numpy", "pyarrow", "pandas", "matplotlib"]),
+    "headless": (["--headless"], ["matplotlib"]),
+}
+
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+\d+ \|\s+\d+ \|\s*(\S+)$")
+
+
+def run_main(arguments, trace_imports=False):
+    """
+    :param arguments: The command line arguments of main.py.
+    :param trace_imports: Whether to return the top-level packages imported by the run.
+    :return: tuple: The wall time of the run, in seconds, and the set of imported top-level packages (or None).
+    :raise RuntimeError: If the run fails.
+    """
+    command = [sys.executable] + (["-X", "importtime"] if trace_imports else []) + [MAIN_PATH] + arguments
+    start = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"main.py {' '.join(arguments)} failed:\n{completed.stderr}")
+
+    if not trace_imports:
+        return seconds, None
+    imported = set()
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            imported.add(match.group(1).split(".")[0])
+    return seconds, imported
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Checks the startup time of the M3SA command line.")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per mode; the median is kept")
+    parser.add_argument("--limit", type=float, default=1.0, help="maximum median wall time of a mode, in seconds")
+    parser.add_argument("--output", help="file the results are written to")
+    args = parser.parse_args(args)
+
+    output_folder_path = tempfile.mkdtemp(prefix="m3sa-startup-")
+    try:
+        generate_output(output_folder_path, models=2, hosts=2, timestamps=100)
+        setup_path = os.path.join(output_folder_path, "setup.json")
+        with open(setup_path, "w") as f:
+            json.dump({"metric": "power_draw", "metamodel": True, "window_size": 10}, f)
+
+        results, failures = [], []
+        for mode, (mode_arguments, forbidden_imports) in MODES.items():
+            # main.py reads the paths relative to the project root
+            arguments = mode_arguments + [os.path.relpath(path, find_root_dir()) for path in [output_folder_path, setup_path]]
+            _, imported = run_main(arguments, trace_imports=True)
+            seconds = statistics.median(run_main(arguments)[0] for _ in range(args.repeat))
+
+            unneeded = sorted(imported.intersection(forbidden_imports))
+            results.append({"mode": mode, "seconds": round(seconds, 4), "unneeded_imports": unneeded})
+            print(f"{mode}: {seconds:.3f}s", file=sys.stderr)
+
+            if seconds > args.limit:
+                failures.append(f"{mode} starts in {seconds:.3f}s, over the limit of {args.limit:.3f}s")
+            if unneeded:
+                failures.append(f"{mode} imports {', '.join(unneeded)}")
+    finally:
+        shutil.rmtree(output_folder_path, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, f, indent=2)
+
+    for failure in failures:
+        print("Startup regression: " + failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from simulator_specifics import SIMULATION_DATA_FILE
+from utils import EMISSIONS_ANALYSIS_FOLDER_NAME, ENERGY_ANALYSIS_FOLDER_NAME, SIMULATION_ANALYSIS_FOLDER_NAME
+
+"""
+Generator of synthetic OpenDC output, in the folder structure and host schema written by the simulator, such that the
+analysis can be benchmarked without running a simulation.
+"""
+
+EXPORT_INTERVAL_MS = 300_000
+START_TIMESTAMP_MS = 1_700_000_000_000
+
+HOST_SCHEMA = pa.schema([
+    ("timestamp", pa.int64()),
+    ("timestamp_absolute", pa.int64()),
+    ("host_id", pa.string()),
+    ("host_name", pa.string()),
+    ("core_count", pa.int32()),
+    ("mem_capacity", pa.int64()),
+    ("guests_terminated", pa.int32()),
+    ("guests_running", pa.int32()),
+    ("guests_error", pa.int32()),
+    ("guests_invalid", pa.int32()),
+    ("cpu_limit", pa.float64()),
+    ("cpu_usage", pa.float64()),
+    ("cpu_demand", pa.float64()),
+    ("cpu_utilization", pa.float64()),
+    ("cpu_time_active", pa.int64()),
+    ("cpu_time_idle", pa.int64()),
+    ("cpu_time_steal", pa.int64()),
+    ("cpu_time_lost", pa.int64()),
+    ("power_draw", pa.float64()),
+    ("energy_usage", pa.float64()),
+    ("carbon_intensity", pa.float64()),
+    ("carbon_emission", pa.float64()),
+    ("uptime", pa.int64()),
+    ("downtime", pa.int64()),
+    ("boot_time", pa.int64()),
+    ("boot_time_absolute", pa.int64()),
+])
+
+
+def host_table(rng, first_timestamp, timestamps, hosts, model_bias):
+    """
+    Generates the host rows of consecutive timestamps, ordered by timestamp and then by host, as the simulator does.
+
+    :param rng: The np.random.Generator.
+    :param first_timestamp: The index of the first timestamp.
+    :param timestamps: The number of timestamps.
+    :param hosts: The number of hosts.
+    :param model_bias: Relative bias of the model's power draw, such that models differ from each other.
+    :return: pa.Table: The rows, in HOST_SCHEMA.
+    """
+    rows = timestamps * hosts
+    timestamp = np.repeat((first_timestamp + np.arange(timestamps, dtype=np.int64) + 1) * EXPORT_INTERVAL_MS, hosts)
+    host = np.tile(np.arange(hosts), timestamps)
+    utilization = rng.beta(2, 5, rows)
+    power_draw = (200.0 + 150.0 * utilization) * (1 + model_bias)
+    carbon_intensity = 100.0 + 50.0 * np.sin(timestamp / (24 * 3600 * 1000) * 2 * np.pi)
+    energy_usage = power_draw * EXPORT_INTERVAL_MS / 1000
+    cpu_limit = np.full(rows, 3200.0 * 16)
+    active = (utilization * EXPORT_INTERVAL_MS).astype(np.int64)
+    zeros32 = np.zeros(rows, dtype=np.int32)
+    zeros64 = np.zeros(rows, dtype=np.int64)
+    host_names = np.array([f"H{h:05d}" for h in range(hosts)], dtype=object)
+
+    return pa.table({
+        "timestamp": timestamp,
+        "timestamp_absolute": timestamp + START_TIMESTAMP_MS,
+        "host_id": host_names[host],
+        "host_name": host_names[host],
+        "core_count": np.full(rows, 16, dtype=np.int32),
+        "mem_capacity": np.full(rows, 128 * 1024 ** 3, dtype=np.int64),
+        "guests_terminated": zeros32,
+        "guests_running": rng.integers(0, 8, rows, dtype=np.int32),
+        "guests_error": zeros32,
+        "guests_invalid": zeros32,
+        "cpu_limit": cpu_limit,
+        "cpu_usage": cpu_limit * utilization,
+        "cpu_demand": cpu_limit * utilization,
+        "cpu_utilization": utilization,
+        "cpu_time_active": active,
+        "cpu_time_idle": EXPORT_INTERVAL_MS - active,
+        "cpu_time_steal": zeros64,
+        "cpu_time_lost": zeros64,
+        "power_draw": power_draw,
+        "energy_usage": energy_usage,
+        "carbon_intensity": carbon_intensity,
+        "carbon_emission": energy_usage / 3.6e6 * carbon_intensity,
+        "uptime": np.full(rows, EXPORT_INTERVAL_MS, dtype=np.int64),
+        "downtime": zeros64,
+        "boot_time": zeros64,
+        "boot_time_absolute": np.full(rows, START_TIMESTAMP_MS, dtype=np.int64),
+    }, schema=HOST_SCHEMA)
+
+
+def generate_output(output_folder_path, models, hosts, timestamps, row_group_size=65536, seeds=1, random_seed=0):
+    """
+    Writes a synthetic simulation output: raw-output/<model>/seed=<seed>/host.parquet for every model and seed, a
+    trackr.json describing the models, and the (empty) simulation analysis folders. Files are written one row group at
+    a time, so the generator's memory does not grow with the number of timestamps.
+
+    :param output_folder_path: The folder in which the output is written.
+    :param models: The number of models (i.e., scenarios).
+    :param hosts: The number of hosts per model.
+    :param timestamps: The number of timestamps per model.
+    :param row_group_size: The number of rows per Parquet row group.
+    :param seeds: The number of seeds per model.
+    :param random_seed: The seed of the generator, such that the output is reproducible.
+    :return: int: The total number of rows written.
+    """
+    rng = np.random.default_rng(random_seed)
+    timestamps_per_group = max(1, row_group_size // hosts)
+
+    for model in range(models):
+        model_bias = rng.normal(0, 0.05)
+        for seed in range(seeds):
+            folder_path = os.path.join(output_folder_path, "raw-output", str(model), f"seed={seed}")
+            os.makedirs(folder_path, exist_ok=True)
+            with pq.ParquetWriter(os.path.join(folder_path, f"{SIMULATION_DATA_FILE}.parquet"), HOST_SCHEMA) as writer:
+                for first in range(0, timestamps, timestamps_per_group):
+                    count = min(timestamps_per_group, timestamps - first)
+                    writer.write_table(host_table(rng, first, count, hosts, model_bias), row_group_size=count * hosts)
+
+    for folder_name in [ENERGY_ANALYSIS_FOLDER_NAME, EMISSIONS_ANALYSIS_FOLDER_NAME]:
+        os.makedirs(os.path.join(output_folder_path, SIMULATION_ANALYSIS_FOLDER_NAME, folder_name), exist_ok=True)
+
+    with open(os.path.join(output_folder_path, "trackr.json"), "w") as f:
+        json.dump([
+            {
+                "name": str(model),
+                "topologies": [{"pathToFile": f"topologies/topology_{model % 2}.json"}],
+                "workloads": [{"pathToFile": "traces/synthetic", "type": "ComputeWorkload"}],
+                "allocationPolicies": [{"policyType": ["Mem", "CoreMem"][model % 2]}],
+                "carbonTracePaths": [None],
+            }
+            for model in range(models)
+        ], f, indent=2)
+
+    return models * seeds * hosts * timestamps
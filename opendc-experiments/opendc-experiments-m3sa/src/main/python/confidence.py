@@ -0,0 +1,38 @@
+from statistics import NormalDist
+
+import numpy as np
+
+"""
+Uncertainty across simulation seeds. The runs of a model under different seeds are stacked into a (seeds x samples)
+block (aligned on their timestamps, see alignment.py), and reduced, per sample, to their mean, standard deviation and confidence interval.
+"""
+
+DEFAULT_CONFIDENCE_LEVEL = 0.95
+
+
+def confidence_band(seed_block, confidence_level=DEFAULT_CONFIDENCE_LEVEL):
+    """
+    Computes, for every sample, the mean of the seeds, their (sample) standard deviation, and the margin of error of the
+    mean, in one vectorized reduction over the seed axis. The margin is the half-width of the confidence interval of the
+    mean, with the normal approximation: z * std / sqrt(seeds). With a single seed, the deviation and margin are zero.
+
+    :param seed_block: The (seeds x samples) block of a model.
+    :param confidence_level: The confidence level of the interval, between 0 and 1 (exclusive).
+    :return: tuple of np.array: The mean, standard deviation and margin of error of each sample, in the precision of
+        the block.
+    :raise ValueError: If the confidence level is not between 0 and 1.
+    """
+    if not 0 < confidence_level < 1:
+        raise ValueError("Invalid confidence level. Please enter a number between 0 and 1 (exclusive).")
+
+    seed_block = np.asarray(seed_block)
+    seeds = seed_block.shape[0]
+    mean = np.mean(seed_block, axis=0)
+    if seeds < 2:
+        return mean, np.zeros_like(mean), np.zeros_like(mean)
+
+    std = np.std(seed_block, axis=0, ddof=1)
+    z = NormalDist().inv_cdf(0.5 + confidence_level / 2)
+    margin = std * (z / np.sqrt(seeds))
+    return mean, std, margin.astype(seed_block.dtype, copy=False)
+
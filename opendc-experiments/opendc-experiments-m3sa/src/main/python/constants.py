@@ -0,0 +1,50 @@
+import re
+
+"""
+Constants shared by the analysis modules and by the validation of the setup (see input_parser.py). This module only
+imports the standard library, such that validating a setup (e.g., a '--validate-only' run) does not import NumPy,
+PyArrow or matplotlib; the modules which use these constants with those libraries import them from here.
+"""
+
+"""
+The alignments of the models on their timestamps (see alignment.py): on the timestamps all the models cover, or on
+those any model covers.
+"""
+MODEL_ALIGNMENTS = ["intersect", "outer"]
+
+"""
+The metadata fields, as named in trackr.json and in the 'model_filters' setting, with the name of the field holding a
+single value in the scenario entries written by OpenDC (ScenarioSpec), and the keys of a value's descriptive labels.
+"""
+METADATA_FIELDS = {
+    "topologies": ("topology", ["pathToFile", "name"]),
+    "workloads": ("workload", ["pathToFile", "name"]),
+    "allocationPolicies": ("allocationPolicy", ["name", "policyType"]),
+    "carbonTracePaths": ("carbonTracePath", []),
+}
+
+"""
+The formats in which the figures can be written (see rendering.py).
+"""
+PLOT_FORMATS = ["pdf", "png", "svg"]
+
+"""
+The names of the window functions (see windowing.WINDOW_FUNCTIONS), besides the percentiles, written as 'p' followed
+by a number.
+"""
+WINDOW_FUNCTION_NAMES = ["mean", "median", "min", "max", "sum"]
+PERCENTILE_PATTERN = re.compile(r"^p(\d+(\.\d+)?)$")
+
+
+def is_window_function(name):
+    """
+    Checks whether the name denotes a supported window function: one of WINDOW_FUNCTION_NAMES, or a percentile written
+    as 'p' followed by a number between 0 and 100 (e.g., 'p95', 'p99.9').
+
+    :param name: The name of the window function.
+    :return: bool: True if the window function is supported, False otherwise.
+    """
+    if name in WINDOW_FUNCTION_NAMES:
+        return True
+    match = PERCENTILE_PATTERN.match(str(name))
+    return match is not None and 0 <= float(match.group(1)) <= 100
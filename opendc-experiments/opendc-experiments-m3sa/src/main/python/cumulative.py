@@ -0,0 +1,42 @@
+import numpy as np
+
+"""
+Cumulative engine. The prefix sums of a series, computed once with np.cumsum, answer every cumulative query on it in
+constant time: the total over any range of samples, and the cumulative value at the end of every window.
+"""
+
+
+def prefix_sums(series):
+    """
+    :param series: The series, e.g., the raw data of a model.
+    :return: np.array: The float64 prefix sums of the series, with a leading zero, such that the total of the samples
+        [start, stop) is prefix[stop] - prefix[start].
+    """
+    prefix = np.empty(len(series) + 1, dtype=np.float64)
+    prefix[0] = 0.0
+    np.cumsum(series, dtype=np.float64, out=prefix[1:])
+    return prefix
+
+
+def range_total(prefix, start=0, stop=None):
+    """
+    :param prefix: The prefix sums of a series (see prefix_sums).
+    :param start: The first sample of the range; clipped to the series.
+    :param stop: The sample after the last one of the range (exclusive); the end of the series if None.
+    :return: float: The total of the samples [start, stop); 0 for an empty range.
+    """
+    length = len(prefix) - 1
+    stop = length if stop is None else min(max(int(stop), 0), length)
+    start = min(max(int(start), 0), stop)
+    return float(prefix[stop] - prefix[start])
+
+
+def window_cumulative(prefix, window_size):
+    """
+    :param prefix: The prefix sums of a series (see prefix_sums).
+    :param window_size: The number of samples in each window.
+    :return: np.array: The cumulative total of the series at the end of each window, the last (partial) window included.
+    """
+    length = len(prefix) - 1
+    windows = -(-length // window_size)
+    return prefix[np.minimum(np.arange(1, windows + 1) * window_size, length)]
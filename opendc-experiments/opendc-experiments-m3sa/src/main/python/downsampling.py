@@ -0,0 +1,83 @@
+import numpy as np
+
+"""
+Display-resolution decimation of the plotted series. A figure cannot show more detail than it has pixels, so series
+with many more points than the figure's width are reduced to per-pixel min/max envelopes before plotting.
+"""
+
+"""
+Buckets per pixel of the figure's width. Two buckets per pixel keep the decimated line visually identical to the
+original one, even where the bucket boundaries do not align with the pixel boundaries.
+"""
+BUCKETS_PER_PIXEL = 2
+
+
+def step_points(values, window_size, length):
+    """
+    Returns the points of the step line drawing one value per window, without repeating each value 'window_size' times.
+    Plotted with drawstyle='steps-post', the i-th value spans the samples [i * window_size, (i + 1) * window_size).
+
+    :param values: One value per window.
+    :param window_size: The number of samples in each window.
+    :param length: The number of samples covered by the line; the last step extends up to it.
+    :return: tuple of np.array: The x (sample index) and y coordinates of the line.
+    """
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.empty(0), np.empty(0)
+
+    x = np.append(np.arange(len(values)) * window_size, max(length, (len(values) - 1) * window_size + 1))
+    y = np.append(values, values[-1])
+    return x, y
+
+
+def min_max_envelope(x, y, buckets):
+    """
+    Decimates a line to at most two points per bucket: the points with the minimum and maximum y of each run of
+    consecutive points, kept in their original order. With one bucket per pixel, the decimated line is drawn over the
+    same pixels as the original one, including every peak and trough.
+
+    :param x: The x coordinates of the line.
+    :param y: The y coordinates of the line.
+    :param buckets: The number of buckets, typically the width of the figure in pixels.
+    :return: tuple of np.array: The x and y coordinates of the decimated line; the line itself if it is short enough.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if buckets < 1 or len(y) <= 2 * buckets:
+        return x, y
+
+    bucket_size = -(-len(y) // buckets)
+    padded = np.pad(y, (0, buckets * bucket_size - len(y)), mode="edge").reshape(buckets, bucket_size)
+    offsets = np.arange(buckets)[:, None] * bucket_size
+
+    extremes = np.stack([np.argmin(padded, axis=1), np.argmax(padded, axis=1)], axis=1) + offsets
+    indices = np.unique(np.concatenate(([0], np.minimum(extremes, len(y) - 1).ravel(), [len(y) - 1])))
+    return x[indices], y[indices]
+
+
+def band_envelope(x, lower, upper, buckets):
+    """
+    Decimates a band (e.g., a confidence interval) drawn with steps to one step per bucket, spanning the lowest lower
+    bound and the highest upper bound of the bucket's points. The decimated band covers every pixel of the original.
+
+    :param x: The x coordinates of the band.
+    :param lower: The lower bounds of the band.
+    :param upper: The upper bounds of the band.
+    :param buckets: The number of buckets, typically the width of the figure in pixels.
+    :return: tuple of np.array: The x coordinates, lower and upper bounds of the decimated band; the band itself if it
+        is short enough.
+    """
+    x = np.asarray(x)
+    lower = np.asarray(lower)
+    upper = np.asarray(upper)
+    if buckets < 1 or len(x) <= 2 * buckets:
+        return x, lower, upper
+
+    bucket_size = -(-len(x) // buckets)
+    buckets = -(-len(x) // bucket_size)
+    padding = (0, buckets * bucket_size - len(x))
+    lowest = np.pad(lower, padding, mode="edge").reshape(buckets, bucket_size).min(axis=1)
+    highest = np.pad(upper, padding, mode="edge").reshape(buckets, bucket_size).max(axis=1)
+    starts = x[::bucket_size]
+    return np.append(starts, x[-1]), np.append(lowest, lowest[-1]), np.append(highest, highest[-1])
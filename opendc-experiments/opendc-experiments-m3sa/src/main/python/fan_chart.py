@@ -0,0 +1,43 @@
+import numpy as np
+
+"""
+Percentile fan chart of many models. Instead of one line per model, the models' processed data is stacked into a
+(models x samples) matrix, and reduced, per sample, to a few percentiles across the models, in one vectorized pass.
+The percentiles are drawn as nested bands (e.g., p5-p95 and p25-p75) around the median, such that the cost and size of
+the figure do not grow with the number of models.
+"""
+
+DEFAULT_FAN_PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def percentile_envelopes(models_matrix, percentiles=DEFAULT_FAN_PERCENTILES):
+    """
+    :param models_matrix (np.array): The (models x samples) matrix of the models' data.
+    :param percentiles (list of float): The percentiles, between 0 and 100.
+    :return: np.array: The (percentiles x samples) envelopes, in the sorted order of the percentiles, in the precision
+        of the matrix.
+    """
+    envelopes = np.percentile(models_matrix, sorted(percentiles), axis=0)
+    return envelopes.astype(models_matrix.dtype, copy=False)
+
+
+def fan_bands(percentiles=DEFAULT_FAN_PERCENTILES):
+    """
+    Pairs the percentiles into nested bands, from the outermost (the lowest with the highest percentile) inwards; with
+    an odd count, the middle percentile is drawn as a line.
+
+    :param percentiles (list of float): The percentiles, between 0 and 100.
+    :return: tuple: The (lower, upper) indices of each band, from the outermost, and the index of the middle line (or
+        None), in the sorted order of the percentiles.
+    """
+    count = len(percentiles)
+    bands = [(i, count - 1 - i) for i in range(count // 2)]
+    return bands, (count // 2 if count % 2 == 1 else None)
+
+
+def percentile_label(percentile):
+    """
+    :param percentile (float): A percentile, e.g., 5 or 99.9.
+    :return: str: Its label, e.g., 'p5' or 'p99.9'.
+    """
+    return "p" + (str(int(percentile)) if float(percentile).is_integer() else str(percentile))
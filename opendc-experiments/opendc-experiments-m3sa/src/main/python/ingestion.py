@@ -0,0 +1,274 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from profiling import timed
+
+"""
+Ingestion layer of M3SA. Reads the simulation data files and reduces them to one value per timestamp, for
+one or more metrics at once.
+"""
+
+TIMESTAMP_COLUMN = "timestamp"
+STREAMING_BATCH_SIZE = 65536
+META_MODEL_FOLDER_NAME = "metamodel"
+EXECUTORS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
+def timestamp_filters(timestamp_min=None, timestamp_max=None):
+    """
+    Builds the Parquet predicate that limits the rows read to a timestamp range. The predicate is pushed down to the
+    reader, so row groups outside the range are skipped using their statistics.
+
+    :param timestamp_min: Inclusive lower bound of the timestamp range, or None for no bound.
+    :param timestamp_max: Inclusive upper bound of the timestamp range, or None for no bound.
+    :return: A list of filter tuples accepted by pyarrow.parquet, or None if the range is unbounded.
+    """
+    filters = []
+    if timestamp_min is not None:
+        filters.append((TIMESTAMP_COLUMN, ">=", timestamp_min))
+    if timestamp_max is not None:
+        filters.append((TIMESTAMP_COLUMN, "<=", timestamp_max))
+    return filters or None
+
+
+def group_sum(table, metrics):
+    """
+    Sums each metric over all rows (i.e., hosts) sharing the same timestamp, all metrics in the same grouping pass.
+
+    :param table: Arrow table holding at least the timestamp and metric columns.
+    :param metrics: The names of the metric columns to sum.
+    :return: pa.Table: One row per distinct timestamp, with the timestamp and metric columns, in no particular order.
+    """
+    grouped = table.group_by(TIMESTAMP_COLUMN).aggregate(
+        [(metric, "sum", pc.ScalarAggregateOptions(min_count=0)) for metric in metrics]
+    )
+    return grouped.select([TIMESTAMP_COLUMN] + [f"{metric}_sum" for metric in metrics]).rename_columns(
+        [TIMESTAMP_COLUMN] + list(metrics)
+    )
+
+
+def reduce_per_timestamp(table, metrics):
+    """
+    Sums each metric over all rows (i.e., hosts) sharing the same timestamp, in timestamp order.
+
+    :param table: Arrow table holding at least the timestamp and metric columns.
+    :param metrics: The names of the metric columns to sum.
+    :return: dict: Per metric, the np.array of its per-timestamp sums, sorted by timestamp; and, under
+        TIMESTAMP_COLUMN, the np.array of the int64 timestamps themselves.
+    """
+    grouped = group_sum(table, metrics).sort_by(TIMESTAMP_COLUMN)
+    series = {metric: np.asarray(grouped.column(metric).to_numpy(), dtype=np.float64) for metric in metrics}
+    series[TIMESTAMP_COLUMN] = np.asarray(grouped.column(TIMESTAMP_COLUMN).to_numpy(), dtype=np.int64)
+    return series
+
+
+def read_reduced_metrics(path, metrics, timestamp_min=None, timestamp_max=None, timings=None):
+    """
+    Reads a simulation data file once and reduces it to the per-timestamp sum of each metric. Only the timestamp and
+    metric columns are decoded, and only the rows inside the optional timestamp range.
+
+    :param path: Path to the Parquet file.
+    :param metrics: The names of the metric columns to sum.
+    :param timestamp_min: Inclusive lower bound of the timestamp range, or None for no bound.
+    :param timestamp_max: Inclusive upper bound of the timestamp range, or None for no bound.
+    :param timings: Dictionary in which the time spent reading ('ingest', including the reduction) and reducing
+        ('reduce'), and the volume read, are recorded; or None to record nothing.
+    :return: dict: Per metric, the np.array of its per-timestamp sums, sorted by timestamp; and, under
+        TIMESTAMP_COLUMN, the np.array of the int64 timestamps.
+    """
+    with timed(timings, "ingest"):
+        table = pq.read_table(
+            path,
+            columns=[TIMESTAMP_COLUMN] + list(metrics),
+            filters=timestamp_filters(timestamp_min, timestamp_max),
+        )
+        with timed(timings, "reduce"):
+            series = reduce_per_timestamp(table, metrics)
+
+    if timings is not None:
+        timings["rows_decoded"] = table.num_rows
+        timings["bytes_read"] = read_volume(pq.ParquetFile(path), metrics, timestamp_min, timestamp_max)
+    return series
+
+
+def read_volume(parquet_file, metrics, timestamp_min=None, timestamp_max=None):
+    """
+    :param parquet_file: The opened pq.ParquetFile.
+    :param metrics: The names of the metric columns read, besides the timestamp column.
+    :param timestamp_min: Inclusive lower bound of the timestamp range, or None for no bound.
+    :param timestamp_max: Inclusive upper bound of the timestamp range, or None for no bound.
+    :return: int: The compressed size, in bytes, of the column chunks read.
+    """
+    metadata = parquet_file.metadata
+    columns = [parquet_file.schema.names.index(name) for name in [TIMESTAMP_COLUMN] + list(metrics)]
+    return sum(
+        metadata.row_group(i).column(j).total_compressed_size
+        for i in row_groups_in_range(parquet_file, timestamp_min, timestamp_max)
+        for j in columns
+    )
+
+
+def profiled_read(reader, path):
+    """
+    Runs the reader on the path, recording its measurements. As a module-level function, it can run in a process pool.
+
+    :param reader: Function which takes a path and a 'timings' keyword, and returns the reduced data.
+    :param path: The path of the file to read.
+    :return: tuple: The reader's result, and the dictionary of its measurements.
+    """
+    timings = {}
+    return reader(path, timings=timings), timings
+
+
+def row_groups_in_range(parquet_file, timestamp_min=None, timestamp_max=None):
+    """
+    Selects the row groups which may hold rows inside the timestamp range, based on their column statistics.
+
+    :param parquet_file: The opened pq.ParquetFile.
+    :param timestamp_min: Inclusive lower bound of the timestamp range, or None for no bound.
+    :param timestamp_max: Inclusive upper bound of the timestamp range, or None for no bound.
+    :return: list: The indices of the row groups to read.
+    """
+    metadata = parquet_file.metadata
+    timestamp_index = parquet_file.schema.names.index(TIMESTAMP_COLUMN)
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(timestamp_index).statistics
+        if statistics is not None and statistics.has_min_max:
+            if timestamp_min is not None and statistics.max < timestamp_min:
+                continue
+            if timestamp_max is not None and statistics.min > timestamp_max:
+                continue
+        row_groups.append(i)
+    return row_groups
+
+
+def stream_reduced_metrics(path, metrics, timestamp_min=None, timestamp_max=None, batch_size=STREAMING_BATCH_SIZE,
+                           timings=None):
+    """
+    Reads a simulation data file batch by batch and reduces it to the per-timestamp sum of each metric, for files which
+    do not fit in memory. Peak memory is bounded by the number of distinct timestamps, not by the size of the file.
+
+    The rows of the last timestamp of a batch are held back and prepended to the next batch, so that a timestamp which
+    straddles a batch boundary (as in the time-ordered files written by the simulator) is summed in a single pass, and
+    the result is identical to read_reduced_metrics. Timestamps which re-appear later in the file are merged from the
+    partial sums, which are compacted whenever they outgrow the number of distinct timestamps seen so far.
+
+    :param path: Path to the Parquet file.
+    :param metrics: The names of the metric columns to sum.
+    :param timestamp_min: Inclusive lower bound of the timestamp range, or None for no bound.
+    :param timestamp_max: Inclusive upper bound of the timestamp range, or None for no bound.
+    :param batch_size: The maximum number of rows decoded at once.
+    :param timings: Dictionary in which the time spent reading ('ingest', including the reduction) and reducing
+        ('reduce'), and the volume read, are recorded; or None to record nothing.
+    :return: dict: Per metric, the np.array of its per-timestamp sums, sorted by timestamp; and, under
+        TIMESTAMP_COLUMN, the np.array of the int64 timestamps.
+    """
+    with timed(timings, "ingest"):
+        series, rows_decoded = stream_batches(path, metrics, timestamp_min, timestamp_max, batch_size, timings)
+
+    if timings is not None:
+        timings["rows_decoded"] = rows_decoded
+        timings["bytes_read"] = read_volume(pq.ParquetFile(path), metrics, timestamp_min, timestamp_max)
+    return series
+
+
+def stream_batches(path, metrics, timestamp_min, timestamp_max, batch_size, timings):
+    """
+    The batch loop of stream_reduced_metrics.
+
+    :return: tuple: Per metric, the per-timestamp sums, sorted by timestamp; and the number of rows decoded.
+    """
+    parquet_file = pq.ParquetFile(path)
+    rows_decoded = 0
+    filters = timestamp_filters(timestamp_min, timestamp_max)
+    filter_expression = pq.filters_to_expression(filters) if filters is not None else None
+
+    partial_sums = []
+    partial_rows = 0
+    distinct_rows = 0
+    held_back = None
+
+    for batch in parquet_file.iter_batches(
+            batch_size=batch_size,
+            row_groups=row_groups_in_range(parquet_file, timestamp_min, timestamp_max),
+            columns=[TIMESTAMP_COLUMN] + list(metrics)
+    ):
+        rows_decoded += batch.num_rows
+        table = pa.Table.from_batches([batch])
+        if filter_expression is not None:
+            table = table.filter(filter_expression)
+        if held_back is not None:
+            table = pa.concat_tables([held_back, table])
+        if table.num_rows == 0:
+            continue
+
+        timestamps = table.column(TIMESTAMP_COLUMN)
+        is_last_timestamp = pc.equal(timestamps, timestamps[-1])
+        held_back = table.filter(is_last_timestamp)
+        table = table.filter(pc.invert(is_last_timestamp))
+        if table.num_rows == 0:
+            continue
+
+        with timed(timings, "reduce"):
+            partial_sum = group_sum(table, metrics)
+            partial_sums.append(partial_sum)
+            partial_rows += partial_sum.num_rows
+
+            if len(partial_sums) > 1 and partial_rows > 2 * max(distinct_rows, batch_size):
+                partial_sums = [group_sum(pa.concat_tables(partial_sums), metrics)]
+                partial_rows = distinct_rows = partial_sums[0].num_rows
+
+    with timed(timings, "reduce"):
+        if held_back is not None:
+            partial_sums.append(group_sum(held_back, metrics))
+
+        if not partial_sums:
+            series = {metric: np.empty(0, dtype=np.float64) for metric in metrics}
+            series[TIMESTAMP_COLUMN] = np.empty(0, dtype=np.int64)
+            return series, rows_decoded
+
+        return reduce_per_timestamp(pa.concat_tables(partial_sums), metrics), rows_decoded
+
+
+def sorted_simulation_folders(folder_names):
+    """
+    Orders the simulation output folders deterministically, so that model ids do not depend on the order in which the
+    file system lists the folders. Numeric folder names (i.e., scenario ids) are ordered numerically and come before any
+    other names, which are ordered alphabetically. The folder in which the Meta-Model is exported is left out.
+
+    :param folder_names: The names of the folders in the raw output directory.
+    :return: list: The simulation folder names, in model id order.
+    """
+    folder_names = [name for name in folder_names if name != META_MODEL_FOLDER_NAME]
+    return sorted(folder_names, key=lambda name: (0, int(name), "") if name.isdigit() else (1, 0, name))
+
+
+def read_many(paths, reader, workers=1, executor="thread"):
+    """
+    Applies the reader to every path, possibly concurrently. The results are returned in the order of the paths,
+    regardless of the order in which the workers complete them.
+
+    :param paths: The paths of the files to read.
+    :param reader: Function which takes a path and returns the reduced data. For the 'process' executor, the reader
+        must be picklable (e.g., a module-level function or a functools.partial of one).
+    :param workers: The number of concurrent workers. With one worker, the files are read sequentially, in-process.
+    :param executor: The kind of worker pool, either 'thread' or 'process'.
+    :return: list: The reader's result for each path.
+    :raise ValueError: If the executor is not recognized.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Ingestion executor not recognized. Please select between {list(EXECUTORS)}.")
+
+    if workers <= 1 or len(paths) <= 1:
+        return [reader(path) for path in paths]
+
+    with EXECUTORS[executor](max_workers=min(workers, len(paths))) as pool:
+        return list(pool.map(reader, paths))
@@ -2,6 +2,16 @@ import json
 import os
 import sys
 import warnings
+from functools import lru_cache
+
+from constants import METADATA_FIELDS, MODEL_ALIGNMENTS, PLOT_FORMATS, is_window_function
+
+"""
+The project root, given explicitly (see set_root_dir), or through this environment variable. Otherwise, it is found by
+searching for the 'README.md' file above this file.
+"""
+ROOT_DIR_ENVIRONMENT_VARIABLE = "M3SA_PROJECT_ROOT"
+root_dir_override = None
 
 
 def read_input(path=""):
@@ -68,6 +78,10 @@ def parse_input(input_json):
         "current_unit": "",
         "unit_scaling_magnitude": 1,
         "plot_type": "time_series",
+        "downsample_plot": True,
+        "plot_formats": ["pdf"],
+        "fan_percentiles": [5, 25, 50, 75, 95],
+        "render_workers": 1,
         "plot_title": "",
         "x_label": "",
         "y_label": "",
@@ -78,6 +92,29 @@ def parse_input(input_json):
         "y_max": None,
         "x_min": None,
         "x_max": None,
+        "x_limits_unit": "samples",
+        "timestamp_min": None,
+        "timestamp_max": None,
+        "model_alignment": "intersect",
+        "alignment_fill_value": 0,
+        "ingestion_workers": 1,
+        "ingestion_executor": "thread",
+        "headless": False,
+        "cache": False,
+        "cache_size_limit_mb": 1024,
+        "invalidate_cache": False,
+        "ingestion_mode": "in_memory",
+        "streaming_batch_size": 65536,
+        "aggregate_pyramids": False,
+        "out_of_core": False,
+        "memory_budget_mb": 1024,
+        "variant": "",
+        "precision": "float64",
+        "profile": False,
+        "cprofile": False,
+        "metric_settings": {},
+        "confidence_level": 0.95,
+        "model_filters": {},
     }
 
     # Apply default values where not specified
@@ -89,6 +126,16 @@ def parse_input(input_json):
     if "metric" not in input_json:
         raise ValueError("Required field 'metric' is missing.")
 
+    metrics = input_json["metric"] if isinstance(input_json["metric"], list) else [input_json["metric"]]
+    if not metrics or not all(isinstance(metric, str) and metric for metric in metrics):
+        raise ValueError("Invalid value for metric. Please enter a metric name, or a non-empty list of metric names.")
+
+    if not isinstance(input_json["metric_settings"], dict) or any(
+            metric not in metrics or not isinstance(settings, dict)
+            for metric, settings in input_json["metric_settings"].items()):
+        raise ValueError("Invalid value for metric_settings. Please map metrics listed in 'metric' to objects of "
+                         "settings.")
+
     if ("meta_function" not in input_json) and input_json["metamodel"]:
         raise ValueError("Required field 'meta_function' is missing. Please select between 'mean' and 'median'. Alternatively,"
               "disable metamodel in the config file.")
@@ -96,6 +143,75 @@ def parse_input(input_json):
     if input_json["meta_function"] not in ["mean", "median", "meta_equation1", "equation2", "equation3"]:
         raise ValueError("Invalid value for meta_function. Please select between 'mean', 'median', !!!!!!!to be updated in the end!!!!!!!!.")
 
+    if not isinstance(input_json["ingestion_workers"], int) or input_json["ingestion_workers"] < 1:
+        raise ValueError("Invalid value for ingestion_workers. Please enter a positive, non-zero, integer.")
+
+    if input_json["ingestion_executor"] not in ["thread", "process"]:
+        raise ValueError("Invalid value for ingestion_executor. Please select between 'thread' and 'process'.")
+
+    if not is_window_function(input_json["window_function"]):
+        raise ValueError("Invalid value for window_function. Please select between 'mean', 'median', 'min', 'max', "
+                         "'sum', or a percentile (e.g., 'p95').")
+
+    if input_json["precision"] not in ["float64", "float32"]:
+        raise ValueError("Invalid value for precision. Please select between 'float64' and 'float32'.")
+
+    if input_json["ingestion_mode"] not in ["in_memory", "streaming"]:
+        raise ValueError("Invalid value for ingestion_mode. Please select between 'in_memory' and 'streaming'.")
+
+    if not isinstance(input_json["streaming_batch_size"], int) or input_json["streaming_batch_size"] < 1:
+        raise ValueError("Invalid value for streaming_batch_size. Please enter a positive, non-zero, integer.")
+
+    if input_json["model_alignment"] not in MODEL_ALIGNMENTS:
+        raise ValueError("Invalid value for model_alignment. Please select between 'intersect' and 'outer'.")
+
+    fill_value = input_json["alignment_fill_value"]
+    if not isinstance(fill_value, (int, float)) or isinstance(fill_value, bool):
+        raise ValueError("Invalid value for alignment_fill_value. Please enter a number.")
+
+    if input_json["x_limits_unit"] not in ["samples", "timestamp"]:
+        raise ValueError("Invalid value for x_limits_unit. Please select between 'samples' and 'timestamp'.")
+
+    memory_budget_mb = input_json["memory_budget_mb"]
+    if not isinstance(memory_budget_mb, (int, float)) or isinstance(memory_budget_mb, bool) or memory_budget_mb <= 0:
+        raise ValueError("Invalid value for memory_budget_mb. Please enter a positive, non-zero, number.")
+
+    seed = input_json["seed"]
+    if not (is_seed(seed) or seed == "all" or (isinstance(seed, list) and seed and all(is_seed(s) for s in seed))):
+        raise ValueError("Invalid value for seed. Please enter a non-negative integer, a non-empty list of "
+                         "non-negative integers, or 'all'.")
+
+    if not isinstance(input_json["confidence_level"], (int, float)) or not 0 < input_json["confidence_level"] < 1:
+        raise ValueError("Invalid value for confidence_level. Please enter a number between 0 and 1, e.g., 0.95.")
+
+    model_filters = input_json["model_filters"]
+    if not isinstance(model_filters, dict) or any(field not in METADATA_FIELDS for field in model_filters):
+        raise ValueError("Invalid value for model_filters. Please map fields out of " + str(list(METADATA_FIELDS))
+                         + " to the accepted values.")
+    for field, accepted in model_filters.items():
+        accepted = [accepted] if isinstance(accepted, str) else accepted
+        if not isinstance(accepted, list) or not accepted or not all(isinstance(value, str) for value in accepted):
+            raise ValueError(f"Invalid value for model_filters.{field}. Please enter a value, or a non-empty list of "
+                             f"values.")
+        model_filters[field] = accepted
+
+    if isinstance(input_json["plot_formats"], str):
+        input_json["plot_formats"] = [input_json["plot_formats"]]
+    plot_formats = input_json["plot_formats"]
+    if not isinstance(plot_formats, list) or not plot_formats or any(f not in PLOT_FORMATS for f in plot_formats):
+        raise ValueError("Invalid value for plot_formats. Please select one or more out of 'pdf', 'png' and 'svg'.")
+
+    fan_percentiles = input_json["fan_percentiles"]
+    if not isinstance(fan_percentiles, list) or not fan_percentiles or not all(
+            isinstance(p, (int, float)) and not isinstance(p, bool) and 0 <= p <= 100 for p in fan_percentiles):
+        raise ValueError("Invalid value for fan_percentiles. Please enter a list of numbers between 0 and 100.")
+
+    if not isinstance(input_json["render_workers"], int) or input_json["render_workers"] < 1:
+        raise ValueError("Invalid value for render_workers. Please enter a positive, non-zero, integer.")
+
+    if not isinstance(input_json["cache_size_limit_mb"], (int, float)) or input_json["cache_size_limit_mb"] < 0:
+        raise ValueError("Invalid value for cache_size_limit_mb. Please enter a non-negative number.")
+
     # raise a warning
     if not input_json["multimodel"] and input_json["metamodel"]:
         warnings.warn("Warning: Cannot have a Meta-Model without a Multi-Model. No computation made.")
@@ -103,15 +219,53 @@ def parse_input(input_json):
     return input_json
 
 
+def is_seed(seed):
+    """
+    :param seed: A seed of the user input.
+    :return: bool: True if the seed is a non-negative integer.
+    """
+    return isinstance(seed, int) and not isinstance(seed, bool) and seed >= 0
+
+
+def set_root_dir(path):
+    """
+    Sets the project root explicitly, such that it is not searched for.
+
+    :param path: The path to the project root directory, or None to search for it again.
+    :type path: str or None
+    :raises ValueError: If the path is not a directory.
+    """
+    global root_dir_override
+    if path is not None and not os.path.isdir(path):
+        raise ValueError(f"Project root does not exist: {path}")
+    root_dir_override = os.path.abspath(path) if path is not None else None
+
+
 def find_root_dir():
     """
-    Searches for the project root directory by looking for a 'README.md' file in the current
-    and parent directories.
+    Returns the project root directory: the one set explicitly (see set_root_dir and ROOT_DIR_ENVIRONMENT_VARIABLE), or
+    else the first directory above this file which holds a 'README.md' file. The search runs once per process.
+
+    :return: The path to the project root directory if found, otherwise None.
+    :rtype: str or None
+    """
+    if root_dir_override is not None:
+        return root_dir_override
+    if os.environ.get(ROOT_DIR_ENVIRONMENT_VARIABLE):
+        return os.path.abspath(os.environ[ROOT_DIR_ENVIRONMENT_VARIABLE])
+    return search_root_dir(os.path.dirname(os.path.abspath(__file__)))
+
+
+@lru_cache(maxsize=None)
+def search_root_dir(current_dir):
+    """
+    Searches for the project root directory by looking for a 'README.md' file in the given directory and its parents.
 
+    :param current_dir: The directory where the search starts.
+    :type current_dir: str
     :return: The path to the project root directory if found, otherwise None.
     :rtype: str or None
     """
-    current_dir = os.path.dirname(os.path.abspath(__file__))
     root = os.path.abspath(os.sep)
     while current_dir and current_dir != root:
         if os.path.exists(os.path.join(current_dir, 'README.md')):
@@ -129,7 +283,8 @@ def switch_to_root_dir():
     """
     root_dir = find_root_dir()
     if root_dir:
-        os.chdir(root_dir)
+        if os.getcwd() != root_dir:
+            os.chdir(root_dir)
     else:
         print("Failed to switch to root directory.")
         sys.exit(1)
@@ -1,20 +1,66 @@
-from os import sys
+import argparse
+import sys
 
-from input_parser import read_input
-from models.MetaModel import MetaModel
-from models.MultiModel import MultiModel
+from batch import expand_variants, run_batch
+from input_parser import set_root_dir
 
 
-def main():
-    multimodel = MultiModel(
-        user_input=read_input(sys.argv[2]),
-        path=sys.argv[1],
+def main(args=None):
+    """
+    Runs the analysis of the simulation output at the first argument, for each setup file given after it. With a single
+    setup file (without a sweep), this is a single analysis; otherwise, the variants run as a batch (see batch.py),
+    sharing the loaded simulation data.
+
+    The heavy libraries are imported only by the stages which need them: PyArrow and NumPy when the data is loaded, and
+    matplotlib when a plot is rendered. A '--validate-only' run therefore only reads and validates the setup files, and
+    a '--headless' run never imports matplotlib.
+
+    :param args (list of str): The command line arguments; sys.argv[1:] if None.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Multi-Meta-Model Simulation Analysis (M3SA) of OpenDC output.")
+    parser.add_argument("output_path", help="path of the simulation output, relative to the project root")
+    parser.add_argument("setup_paths", nargs="+", help="path(s) of the setup file(s), relative to the project root")
+    parser.add_argument("--validate-only", action="store_true", help="only validate the setup file(s)")
+    parser.add_argument("--headless", action="store_true", help="skip rendering the plot(s)")
+    parser.add_argument("--root", help="the project root; searched for (by its README.md) if not given")
+    args = parser.parse_args(args)
+
+    set_root_dir(args.root)
+    overrides = {"headless": True} if args.headless else None
+
+    if args.validate_only:
+        variants = expand_variants(args.setup_paths, overrides)
+        print(f"[M3SA says] {len(variants)} valid analysis variant(s).")
+        return
+
+    run_batch(
+        path=args.output_path,
+        setup_paths=args.setup_paths,
+        analysis=run_analysis,
+        overrides=overrides,
     )
 
-    multimodel.generate_plot()
 
-    MetaModel(multimodel)
+def run_analysis(multimodel):
+    """
+    Runs the analysis stages which follow the loading and windowed aggregation of the models, each exactly once:
+    meta-aggregation, rendering (skipped in headless runs), and writing the statistics and the profile.
+
+    :param multimodel: MultiModel instance, with its models loaded and aggregated.
+    :return: None
+    """
+    from models.MetaModel import MetaModel
+
+    if multimodel.user_input["multimodel"] and multimodel.user_input["metamodel"]:
+        MetaModel(multimodel).output()
+
+    if not multimodel.user_input["headless"]:
+        multimodel.generate_plot()
+
+    multimodel.output_stats()
+    multimodel.output_profile()
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
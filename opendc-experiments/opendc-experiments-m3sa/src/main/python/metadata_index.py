@@ -0,0 +1,190 @@
+import json
+import os
+import warnings
+
+from constants import METADATA_FIELDS
+
+"""
+Metadata index of a simulation output. OpenDC describes the scenarios it ran in trackr.json (their topology, workload,
+allocation policy and carbon trace) and writes the output of each scenario to raw-output/<scenario id>. The index joins
+the two once, per output, such that the models can be selected by their metadata before any simulation data file is
+opened, and such that the models do not parse trackr.json again each.
+"""
+
+TRACKR_FILE = "trackr.json"
+
+_indexes = {}
+
+
+class MetadataIndex:
+    """
+    The metadata of every simulation folder of an output, parsed once.
+
+    Attributes:
+        output_folder_path (str): Path where the simulation output is stored.
+        simulation_folders (list of str): The simulation folders of the raw output, in model id order.
+        metadata (dict): Per simulation folder, its name (key 'name') and, per metadata field, the list of its values.
+        labels (dict): Per simulation folder and metadata field, the labels by which its values can be selected.
+
+    Methods:
+        model_ids(filters): Returns the model id of each simulation folder matching the filters.
+        describe(simulation_folder): Returns the metadata of a simulation folder.
+    """
+
+    def __init__(self, output_folder_path):
+        """
+        :param output_folder_path (str): Path where the simulation output is stored.
+        """
+        # imported here, such that validating the setup (which checks the filter fields) does not import PyArrow
+        from ingestion import sorted_simulation_folders
+
+        self.output_folder_path = output_folder_path
+        self.simulation_folders = sorted_simulation_folders(os.listdir(os.path.join(output_folder_path, "raw-output")))
+        entries = read_trackr(os.path.join(output_folder_path, TRACKR_FILE))
+        self.metadata = {folder: describe_entry(entries.get(folder, {}), folder) for folder in self.simulation_folders}
+        self.labels = {folder: entry_labels(entries.get(folder, {})) for folder in self.simulation_folders}
+
+    def model_ids(self, filters=None):
+        """
+        Selects the simulation folders whose metadata matches the filters. A folder matches if, for every filtered
+        field, one of its values matches one of the filter's values, by its full value (e.g., the path of the topology)
+        or by its name (e.g., the topology's file name, without extension). Without filters, every folder matches.
+
+        :param filters (dict): Per metadata field, the accepted values.
+        :return: dict: The matching simulation folders, with their model ids (their positions among all the folders).
+        """
+        return {
+            folder: model_id for model_id, folder in enumerate(self.simulation_folders)
+            if all(matches(self.labels[folder][field], accepted) for field, accepted in (filters or {}).items())
+        }
+
+    def describe(self, simulation_folder):
+        """
+        :param simulation_folder (str): The name of the simulation folder.
+        :return: dict: The name and metadata values of the folder; empty values if trackr.json does not describe it.
+        """
+        return self.metadata.get(simulation_folder) or describe_entry({}, simulation_folder)
+
+
+def load_metadata_index(output_folder_path):
+    """
+    Returns the metadata index of an output, parsing it only if trackr.json or the raw output folder have changed since
+    it was last parsed, such that all the models (and all the analyses of a batch, or of a server) share one index.
+
+    :param output_folder_path (str): Path where the simulation output is stored.
+    :return: MetadataIndex: The index of the output.
+    """
+    key = os.path.abspath(output_folder_path)
+    fingerprint = tuple(
+        (stat.st_size, stat.st_mtime_ns) if stat is not None else None
+        for stat in map(stat_or_none, [os.path.join(key, TRACKR_FILE), os.path.join(key, "raw-output")])
+    )
+    if key not in _indexes or _indexes[key][0] != fingerprint:
+        _indexes[key] = (fingerprint, MetadataIndex(output_folder_path))
+    return _indexes[key][1]
+
+
+def stat_or_none(path):
+    """
+    :param path (str): The path of a file or folder.
+    :return: os.stat_result: Its status, or None if it does not exist.
+    """
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def read_trackr(trackr_path):
+    """
+    Reads the scenario entries of trackr.json, per simulation folder. OpenDC writes a list of scenarios, where the
+    scenario with id i (or, without id, the i-th scenario) is output to raw-output/i; an object keyed by the scenario
+    ids is accepted as well. A missing, empty or unreadable file describes no folder.
+
+    :param trackr_path (str): The path of trackr.json.
+    :return: dict: Per simulation folder name, its scenario entry.
+    """
+    if not os.path.exists(trackr_path) or os.path.getsize(trackr_path) == 0:
+        return {}
+
+    try:
+        with open(trackr_path) as f:
+            trackr = json.load(f)
+    except json.JSONDecodeError as e:
+        warnings.warn(f"Failed to parse {trackr_path}: {e}. The models are loaded without their metadata.")
+        return {}
+
+    if isinstance(trackr, dict):
+        return {str(key): entry for key, entry in trackr.items() if isinstance(entry, dict)}
+    if not isinstance(trackr, list):
+        return {}
+
+    entries = {}
+    for position, entry in enumerate(trackr):
+        if isinstance(entry, dict):
+            scenario_id = entry.get("id", -1)
+            entries[str(scenario_id if isinstance(scenario_id, int) and scenario_id >= 0 else position)] = entry
+    return entries
+
+
+def describe_entry(entry, simulation_folder):
+    """
+    :param entry (dict): The scenario entry of trackr.json, which holds either a list of values per field (as in
+        'topologies') or a single value (as in 'topology').
+    :param simulation_folder (str): The name of the simulation folder, used as name if the entry has none.
+    :return: dict: The name of the scenario and, per metadata field, the list of its values (paths or names).
+    """
+    description = {"name": str(entry.get("name") or simulation_folder)}
+    for field, (_, label_keys) in METADATA_FIELDS.items():
+        labels_per_value = [value_labels(value, label_keys) for value in field_values(entry, field)]
+        description[field] = [labels[0] for labels in labels_per_value if labels]
+    return description
+
+
+def entry_labels(entry):
+    """
+    :param entry (dict): The scenario entry of trackr.json.
+    :return: dict: Per metadata field, the set of labels by which the entry's values can be selected.
+    """
+    return {
+        field: {label for value in field_values(entry, field) for label in value_labels(value, label_keys)}
+        for field, (_, label_keys) in METADATA_FIELDS.items()
+    }
+
+
+def field_values(entry, field):
+    """
+    :param entry (dict): The scenario entry of trackr.json.
+    :param field (str): The metadata field, e.g., 'topologies'.
+    :return: list: The values of the field, from its list (e.g., 'topologies') or its single value (e.g., 'topology').
+    """
+    values = entry.get(field, entry.get(METADATA_FIELDS[field][0]))
+    return values if isinstance(values, list) else [values]
+
+
+def value_labels(value, label_keys):
+    """
+    :param value: A metadata value: a path, or an object such as {"pathToFile": ...} or {"policyType": ...}.
+    :param label_keys (list of str): The keys of the object's descriptive labels.
+    :return: list of str: The labels by which the value can be selected, the main one first: the value itself (or the
+        first label of the object) and, for a path, its file name without extension. Empty for a missing value.
+    """
+    if isinstance(value, dict):
+        labels = [str(value[key]) for key in label_keys if value.get(key) is not None]
+    else:
+        labels = [str(value)] if value is not None else []
+
+    if labels:
+        name = os.path.splitext(os.path.basename(labels[0]))[0]
+        if name not in labels:
+            labels.append(name)
+    return labels
+
+
+def matches(labels, accepted):
+    """
+    :param labels (set of str): The labels of a folder's values for one field; see describe_entry.
+    :param accepted (list of str): The values accepted by the filter.
+    :return: bool: True if one of the accepted values is one of the labels.
+    """
+    return any(str(value) in labels for value in accepted)
@@ -0,0 +1,57 @@
+from .MetaModel import MetaModel
+
+
+class IncrementalMetaModel(MetaModel):
+    """
+    A Meta-Model computed from a running aggregate of the models' processed data (see running_aggregate.py), which is
+    updated as each model is added, instead of from a matrix stacking all the models. It is used in watch mode, where
+    the Meta-Model is refreshed each time simulations finish, without revisiting the models added before.
+
+    The mean is read from the aggregate's running sums, and the median from its quantile sketch, which is exact up to
+    running_aggregate.SKETCH_CAPACITY models; other meta-functions are applied to the aggregate's sorted values (see
+    RunningAggregate.sorted_values), as it does not keep the order of the models within a sample. The cumulative
+    Meta-Model is computed as by MetaModel, from the totals cached in the models' prefix sums.
+
+    Attributes:
+        aggregate (RunningAggregate): The running aggregate of the processed data of the models.
+    """
+
+    def __init__(self, multimodel, aggregate, meta_function=None):
+        """
+        :param multimodel: MultiModel instance containing the models to aggregate.
+        :param aggregate (RunningAggregate): The running aggregate of the processed data of the same models.
+        :param meta_function (function): The aggregation function; set from the configuration if None.
+        :raise ValueError: If metamodel functionality is not enabled in the configuration.
+        """
+        self.aggregate = aggregate
+        super().__init__(multimodel, meta_function)
+
+    def compute_time_series(self):
+        """
+        Aggregates time series data across models from the running aggregate.
+        :return: None
+        :side effect: Updates the meta_model's processed data with aggregated results.
+        """
+        self.meta_model.processed_sim_data = self.aggregated_values()
+        self.meta_model.raw_sim_data = self.meta_model.processed_sim_data
+
+    def compute_cumulative_time_series(self):
+        """
+        Aggregates cumulative time series data entries across models from the running aggregate.
+        :return: None
+        :side effect: Updates the meta_model's processed data with cumulative aggregated results.
+        """
+        self.meta_model.processed_sim_data = self.aggregated_values()
+
+    def aggregated_values(self):
+        """
+        :return: np.array: The meta-function of the models' processed data, per sample, in the precision of the
+            Multi-Model.
+        """
+        if self.meta_function == self.mean:
+            values = self.aggregate.mean()
+        elif self.meta_function == self.median:
+            values = self.aggregate.quantile(0.5)
+        else:
+            values = self.meta_function(self.aggregate.sorted_values())
+        return values.astype(self.multi_model.precision, copy=False)
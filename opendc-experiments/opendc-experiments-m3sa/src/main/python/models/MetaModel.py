@@ -1,7 +1,10 @@
 import numpy as np
 import os
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
+from out_of_core import apply_tiled, tile_width
+from pyramid import LINEAR_FUNCTIONS, cached_pyramid, derived_key
 from .Model import Model
 
 
@@ -17,6 +20,9 @@ class MetaModel:
         min_raw_model_len (int): Minimum length of raw data arrays across all models.
         min_processed_model_len (int): Minimum length of processed data arrays across all models.
         number_of_models (int): Number of models being aggregated.
+        models_matrix (np.array): The models' data, stacked into a contiguous (models x samples) matrix on which the
+            meta-function is applied as a single reduction over the models axis; None in the out-of-core mode, where
+            the meta-function is applied tile by tile (see out_of_core.apply_tiled).
         function_map (dict): Mapping of aggregation function names to function implementations.
     """
 
@@ -24,7 +30,8 @@ class MetaModel:
 
     def __init__(self, multimodel, meta_function=None):
         """
-        Initializes the Metamodel with a MultiModel instance and prepares aggregation functions based on configuration.
+        Initializes the Metamodel with a MultiModel instance, prepares aggregation functions based on configuration,
+        and computes the aggregated data. Nothing is plotted or written until output() is called.
 
         :param multimodel: MultiModel instance containing the models to aggregate.
         :raise ValueError: If metamodel functionality is not enabled in the configuration.
@@ -40,7 +47,7 @@ class MetaModel:
 
         self.multi_model = multimodel
         self.meta_model = Model(
-            raw_sim_data=[],
+            raw_sim_data=np.empty(0, dtype=multimodel.precision),
             id=self.META_MODEL_ID,
             path=self.multi_model.output_folder_path
         )
@@ -53,16 +60,18 @@ class MetaModel:
         self.min_raw_model_len = min([len(model.raw_sim_data) for model in self.multi_model.models])
         self.min_processed_model_len = min([len(model.processed_sim_data) for model in self.multi_model.models])
         self.number_of_models = len(self.multi_model.models)
-        self.compute()
-        self.output()
+        self.models_matrix = None
+        with self.multi_model.profiler.stage("meta-aggregate"):
+            self.compute()
 
     def output(self):
         """
-        Generates outputs by plotting the aggregated results and exporting the metamodel data to a file.
+        Adds the Meta-Model to the Multi-Model, such that it is rendered in the same (single) plotting pass as the
+        individual models, and exports the metamodel data to a file.
         :return: None
-        :side effect: Outputs data to files and generates plots.
+        :side effect: Appends the meta_model to the multi_model's models and outputs data to files.
         """
-        self.plot()
+        self.multi_model.models.append(self.meta_model)
         self.output_metamodel()
 
     def compute(self):
@@ -70,7 +79,7 @@ class MetaModel:
         Computes aggregated data based on the specified plot type from the configuration.
         :raise ValueError: If an unsupported plot type is specified in the configuration.
         """
-        if self.multi_model.plot_type == 'time_series':
+        if self.multi_model.plot_type in ('time_series', 'fan_chart'):
             self.compute_time_series()
         elif self.multi_model.plot_type == 'cumulative':
             self.compute_cumulative()
@@ -79,136 +88,190 @@ class MetaModel:
         else:
             raise ValueError("Invalid plot type in config file")
 
-    def plot(self):
-        """
-        Plots the aggregated data according to the specified plot type from the configuration.
-        :raise ValueError: If an unsupported plot type is specified.
-        """
-        if self.multi_model.plot_type == 'time_series':
-            self.plot_time_series()
-        elif self.multi_model.plot_type == 'cumulative':
-            self.plot_cumulative()
-        elif self.multi_model.plot_type == 'cumulative_time_series':
-            self.plot_cumulative_time_series()
-
-        else:
-            raise ValueError("Invalid plot type in config file")
-
     def compute_time_series(self):
         """
         Aggregates time series data across models using the specified aggregation function.
         :return: None
         :side effect: Updates the meta_model's processed data with aggregated results.
         """
-        for i in range(0, self.min_processed_model_len):
-            data_entries = []
-            for j in range(self.number_of_models):
-                data_entries.append(self.multi_model.models[j].processed_sim_data[i])
-            self.meta_model.processed_sim_data.append(self.meta_function(data_entries))
+        self.meta_model.processed_sim_data = self.aggregate_processed()
         self.meta_model.raw_sim_data = self.meta_model.processed_sim_data
 
-    def plot_time_series(self):
+    def compute_cumulative(self):
         """
-        Generates a time series plot of the aggregated data.
+        Aggregates cumulative data entries across all models: the mean of the models' totals over the samples all of
+        them cover, each looked up in the model's prefix sums instead of stacking and summing the models' data.
         :return: None
-        :side effect: Displays a time series plot using the multi_model's plotting capabilities.
+        :side effect: Updates the meta_model's cumulative data with aggregated results.
         """
-        self.multi_model.models.append(self.meta_model)
-        self.multi_model.generate_plot()
+        totals = []
+        for model in self.multi_model.models:
+            totals.append(model.total(0, self.min_raw_model_len))
+            self.multi_model.release(model)
+        self.meta_model.cumulated = round(float(np.mean(totals)), 2)
 
-    def compute_cumulative(self):
+    def compute_cumulative_time_series(self):
         """
-        Aggregates cumulative data entries across all models.
+        Aggregates cumulative time series data entries across models using the specified aggregation function.
         :return: None
-        :side effect: Updates the meta_model's cumulative data with aggregated results.
+        :side effect: Updates the meta_model's processed data with cumulative aggregated results.
         """
+        self.meta_model.processed_sim_data = self.aggregate_processed()
 
-        for i in range(0, self.min_raw_model_len):
-            data_entries = []
-            for j in range(self.number_of_models):
-                sim_data = self.multi_model.models[j].raw_sim_data
-                ith_element = sim_data[i]
-                data_entries.append(ith_element)
-            self.meta_model.cumulated += self.mean(data_entries)
-        self.meta_model.cumulated = round(self.meta_model.cumulated, 2)
+    def aggregate_processed(self):
+        """
+        Applies the meta-function to the models' processed data: from the Meta-Model's aggregate pyramid, if it has one
+        (see meta_pyramid), or from the matrix stacking the models' processed data otherwise.
 
-    def plot_cumulative(self):
+        :return: np.array: The aggregated processed data, in the precision of the Multi-Model.
         """
-        Generates a cumulative plot of the aggregated data.
-        :return: None
-        :side effect: Displays a cumulative plot using the multi_model's plotting capabilities.
+        pyramid = self.meta_pyramid()
+        if pyramid is not None:
+            return pyramid.windows(self.multi_model.window_size, self.multi_model.window_function).astype(
+                self.multi_model.precision, copy=False)
+
+        if self.multi_model.out_of_core:
+            return self.apply_tiled("processed_sim_data", self.min_processed_model_len)
+
+        self.models_matrix = self.stack_models("processed_sim_data", self.min_processed_model_len)
+        return self.meta_function(self.models_matrix)
+
+    def meta_pyramid(self):
         """
-        self.multi_model.models.append(self.meta_model)
-        self.multi_model.generate_plot()
+        Returns the aggregate pyramid of the Meta-Model's raw data (the mean of the models' raw data), from which its
+        windows are answered without stacking the models, if the windows commute with the mean: if the models' windows
+        are answered from their pyramids, the meta-function is the mean, the window function is linear (see
+        pyramid.LINEAR_FUNCTIONS), and the models have the same length, such that their last windows align. The pyramid
+        is saved beside the raw output, under a key derived from the models' keys, and only built on the first run.
 
-    def compute_cumulative_time_series(self):
+        :return: AggregatePyramid: The pyramid of the Meta-Model, or None if its windows cannot be answered from it.
+        :side effect: Sets the meta_model's pyramid and pyramid_key.
         """
-        Aggregates cumulative time series data entries across models using the specified aggregation function.
-        :return: None
-        :side effect: Updates the meta_model's processed data with cumulative aggregated results.
+        models = self.multi_model.models
+        if not self.multi_model.answers_from_pyramid() or self.meta_function != self.mean \
+                or self.multi_model.window_function not in LINEAR_FUNCTIONS:
+            return None
+        if not all(model.pyramid_key for model in models) or len(set(len(model.raw_sim_data) for model in models)) > 1:
+            return None
+
+        self.meta_model.pyramid_key = derived_key([model.pyramid_key for model in models], meta_function="mean")
+        self.meta_model.pyramid = cached_pyramid(
+            self.multi_model.output_folder_path,
+            self.meta_model.pyramid_key,
+            self.min_raw_model_len,
+            lambda: self.meta_function(self.raw_models_matrix()),
+        )
+        return self.meta_model.pyramid
+
+    def raw_models_matrix(self):
         """
-        for i in range(0, self.min_processed_model_len):
-            data_entries = []
-            for j in range(self.number_of_models):
-                data_entries.append(self.multi_model.models[j].processed_sim_data[i])
-            self.meta_model.processed_sim_data.append(self.meta_function(data_entries))
+        :return: np.array: The (models x samples) matrix of the models' raw data: the Multi-Model's raw_matrix itself,
+            without copying, if the models' raw data are its rows, as the models are aligned on their timestamps;
+            stacked from the models otherwise.
+        """
+        matrix = self.multi_model.raw_matrix
+        if matrix is not None and len(matrix) == self.number_of_models and all(
+                model.raw_sim_data.base is matrix for model in self.multi_model.models):
+            return matrix
+        return self.stack_models("raw_sim_data", self.min_raw_model_len)
 
-    def plot_cumulative_time_series(self):
+    def apply_tiled(self, attribute, length):
         """
-        Generates a cumulative time series plot of the aggregated data.
-        :return: None
-        :side effect: Displays a cumulative time series plot using the multi_model's plotting capabilities.
+        Applies the meta-function to the given data series of all models tile by tile, over ranges of samples sized to
+        the memory budget of the Multi-Model, instead of to a matrix stacking all of them; the results are the same,
+        and are written to a memory-mapped array (see MultiModel.allocate).
+
+        :param attribute (str): The name of the model attribute to aggregate, e.g., 'processed_sim_data'.
+        :param length (int): The number of samples aggregated from each model.
+        :return: np.array: The aggregated data.
         """
-        self.multi_model.models.append(self.meta_model)
-        self.multi_model.generate_plot()
+        return apply_tiled(self.meta_function, [getattr(model, attribute) for model in self.multi_model.models],
+                           length, self.multi_model.memory_budget_bytes(), self.multi_model.precision,
+                           allocate=self.multi_model.allocate)
+
+    def stack_models(self, attribute, length):
+        """
+        Stacks the given data series of all models into one contiguous matrix, with one row per model. Each series is
+        truncated to the given length, so that all rows are aligned sample by sample.
+
+        :param attribute (str): The name of the model attribute to stack, e.g., 'processed_sim_data'.
+        :param length (int): The number of samples kept from each model.
+        :return: np.array: A (models x samples) matrix, in the precision of the Multi-Model.
+        """
+        models_matrix = np.empty((self.number_of_models, length), dtype=self.multi_model.precision)
+        for row, model in enumerate(self.multi_model.models):
+            models_matrix[row] = getattr(model, attribute)[:length]
+        return models_matrix
 
     def output_metamodel(self):
         """
-        Exports the processed sim data of the metamodel to a parquet file for further analysis or record keeping.
+        Exports the processed sim data of the metamodel to a parquet file for further analysis or record keeping. In the
+        out-of-core mode, the data is written in chunks sized to the memory budget, one row group per chunk.
         :return: None
         :side effect: Writes data to a parquet file at the specified directory path.
         """
         directory_path = os.path.join(self.multi_model.output_folder_path, "raw-output/metamodel/seed=0")
         os.makedirs(directory_path, exist_ok=True)
-        current_path = os.path.join(directory_path, f"{self.multi_model.metric}.parquet")
-        df = pd.DataFrame({'processed_sim_data': self.meta_model.processed_sim_data})
-        df.to_parquet(current_path, index=False)
+        current_path = os.path.join(directory_path, f"{self.multi_model.metric}{self.multi_model.variant_suffix()}.parquet")
+        # built from the array's buffer, as pa.array would import pandas to check whether the data is a pandas object
+        data = np.ascontiguousarray(self.meta_model.processed_sim_data)
+        if not self.multi_model.out_of_core:
+            pq.write_table(self.table(data), current_path)
+            return
+
+        chunk = tile_width(1, data.itemsize, self.multi_model.memory_budget_bytes())
+        with pq.ParquetWriter(current_path, self.table(data[:0]).schema) as writer:
+            for start in range(0, len(data), chunk):
+                writer.write_table(self.table(data[start:start + chunk]), row_group_size=chunk)
 
-    def mean(self, chunks):
+    @staticmethod
+    def table(data):
         """
-        Calculates the mean of a list of numerical data.
+        :param data (np.array): The contiguous data of the Meta-Model, or a chunk of it.
+        :return: pa.Table: The table of the data, with its single 'processed_sim_data' column.
+        """
+        column = pa.Array.from_buffers(pa.from_numpy_dtype(data.dtype), len(data), [None, pa.py_buffer(data)])
+        return pa.Table.from_arrays([column], names=['processed_sim_data'])
 
-        :param chunks (list): The data over which to calculate the mean.
-        :return: float: The mean of the provided data.
+    def mean(self, models_matrix):
         """
-        return np.mean(chunks)
+        Calculates, for every sample, the mean across the models.
 
-    def median(self, chunks):
+        :param models_matrix (np.array): The (models x samples) matrix over which to calculate the mean.
+        :return: np.array: The mean of each sample.
         """
-        Calculates the median of a list of numerical data.
+        return np.mean(models_matrix, axis=0)
 
-        :param chunks (list): The data over which to calculate the median.
-        :return: float: The median of the provided data.
+    def median(self, models_matrix):
         """
-        return np.median(chunks)
+        Calculates, for every sample, the median across the models.
 
-    def meta_equation1(self, chunks):
+        :param models_matrix (np.array): The (models x samples) matrix over which to calculate the median.
+        :return: np.array: The median of each sample.
         """
-        Calculates a weighted mean where the weights are inversely proportional to the absolute difference from the median value.
-        :param chunks (list): Data chunks from which to calculate the weighted mean.
-        :return: float: The calculated weighted mean.
+        return np.median(models_matrix, axis=0)
+
+    def meta_equation1(self, models_matrix):
         """
+        Calculates, for every sample, a weighted mean across the models, where the weight of a model is inversely
+        proportional to its absolute difference from the median of the sample, such that outlying models weigh less.
 
-        """Attempt 1"""
-        # median_val = np.median(chunks)
-        # proximity_weights = 1 / (1 + np.abs(chunks - median_val))  # Avoid division by zero
-        # weighted_mean = np.sum(proximity_weights * chunks) / np.sum(proximity_weights)
-        # return weighted_mean
+        :param models_matrix (np.array): The (models x samples) matrix from which to calculate the weighted mean.
+        :return: np.array: The calculated weighted mean of each sample.
+        """
+        median_val = np.median(models_matrix, axis=0)
+        proximity_weights = 1 / (1 + np.abs(models_matrix - median_val))  # Avoid division by zero
+        return np.sum(proximity_weights * models_matrix, axis=0) / np.sum(proximity_weights, axis=0)
 
-        """Attempt 2 Inter-Quartile Mean (same accuracy as mean)"""
-        # sorted_preds = np.sort(chunks, axis=0)
-        # Q1 = int(np.floor(0.25 * len(sorted_preds)))
-        # Q3 = int(np.floor(0.75 * len(sorted_preds)))
-        #
-        # iqm = np.mean(sorted_preds[Q1:Q3], axis=0)
-        # return iqm
+
+def is_meta_model(model):
+    """
+    Check if the given model is a MetaModel based on its ID. A metamodel will always have an id of -101.
+
+    Args:
+        model (Model): The model to check.
+
+    Returns:
+        bool: True if model is MetaModel, False otherwise.
+    """
+    return model.id == MetaModel.META_MODEL_ID
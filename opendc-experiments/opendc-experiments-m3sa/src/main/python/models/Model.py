@@ -5,25 +5,52 @@ and further in the MetaModel class.
 
 :param sim: the simulation data of the model
 """
-import json
 from dataclasses import dataclass, field
 
-@dataclass
+import numpy as np
+
+from cumulative import prefix_sums, range_total
+from metadata_index import load_metadata_index
+from pyramid import cached_pyramid
+
+
+def empty_series():
+    return np.empty(0)
+
+
+def empty_timestamps():
+    return np.empty(0, dtype=np.int64)
+
+
+@dataclass(slots=True)
 class Model:
     """
     Represents a single simulation output containing various data metrics collected under specific simulation conditions.
     A Model object stores raw and processed simulation data and is designed to interact with higher-level structures like
-    MultiModel and MetaModel for complex data analysis.
+    MultiModel and MetaModel for complex data analysis. The class is slotted, and its data series are contiguous NumPy
+    arrays (float64, or float32 in the reduced precision mode), which processing steps share or view instead of copying.
 
     Attributes:
-        raw_sim_data (list): Initial raw data from the simulator output.
-        processed_sim_data (list): Data derived from raw_sim_data after applying certain processing operations like aggregation or smoothing.
-        cumulative_time_series_values (list): Stores cumulative data values useful for time series analysis.
+        raw_sim_data (np.array): Initial raw data from the simulator output; with several seeds, the mean of the seeds.
+        seed_data (np.array): With several seeds, the (seeds x samples) block of the seeds' raw data; empty otherwise.
+        timestamps (np.array): The int64 simulation timestamps of the samples of raw_sim_data, shared by the models
+            aligned together (see alignment.py).
+        processed_sim_data (np.array): Data derived from raw_sim_data after applying certain processing operations like aggregation or smoothing.
+            For a window size of 1, it is raw_sim_data itself.
+        processed_window (tuple): The (window_size, window_function) with which processed_sim_data was computed, or None.
+        cumulative_time_series_values (np.array): Stores cumulative data values useful for time series analysis; computed only for cumulative plots.
         id (int): Unique identifier for the model, typically used for tracking and referencing within analysis tools.
         path (str): Base path for storing or accessing related data files.
         cumulated (float): Cumulative sum of processed data, useful for quick summaries and statistical analysis.
+        prefix_sums (np.array): The float64 prefix sums of raw_sim_data, with a leading zero, computed once on first
+            use; cumulative totals over any sample range are lookups into it.
+        pyramid (AggregatePyramid): The aggregate pyramid of raw_sim_data (see pyramid.py), loaded or built on first use;
+            windows of any size, over any sample range, are answered from it.
+        pyramid_key (str): The key under which the pyramid is saved beside the raw output (see pyramid.pyramid_key);
+            empty if the pyramid is not saved.
         experiment_name (str): A descriptive name for the experiment associated with this model, potentially extracted from external metadata.
-        margins_of_error (list): Stores error margins associated with the data, useful for uncertainty analysis.
+        margins_of_error (np.array): With several seeds, the margin of error (half-width of the confidence interval
+            across the seeds) of each value of processed_sim_data; empty otherwise.
         topologies (list): Describes the network or system topologies used during the simulation.
         workloads (list): Lists the types of workloads applied during the simulation, affecting the simulation's applicability and scope.
         allocation_policies (list): Details the resource allocation policies used, which influence the simulation outcomes.
@@ -31,20 +58,32 @@ class Model:
 
     Methods:
         parse_trackr(): Reads additional configuration and metadata from a JSON file named 'trackr.json', enhancing the model with detailed context information.
+        set_metadata(description): Sets the experiment name, topologies, workloads, policies and carbon traces of the model.
+        copy_metadata(model): Sets the metadata of the model from another model of the same simulation folder.
+        cumulative_prefix(): Returns the prefix sums of the raw data, computing them if needed.
+        total(start, stop): Returns the total of the raw data over a sample range, in constant time.
+        aggregate_pyramid(): Returns the aggregate pyramid of the raw data, loading or building it if needed.
 
     Usage:
-        Model objects are typically instantiated with raw data from simulation outputs and an identifier. After instantiation,
-        the 'parse_trackr' method can be called to load additional experimental details from a corresponding JSON file.
+        Model objects are typically instantiated with raw data from simulation outputs and an identifier. The MultiModel
+        sets their metadata from the metadata index of the output (see metadata_index.py); a model created otherwise
+        can call the 'parse_trackr' method to load it.
     """
 
     path: str
-    raw_sim_data: list
+    raw_sim_data: np.ndarray
     id: int
-    processed_sim_data: list = field(default_factory=list)
-    cumulative_time_series_values: list = field(default_factory=list)
+    seed_data: np.ndarray = field(default_factory=empty_series)
+    timestamps: np.ndarray = field(default_factory=empty_timestamps)
+    processed_sim_data: np.ndarray = field(default_factory=empty_series)
+    processed_window: tuple = None
+    cumulative_time_series_values: np.ndarray = field(default_factory=empty_series)
     cumulated: float = 0.0
+    prefix_sums: np.ndarray = field(default_factory=empty_series)
+    pyramid: object = None
+    pyramid_key: str = ""
     experiment_name: str = ""
-    margins_of_error: list = field(default_factory=list)
+    margins_of_error: np.ndarray = field(default_factory=empty_series)
     topologies: list = field(default_factory=list)
     workloads: list = field(default_factory=list)
     allocation_policies: list = field(default_factory=list)
@@ -52,19 +91,63 @@ class Model:
 
     def parse_trackr(self):
         """
-        Parses the 'trackr.json' file located in the model's base path to extract and store detailed experimental metadata.
-        This method enhances the model with comprehensive contextual information about the simulation environment.
+        Reads the metadata of the model from the metadata index of the output in the model's base path, which parses
+        'trackr.json' once for all the models. The model's id is its position among the simulation folders.
 
         :return: None
         :side effect: Updates model attributes with data from the 'trackr.json' file, such as experiment names, topologies, and policies.
-        :raises FileNotFoundError: If the 'trackr.json' file does not exist at the specified path.
-        :raises json.JSONDecodeError: If there is an error parsing the JSON data.
+        :raises FileNotFoundError: If the raw output folder does not exist at the specified path.
+        """
+        index = load_metadata_index(self.path)
+        if 0 <= self.id < len(index.simulation_folders):
+            self.set_metadata(index.describe(index.simulation_folders[self.id]))
+
+    def set_metadata(self, description):
+        """
+        :param description (dict): The metadata of the model's simulation folder, as described by the metadata index.
+        :return: None
+        :side effect: Updates the experiment name, topologies, workloads, allocation policies and carbon trace paths.
+        """
+        self.experiment_name = description["name"]
+        self.topologies = description["topologies"]
+        self.workloads = description["workloads"]
+        self.allocation_policies = description["allocationPolicies"]
+        self.carbon_trace_paths = description["carbonTracePaths"]
+
+    def copy_metadata(self, model):
+        """
+        :param model (Model): A model of the same simulation folder, whose metadata is set.
+        :return: None
+        :side effect: Updates the experiment name, topologies, workloads, allocation policies and carbon trace paths.
+        """
+        self.experiment_name = model.experiment_name
+        self.topologies = model.topologies
+        self.workloads = model.workloads
+        self.allocation_policies = model.allocation_policies
+        self.carbon_trace_paths = model.carbon_trace_paths
+
+    def cumulative_prefix(self):
+        """
+        :return: np.array: The prefix sums of raw_sim_data (see cumulative.prefix_sums), cached on the model.
+        :side effect: Computes and stores prefix_sums, if they are missing or do not match the raw data.
+        """
+        if len(self.prefix_sums) != len(self.raw_sim_data) + 1:
+            self.prefix_sums = prefix_sums(self.raw_sim_data)
+        return self.prefix_sums
+
+    def total(self, start=0, stop=None):
+        """
+        :param start (int): The first sample of the range.
+        :param stop (int): The sample after the last one of the range; the end of the raw data if None.
+        :return: float: The total of the raw data over the samples [start, stop).
+        """
+        return range_total(self.cumulative_prefix(), start, stop)
+
+    def aggregate_pyramid(self):
+        """
+        :return: AggregatePyramid: The aggregate pyramid of raw_sim_data, cached on the model.
+        :side effect: Loads (or builds and saves) the pyramid, if it is missing or does not match the raw data.
         """
-        trackr_path = self.path + "/trackr.json"
-        with open(trackr_path) as f:
-            trackr = json.load(f)
-            self.experiment_name = trackr.get(self.id, {}).get('name', "")
-            self.topologies = trackr.get(self.id, {}).get('topologies', [])
-            self.workloads = trackr.get(self.id, {}).get('workloads', [])
-            self.allocation_policies = trackr.get(self.id, {}).get('allocationPolicies', [])
-            self.carbon_trace_paths = trackr.get(self.id, {}).get('carbonTracePaths', [])
+        if self.pyramid is None or len(self.pyramid) != len(self.raw_sim_data):
+            self.pyramid = cached_pyramid(self.path, self.pyramid_key, len(self.raw_sim_data), lambda: self.raw_sim_data)
+        return self.pyramid
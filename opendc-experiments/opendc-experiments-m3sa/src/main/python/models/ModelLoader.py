@@ -0,0 +1,392 @@
+import os
+from functools import partial
+
+import numpy as np
+
+from alignment import align, common_timestamps, same_timestamps, stack_aligned, timestamps_digest
+from ingestion import TIMESTAMP_COLUMN, profiled_read, read_many, read_reduced_metrics, stream_reduced_metrics
+from metadata_index import load_metadata_index
+from out_of_core import SpillFile
+from profiling import timed
+from pyramid import pyramid_key
+from simulator_specifics import *
+from .MetaModel import is_meta_model
+from .Model import Model
+
+
+class ModelLoader:
+    """
+    Loads the models of a Multi-Model: it selects the simulation folders, reads (or serves from the cache) the reduced
+    series of their simulation data files, stacks the seeds of each model, and aligns the models on their timestamps
+    into the Multi-Model's raw matrix. Models already loaded by another Multi-Model are shared instead, and aligned
+    again if their timestamps differ. The settings of the reads (metric, seeds, timestamp range, ingestion mode, cache,
+    out-of-core mode) are those of the Multi-Model.
+
+    Attributes:
+        multi_model (MultiModel): The Multi-Model whose models are loaded.
+
+    Methods:
+        load_models(raw_series, timestamps): Reads the simulation data files and initializes the models.
+        align_models(raw_series, timestamps, unit_scaling): Aligns the models' series on their common timestamps.
+        read_out_of_core(paths_per_model, metrics): Reads the simulation data files in groups, spilling the series.
+        pyramid_key(paths): Returns the key of the aggregate pyramid of a model.
+        seed_paths(simulation_folder): Lists the paths of the simulation data files of a model, one per seed read.
+        stack_models(series_per_metric, paths_per_model): Stacks the series of the seeds of each model.
+        share_models(models): Initializes the models from models already loaded by another Multi-Model.
+        realign_models(models): Initializes the models from loaded models with different timestamps.
+        read_simulation_data(paths, metrics, first_model): Reads the reduced metrics of each simulation data file.
+        add_ingestion_records(model_id, timings): Adds the measurements of reading one file to the profile.
+    """
+
+    def __init__(self, multi_model):
+        """
+        :param multi_model (MultiModel): The Multi-Model whose models are loaded, with its settings parsed.
+        """
+        self.multi_model = multi_model
+
+    def load_models(self, raw_series=None, timestamps=None):
+        """
+        Initializes models from the simulation output stored in Parquet files. This method reads, from each Parquet
+        file, only the timestamp and metric columns (optionally limited to the [timestamp_min, timestamp_max] range),
+        sums the metric per timestamp, and initializes Model instances, appended to the Multi-Model's models. The files
+        are read concurrently by `ingestion_workers` workers; model ids follow the sorted order of the simulation
+        folders, independently of the order in which the reads complete. The extra metrics, if any, are read and summed
+        in the same pass, and their series are kept in the Multi-Model's extra_series.
+
+        When several seeds are read, the files of all the seeds of all the models are read together, and the series of
+        each model's seeds are stacked, on the timestamps all the seeds cover, into a (seeds x samples) block, kept in
+        the model's seed_data; the raw data of the model is then the mean of its seeds.
+
+        The models are then aligned on their timestamps (see align_models), instead of sample by sample: their raw
+        data is stacked into one (models x samples) matrix, raw_matrix, of which each model's raw data is a row.
+
+        In the out-of-core mode, the files are read a few at a time (see read_out_of_core), and the series read, as
+        well as raw_matrix and the seeds' blocks, are memory-mapped files rather than arrays held in memory.
+
+        Only the simulation folders whose metadata (from the metadata index over trackr.json) matches the model
+        filters are read; the models keep the ids of their folders, and their metadata is set from the index.
+
+        :param raw_series (list of np.array): The unscaled series of the metric, if already read; read if None.
+        :param timestamps (list of np.array): The timestamps of the raw series, if already read.
+        :return: None
+        :raise ValueError: If the unit scaling has not been set prior to model initialization, or if no simulation
+            folder matches the model filters.
+        """
+        multi_model = self.multi_model
+        if multi_model.unit_scaling is None:
+            raise ValueError("Unit scaling factor is not set. Please ensure it is set correctly.")
+
+        multi_model.metadata_index = load_metadata_index(multi_model.output_folder_path)
+        simulation_folders = multi_model.metadata_index.model_ids(multi_model.model_filters)
+        if multi_model.simulation_folders is not None:
+            simulation_folders = {
+                folder: model_id for folder, model_id in simulation_folders.items()
+                if folder in multi_model.simulation_folders
+            }
+        if not simulation_folders:
+            raise ValueError("No simulation folder matches the model_filters. Please check the filters against the "
+                             "topologies, workloads, allocation policies and carbon traces in trackr.json.")
+
+        paths_per_model = [self.seed_paths(simulation_folder) for simulation_folder in simulation_folders]
+        if raw_series is None:
+            if multi_model.out_of_core:
+                series_per_metric = self.read_out_of_core(paths_per_model,
+                                                          [multi_model.metric] + multi_model.extra_metrics)
+            else:
+                series_per_metric = self.read_simulation_data(
+                    [path for paths in paths_per_model for path in paths],
+                    [multi_model.metric] + multi_model.extra_metrics
+                )
+                if multi_model.multi_seed:
+                    series_per_metric = self.stack_models(series_per_metric, paths_per_model)
+            timestamps = series_per_metric[TIMESTAMP_COLUMN]
+            raw_series = series_per_metric.pop(multi_model.metric)
+            multi_model.extra_series = series_per_metric
+
+        seed_blocks = self.align_models(raw_series, timestamps, multi_model.unit_scaling)
+        for row, ((simulation_folder, model_id), paths) in enumerate(zip(simulation_folders.items(), paths_per_model)):
+            model = Model(raw_sim_data=multi_model.raw_matrix[row], seed_data=seed_blocks[row],
+                          timestamps=multi_model.timestamps, id=model_id, path=multi_model.output_folder_path)
+            if multi_model.aggregate_pyramids and not multi_model.multi_seed and not multi_model.out_of_core:
+                model.pyramid_key = self.pyramid_key(paths)
+            model.set_metadata(multi_model.metadata_index.describe(simulation_folder))
+            multi_model.models.append(model)
+
+        multi_model.set_model_lengths()
+
+    def align_models(self, raw_series, timestamps, unit_scaling):
+        """
+        Aligns the models on their timestamps: the common timestamps of the models are computed (see
+        alignment.common_timestamps), and the raw data of each model is placed, scaled to the unit of the analysis, at
+        the positions of its own timestamps in one (models x samples) matrix. Models which share their timestamps (as
+        the models of one simulation sweep usually do) are copied into the matrix as they are.
+
+        :param raw_series (list of np.array): The unscaled series of each model; with several seeds, the (seeds x
+            samples) block of each model.
+        :param timestamps (list of np.array): The sorted timestamps of each series.
+        :param unit_scaling (float): The factor by which the series are divided; 1 for series already scaled.
+        :return: list of np.array: With several seeds, the aligned and scaled (seeds x samples) block of each model;
+            empty arrays otherwise.
+        :side effect: Sets the Multi-Model's timestamps and raw_matrix.
+        """
+        multi_model = self.multi_model
+        multi_model.timestamps = common_timestamps(timestamps, multi_model.model_alignment)
+        multi_model.raw_matrix = multi_model.allocate((len(raw_series), len(multi_model.timestamps)),
+                                                      multi_model.precision)
+        seed_counts = [len(raw) if raw.ndim == 2 else 0 for raw in raw_series]
+        seed_matrix = multi_model.allocate((sum(seed_counts), len(multi_model.timestamps)), multi_model.precision)
+        fill_value = multi_model.alignment_fill_value * unit_scaling
+
+        seed_blocks, first_seed = [], 0
+        for row, (raw, raw_timestamps) in enumerate(zip(raw_series, timestamps)):
+            if raw.ndim == 2:
+                block = seed_matrix[first_seed:first_seed + len(raw)]
+                first_seed += len(raw)
+                align(raw, raw_timestamps, multi_model.timestamps, fill_value, out=block)
+                np.divide(block, unit_scaling, out=block)
+                multi_model.raw_matrix[row] = block.mean(axis=0)
+                seed_blocks.append(block)
+            else:
+                align(raw, raw_timestamps, multi_model.timestamps, fill_value, out=multi_model.raw_matrix[row])
+                np.divide(multi_model.raw_matrix[row], unit_scaling, out=multi_model.raw_matrix[row])
+                seed_blocks.append(np.empty(0, dtype=multi_model.precision))
+        return seed_blocks
+
+    def read_out_of_core(self, paths_per_model, metrics):
+        """
+        Reads the simulation data files of the out-of-core mode: the files of a few models at a time (about one per
+        ingestion worker), batch by batch (see ingestion.stream_reduced_metrics), whose series are stacked per model
+        (with several seeds) and spilled to one memory-mapped file, such that only the series of the models being read
+        are held in memory.
+
+        :param paths_per_model (list of list of str): The files of each model, one per seed.
+        :param metrics (list of str): The metrics to reduce.
+        :return: dict: As read_simulation_data (or, with several seeds, stack_models) returns, with memory-mapped
+            series.
+        """
+        multi_model = self.multi_model
+        spill_file = SpillFile(multi_model.spill_folder_path)
+        indices = {metric: [] for metric in [TIMESTAMP_COLUMN] + list(metrics)}
+        group, first_model = [], 0
+        for i, paths in enumerate(paths_per_model):
+            group.append(paths)
+            if sum(len(paths) for paths in group) < multi_model.ingestion_workers and i < len(paths_per_model) - 1:
+                continue
+
+            series_per_metric = self.read_simulation_data([path for paths in group for path in paths], metrics,
+                                                          first_model=first_model)
+            if multi_model.multi_seed:
+                series_per_metric = self.stack_models(series_per_metric, group)
+            for metric, series in series_per_metric.items():
+                indices[metric].extend(spill_file.append(values) for values in series)
+            first_model += sum(len(paths) for paths in group)
+            group = []
+
+        mapped = spill_file.map()
+        return {metric: [mapped[index] for index in metric_indices] for metric, metric_indices in indices.items()}
+
+    def pyramid_key(self, paths):
+        """
+        :param paths (list of str): The simulation data files of a model.
+        :return: str: The key of the model's aggregate pyramid, which changes whenever a file is rewritten or the data
+            is read with another metric, unit scaling, timestamp range or precision, or aligned on other timestamps.
+        """
+        multi_model = self.multi_model
+        return pyramid_key(
+            paths,
+            metric=multi_model.metric,
+            unit_scaling=multi_model.unit_scaling,
+            timestamp_min=multi_model.timestamp_min,
+            timestamp_max=multi_model.timestamp_max,
+            precision=np.dtype(multi_model.precision).name,
+            model_alignment=multi_model.model_alignment,
+            alignment_fill_value=multi_model.alignment_fill_value,
+            timestamps=timestamps_digest(multi_model.timestamps),
+        )
+
+    def seed_paths(self, simulation_folder):
+        """
+        Lists the simulation data files of a model: the file of the seed read, or, with several seeds, the files of the
+        seeds listed by the user (or of all the seed folders of the model, in numerical order).
+
+        :param simulation_folder (str): The name of the model's folder in the raw output.
+        :return: list of str: The paths of the simulation data files, one per seed.
+        :raise ValueError: If a model has none of the requested seeds.
+        """
+        multi_model = self.multi_model
+        folder_path = f"{multi_model.raw_output_path}/{simulation_folder}"
+        if multi_model.seed == "all":
+            seeds = sorted(
+                int(name.split("=", 1)[1]) for name in os.listdir(folder_path)
+                if name.startswith("seed=") and name.split("=", 1)[1].isdigit()
+            )
+            if not seeds:
+                raise ValueError(f"No seed folders found for model {simulation_folder}. Please check the raw output.")
+        else:
+            seeds = multi_model.seed if multi_model.multi_seed else [multi_model.seed]
+        return [f"{folder_path}/seed={seed}/{SIMULATION_DATA_FILE}.parquet" for seed in seeds]
+
+    @staticmethod
+    def stack_models(series_per_metric, paths_per_model):
+        """
+        Regroups the series read from the files of all the models into one (seeds x samples) block per model and
+        metric, aligned on the timestamps all the seeds of the model cover.
+
+        :param series_per_metric (dict): Per metric, the series of each file, in the order of the flattened
+            paths_per_model; and, under TIMESTAMP_COLUMN, the timestamps of each file.
+        :param paths_per_model (list of list of str): The files of each model, one per seed.
+        :return: dict: Per metric, the (seeds x samples) block of each model; and, under TIMESTAMP_COLUMN, the
+            timestamps of each block.
+        """
+        seed_timestamps = series_per_metric[TIMESTAMP_COLUMN]
+        stacked = {metric: [] for metric in series_per_metric}
+        start = 0
+        for paths in paths_per_model:
+            timestamps = seed_timestamps[start:start + len(paths)]
+            for metric, series in series_per_metric.items():
+                if metric != TIMESTAMP_COLUMN:
+                    model_timestamps, block = stack_aligned(series[start:start + len(paths)], timestamps)
+                    stacked[metric].append(block)
+            stacked[TIMESTAMP_COLUMN].append(model_timestamps)
+            start += len(paths)
+        return stacked
+
+    def share_models(self, models):
+        """
+        Initializes the models from models already loaded by another Multi-Model. The raw data arrays are shared, while
+        the processed data is computed anew, such that this Multi-Model can aggregate and plot with its own settings;
+        processed data computed with the same window size and function is shared as well.
+
+        Models loaded by different Multi-Models (e.g., in watch mode, as the simulations finish) may have different
+        timestamps; they are then aligned again (see realign_models), and their processed data is computed anew.
+
+        :param models (list of Model): The loaded models; a Meta-Model among them is left out.
+        :return: None
+        """
+        multi_model = self.multi_model
+        multi_model.metadata_index = load_metadata_index(multi_model.output_folder_path)
+        models = [model for model in models if not is_meta_model(model)]
+        if not all(same_timestamps(model.timestamps, models[0].timestamps) for model in models):
+            self.realign_models(models)
+            return
+
+        multi_model.timestamps = models[0].timestamps
+        matrix = models[0].raw_sim_data.base
+        if isinstance(matrix, np.ndarray) and len(matrix) == len(models) and all(
+                model.raw_sim_data.base is matrix for model in models):
+            multi_model.raw_matrix = matrix
+        for model in models:
+            shared = Model(raw_sim_data=model.raw_sim_data, seed_data=model.seed_data, timestamps=model.timestamps,
+                           prefix_sums=model.prefix_sums, pyramid=model.pyramid, pyramid_key=model.pyramid_key,
+                           id=model.id, path=multi_model.output_folder_path)
+            shared.copy_metadata(model)
+            if model.processed_window == (multi_model.window_size, multi_model.window_function):
+                shared.processed_sim_data = model.processed_sim_data
+                shared.margins_of_error = model.margins_of_error
+                shared.processed_window = model.processed_window
+            multi_model.models.append(shared)
+
+        multi_model.set_model_lengths()
+
+    def realign_models(self, models):
+        """
+        Initializes the models from loaded models with different timestamps, aligned on their common timestamps. Their
+        pyramids are built in memory only, as they are keyed by the files of one model, not by the models aligned with
+        it.
+
+        :param models (list of Model): The loaded models, without a Meta-Model.
+        :return: None
+        """
+        multi_model = self.multi_model
+        raw_series = [model.seed_data if model.seed_data.ndim == 2 else model.raw_sim_data for model in models]
+        seed_blocks = self.align_models(raw_series, [model.timestamps for model in models], unit_scaling=1)
+        for row, model in enumerate(models):
+            realigned = Model(raw_sim_data=multi_model.raw_matrix[row], seed_data=seed_blocks[row],
+                              timestamps=multi_model.timestamps, id=model.id, path=multi_model.output_folder_path)
+            realigned.copy_metadata(model)
+            multi_model.models.append(realigned)
+
+        multi_model.set_model_lengths()
+
+    def read_simulation_data(self, paths_of_parquet_files, metrics, first_model=0):
+        """
+        Reads the reduced, per-timestamp metrics of each simulation data file. Series found in the on-disk cache are
+        served from it; only the files with a missing series are decoded (concurrently, each file once, for all the
+        metrics), and their series are added to the cache. In the 'streaming' ingestion mode, and in the out-of-core
+        mode, files are decoded batch by batch, for files larger than the memory. When profiling, each model's reading
+        is measured (in its worker) and added to the profile.
+
+        :param paths_of_parquet_files (list of str): The paths of the simulation data files.
+        :param metrics (list of str): The metrics to reduce.
+        :param first_model (int): The index, in the profile, of the model read from the first file.
+        :return: dict: Per metric, the list of reduced series (np.array), in the order of the given paths; and, under
+            TIMESTAMP_COLUMN, the list of their timestamps.
+        """
+        multi_model = self.multi_model
+        range_parameters = {
+            "timestamp_min": multi_model.timestamp_min,
+            "timestamp_max": multi_model.timestamp_max,
+        }
+        if multi_model.ingestion_mode == "streaming" or multi_model.out_of_core:
+            reader = partial(stream_reduced_metrics, metrics=metrics, batch_size=multi_model.streaming_batch_size,
+                             **range_parameters)
+        else:
+            reader = partial(read_reduced_metrics, metrics=metrics, **range_parameters)
+
+        if multi_model.profiler.enabled:
+            reader = partial(profiled_read, reader)
+
+        fields = [TIMESTAMP_COLUMN] + list(metrics)
+        keys = [{} for _ in paths_of_parquet_files]
+        raw_series = [{} for _ in paths_of_parquet_files]
+        if multi_model.cache is not None:
+            for i, path in enumerate(paths_of_parquet_files):
+                timings = {} if multi_model.profiler.enabled else None
+                with timed(timings, "ingest"):
+                    for metric in fields:
+                        keys[i][metric] = multi_model.cache.key(path, metric=metric, **range_parameters)
+                        raw = multi_model.cache.get(keys[i][metric])
+                        if raw is not None:
+                            raw_series[i][metric] = raw
+                if timings is not None and len(raw_series[i]) == len(fields):
+                    multi_model.profiler.add({"stage": "ingest", "model": first_model + i, **timings["ingest"],
+                                              "cache_hit": True})
+        missing = [i for i, series in enumerate(raw_series) if len(series) < len(fields)]
+
+        read_series = read_many(
+            paths=[paths_of_parquet_files[i] for i in missing],
+            reader=reader,
+            workers=multi_model.ingestion_workers,
+            executor=multi_model.ingestion_executor
+        )
+        for i, series in zip(missing, read_series):
+            if multi_model.profiler.enabled:
+                series, timings = series
+                self.add_ingestion_records(first_model + i, timings)
+            for metric, raw in series.items():
+                if multi_model.cache is not None and metric not in raw_series[i]:
+                    multi_model.cache.put(keys[i][metric], raw)
+                raw_series[i][metric] = raw
+
+        return {metric: [series[metric] for series in raw_series] for metric in fields}
+
+    def add_ingestion_records(self, model_id, timings):
+        """
+        Adds the measurements of reading one simulation data file to the profile, as an 'ingest' record (decoding,
+        with the volume read) and a 'reduce' record (the per-timestamp reduction).
+
+        :param model_id (int): The id of the model read from the file.
+        :param timings (dict): The measurements recorded by the reader.
+        :return: None
+        """
+        ingest, reduce = timings["ingest"], timings["reduce"]
+        self.multi_model.profiler.add({
+            "stage": "ingest",
+            "model": model_id,
+            "wall_time": ingest["wall_time"] - reduce["wall_time"],
+            "cpu_time": ingest["cpu_time"] - reduce["cpu_time"],
+            "rows_decoded": timings["rows_decoded"],
+            "bytes_read": timings["bytes_read"],
+            "cache_hit": False,
+        })
+        self.multi_model.profiler.add({"stage": "reduce", "model": model_id, **reduce})
@@ -1,26 +1,21 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import os
-import pyarrow.parquet as pq
 import time
-from matplotlib.ticker import MaxNLocator, FuncFormatter
 
+from ingestion import STREAMING_BATCH_SIZE
+from out_of_core import SPILL_FOLDER_NAME, spill_array
+from profiling import Profiler
+from pyramid import PYRAMID_FUNCTIONS
+from series_cache import SeriesCache
+from confidence import confidence_band
+from cumulative import window_cumulative
+from fan_chart import DEFAULT_FAN_PERCENTILES
+from rendering import render_figure
+from windowing import aggregate_windows
 from simulator_specifics import *
-from .MetaModel import MetaModel
-from .Model import Model
-
-
-def is_meta_model(model):
-    """
-    Check if the given model is a MetaModel based on its ID. A metamodel will always have an id of -101.
-
-    Args:
-        model (Model): The model to check.
-
-    Returns:
-        bool: True if model is MetaModel, False otherwise.
-    """
-    return model.id == MetaModel.META_MODEL_ID
+from .MetaModel import is_meta_model
+from .ModelLoader import ModelLoader
+from .PlotRenderer import PlotRenderer
 
 
 class MultiModel:
@@ -32,48 +27,100 @@ class MultiModel:
         user_input (dict): Configuration dictionary containing user settings for model processing.
         path (str): The base directory path where output files and analysis results are stored.
         window_size (int): The size of the window for data aggregation, which affects how data smoothing and granularity are handled.
+        window_function (str): The function reducing each window, e.g., 'mean', 'median', 'min', 'max', 'sum', or 'p95'.
+        precision (type): The floating-point type of the models' data, np.float64 or (to halve the memory) np.float32.
         models (list of Model): A list of Model instances that store the simulation data.
         metric (str): The specific metric to be analyzed and plotted, as defined by the user.
         measure_unit (str): The unit of measurement for the simulation data, adjusted according to the user's specifications.
         output_folder_path (str): Path to the folder where output files are saved.
         raw_output_path (str): Directory path where raw simulation data is stored.
         analysis_file_path (str): Path to the file where detailed analysis results are recorded.
-        plot_type (str): The type of plot to generate, which can be 'time_series', 'cumulative', or 'cumulative_time_series'.
+        plot_type (str): The type of plot to generate, which can be 'time_series', 'cumulative', 'cumulative_time_series',
+            or 'fan_chart'.
         plot_title (str): The title of the plot.
+        downsample_plot (bool): Whether to decimate the plotted lines to the resolution of the figure.
+        fan_percentiles (list of float): The percentiles across the models drawn by the 'fan_chart' plot.
+        plot_formats (list of str): The formats in which the plot is written, out of 'pdf', 'png' and 'svg'.
+        render_queue (list of dict): If set, the figure specifications are added to it instead of being rendered.
         x_label (str), y_label (str): Labels for the x and y axes of the plot.
         x_min (float), x_max (float), y_min (float), y_max (float): Optional parameters to define axis limits for the plots.
+        timestamp_min (int), timestamp_max (int): Optional simulation timestamp range to which the read data is limited.
+        x_limits_unit (str): The unit of x_min and x_max for the time-based plots, either 'samples' or 'timestamp' (the
+            simulation time, resolved to samples by binary search over the timestamps).
+        model_alignment (str): How the models are aligned on their timestamps (see alignment.py): 'intersect', on the
+            timestamps all of them cover, or 'outer', on the timestamps any of them covers.
+        alignment_fill_value (float): The value of the timestamps a model lacks, with the 'outer' alignment.
+        timestamps (np.array): The int64 timestamps of the models' samples, common to all the models.
+        raw_matrix (np.array): The (models x samples) matrix of the models' raw data, aligned on the timestamps; the
+            raw data of each model is a row of it.
+        ingestion_workers (int): The number of simulation data files read concurrently.
+        ingestion_executor (str): The kind of worker pool used for reading, either 'thread' or 'process'.
+        ingestion_mode (str): Either 'in_memory', which decodes each file at once, or 'streaming', which decodes each
+            file batch by batch, with memory bounded by the number of distinct timestamps.
+        streaming_batch_size (int): The maximum number of rows decoded at once in the 'streaming' ingestion mode.
+        cache (SeriesCache): The on-disk cache of reduced series, or None if caching is disabled.
+        out_of_core (bool): Whether the models' data is spilled to memory-mapped files in the analysis folder, and
+            reduced across the models tile by tile (see out_of_core.py), for sweeps which do not fit in memory.
+        memory_budget_mb (float): With out_of_core, the memory budget of the tiles, in MB. It bounds the reductions
+            across the models; the series of the models being read or windowed are held in memory besides.
+        spill_folder_path (str): The folder of the memory-mapped files, with out_of_core.
+        aggregate_pyramids (bool): Whether the windows of the models (and of the Meta-Model) are answered from their
+            aggregate pyramids, saved beside the raw output (see pyramid.py), instead of from every sample.
+        extra_metrics (list of str): Other metrics read in the same pass over the simulation data files.
+        extra_series (dict): Per extra metric, its unscaled series (one per model), for other MultiModels.
+        seed (int, list of int or str): The seed read, the seeds read, or 'all' to read every seed of each model.
+        multi_seed (bool): Whether several seeds are read, and each model holds the mean and confidence band of its seeds.
+        confidence_level (float): The confidence level of the bands across the seeds, e.g., 0.95.
+        model_filters (dict): Per metadata field (e.g., 'topologies'), the values a model must match to be loaded.
+        metadata_index (MetadataIndex): The metadata of the simulation folders, shared by the models.
+        simulation_folders (list of str): The simulation folders to read, or None to read all of them.
+        profiler (Profiler): Records the timings and resource usage of the analysis stages.
+        loader (ModelLoader): Reads, aligns or shares the models' data (see ModelLoader.py).
+        renderer (PlotRenderer): Describes the plot of the models as a figure specification (see PlotRenderer.py).
 
     Methods:
         parse_user_input(window_size): Parses and sets the class attributes based on the provided user input.
         adjust_unit(): Adjusts the unit of measurement based on user settings, applying appropriate metric prefixes.
         set_paths(): Initializes the directory paths for storing outputs and analysis results.
-        init_models(): Reads simulation data from Parquet files and initializes Model instances.
+        init_models(): Reads simulation data from Parquet files and initializes Model instances (see ModelLoader).
+        allocate(shape, dtype): Allocates an array, in memory or, with out_of_core, mapped to a file.
+        set_model_lengths(): Derives the sample count and workload time from the loaded models.
         compute_windowed_aggregation(): Processes the raw data by applying a windowed aggregation function for smoothing.
-        generate_plot(): Orchestrates the generation of the specified plot type by calling the respective plotting functions.
-        generate_time_series_plot(): Generates a time series plot of the aggregated data.
-        generate_cumulative_plot(): Creates a bar chart showing cumulative data for each model.
-        generate_cumulative_time_series_plot(): Produces a plot that displays cumulative data over time for each model.
-        save_plot(): Saves the generated plot to a PDF file in the specified directory.
+        generate_plot(): Describes the plot (see PlotRenderer) and renders it, or adds it to the render queue.
+        compute_cumulative_time_series(): Computes the cumulative data of each model over time, one value per window.
         output_stats(): Writes detailed statistics of the simulation to an analysis file for record-keeping.
-        mean_of_chunks(np_array, window_size): Calculates the mean of data segments for smoothing and processing.
-        get_cumulative_limits(model_sums): Determines appropriate x-axis limits for cumulative plots based on the model data.
+        aggregate_chunks(np_array, window_size): Reduces data segments with the window function, for smoothing and processing.
 
     Usage:
         To use this class, instantiate it with a dictionary of user settings, a path for outputs, and optionally a window size.
-        Call the `generate_plot` method to process the data and generate plots as configured by the user.
+        Optionally add a Meta-Model, then call the `generate_plot` method to render the plot once, and `output_stats`
+        to record the statistics of the run.
     """
 
-    def __init__(self, user_input, path, window_size=-1):
+    def __init__(self, user_input, path, window_size=-1, models=None, raw_series=None, timestamps=None,
+                 extra_metrics=None, simulation_folders=None):
         """
         Initializes the MultiModel with provided user settings and prepares the environment.
 
         :param user_input (dict): Configurations and settings from the user.
         :param path (str): Path where output and analysis will be stored.
         :param window_size (int): The size of the window to aggregate data; uses user input if -1.
+        :param models (list of Model): Models already loaded by another MultiModel, with the same metric, seed, unit
+            scaling and timestamp range; their raw data is shared instead of being read again. Reads the models if None.
+        :param raw_series (list of np.array): The unscaled series of the metric, one per model, already read by another
+            MultiModel with the same seed and timestamp range (see extra_series); used if no models are given. With
+            several seeds, each series is the (seeds x samples) block of the model.
+        :param timestamps (list of np.array): The timestamps of the raw series, one per model; given with raw_series.
+        :param extra_metrics (list of str): Other metrics to read in the same pass over the simulation data files, for
+            other MultiModels; their unscaled series (and, under TIMESTAMP_COLUMN, their timestamps) are kept in
+            extra_series.
+        :param simulation_folders (list of str): If given, only these simulation folders are read (e.g., in watch
+            mode, the folders of the simulations completed since the last read); all the folders otherwise.
         :return: None
         """
 
         self.starting_time = time.time()
+        self.profiler = Profiler(enabled=user_input["profile"], cprofile=user_input["cprofile"])
         self.end_time = None
         self.workload_time = None
 
@@ -90,9 +137,14 @@ class MultiModel:
         self.analysis_file_path = None
         self.unit_scaling = 1
         self.window_size = -1
-        self.window_function = "median"
+        self.window_function = "mean"
         self.max_model_len = 0
         self.seed = 0
+        self.multi_seed = False
+        self.confidence_level = 0.95
+        self.model_filters = {}
+        self.metadata_index = None
+        self.simulation_folders = simulation_folders
 
         self.plot_type = None
         self.plot_title = None
@@ -102,11 +154,39 @@ class MultiModel:
         self.x_max = None
         self.y_min = None
         self.y_max = None
+        self.timestamp_min = None
+        self.timestamp_max = None
+        self.x_limits_unit = "samples"
+        self.model_alignment = "intersect"
+        self.alignment_fill_value = 0.0
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.raw_matrix = None
+        self.ingestion_workers = 1
+        self.ingestion_executor = "thread"
+        self.ingestion_mode = "in_memory"
+        self.streaming_batch_size = STREAMING_BATCH_SIZE
+        self.cache = None
+        self.aggregate_pyramids = False
+        self.out_of_core = False
+        self.memory_budget_mb = 1024
+        self.spill_folder_path = None
+        self.downsample_plot = True
+        self.fan_percentiles = DEFAULT_FAN_PERCENTILES
+        self.plot_formats = ["pdf"]
+        self.render_queue = None
+        self.precision = np.float64
         self.plot_path = None
+        self.extra_metrics = [metric for metric in extra_metrics or [] if metric != user_input["metric"]]
+        self.extra_series = {}
 
         self.parse_user_input(window_size)
         self.set_paths()
-        self.init_models()
+        self.loader = ModelLoader(self)
+        self.renderer = PlotRenderer(self)
+        if models is None:
+            self.init_models(raw_series, timestamps)
+        else:
+            self.loader.share_models(models)
 
         self.compute_windowed_aggregation()
 
@@ -125,8 +205,15 @@ class MultiModel:
         self.measure_unit = self.adjust_unit()
         self.window_function = self.user_input["window_function"]
         self.seed = self.user_input["seed"]
+        self.multi_seed = not isinstance(self.seed, int)
+        self.confidence_level = self.user_input["confidence_level"]
+        self.model_filters = self.user_input["model_filters"]
+        self.precision = np.dtype(self.user_input["precision"]).type
 
         self.plot_type = self.user_input["plot_type"]
+        self.downsample_plot = self.user_input["downsample_plot"]
+        self.fan_percentiles = self.user_input["fan_percentiles"]
+        self.plot_formats = self.user_input["plot_formats"]
         self.plot_title = self.user_input["plot_title"]
         if self.user_input["x_label"] == "":
             self.x_label = "Samples"
@@ -142,6 +229,18 @@ class MultiModel:
         self.y_max = self.user_input["y_max"]
         self.x_min = self.user_input["x_min"]
         self.x_max = self.user_input["x_max"]
+        self.timestamp_min = self.user_input["timestamp_min"]
+        self.timestamp_max = self.user_input["timestamp_max"]
+        self.x_limits_unit = self.user_input["x_limits_unit"]
+        self.model_alignment = self.user_input["model_alignment"]
+        self.alignment_fill_value = self.user_input["alignment_fill_value"]
+        self.ingestion_workers = self.user_input["ingestion_workers"]
+        self.ingestion_executor = self.user_input["ingestion_executor"]
+        self.ingestion_mode = self.user_input["ingestion_mode"]
+        self.streaming_batch_size = self.user_input["streaming_batch_size"]
+        self.aggregate_pyramids = self.user_input["aggregate_pyramids"]
+        self.out_of_core = self.user_input["out_of_core"]
+        self.memory_budget_mb = self.user_input["memory_budget_mb"]
 
     def adjust_unit(self):
         """
@@ -173,7 +272,9 @@ class MultiModel:
         """
         Configures and initializes the directory paths for output and analysis based on the base directory provided.
         This method sets paths for the raw output and detailed analysis results, ensuring directories are created if
-        they do not already exist, and prepares a base file for capturing analytical summaries.
+        they do not already exist, and prepares a base file for capturing analytical summaries. If enabled, it also
+        opens (and, if requested, invalidates) the cache of reduced series in the analysis directory, and creates the
+        folder of the memory-mapped files of the out-of-core mode.
 
         :return: None
         :side effect: Creates necessary directories and files for output and analysis.
@@ -187,36 +288,69 @@ class MultiModel:
             with open(self.analysis_file_path, "w") as f:
                 f.write("Analysis file created.\n")
 
-    def init_models(self):
+        if self.user_input["cache"]:
+            self.cache = SeriesCache(
+                analysis_folder_path=os.path.dirname(self.analysis_file_path),
+                size_limit_mb=self.user_input["cache_size_limit_mb"]
+            )
+            if self.user_input["invalidate_cache"]:
+                self.cache.invalidate()
+
+        if self.out_of_core:
+            self.spill_folder_path = os.path.join(os.path.dirname(self.analysis_file_path), SPILL_FOLDER_NAME)
+            os.makedirs(self.spill_folder_path, exist_ok=True)
+
+    def init_models(self, raw_series=None, timestamps=None):
         """
-        Initializes models from the simulation output stored in Parquet files. This method reads each Parquet file,
-        processes the relevant data, and initializes Model instances which are stored in the model list.
+        Reads the simulation data from the Parquet files and initializes the models (see ModelLoader.load_models).
 
+        :param raw_series (list of np.array): The unscaled series of the metric, if already read; read if None.
+        :param timestamps (list of np.array): The timestamps of the raw series, if already read.
         :return: None
-        :raise ValueError: If the unit scaling has not been set prior to model initialization.
         """
-        model_id = 0
+        self.loader.load_models(raw_series, timestamps)
+
+    def memory_budget_bytes(self):
+        """
+        :return: int: The memory budget of the out-of-core mode, in bytes.
+        """
+        return int(self.memory_budget_mb * 2 ** 20)
 
-        for simulation_folder in os.listdir(self.raw_output_path):
-            if simulation_folder == "metamodel":
-                continue
-            path_of_parquet_file = f"{self.raw_output_path}/{simulation_folder}/seed={self.seed}/{SIMULATION_DATA_FILE}.parquet"
-            parquet_file = pq.read_table(path_of_parquet_file).to_pandas()
-            raw = parquet_file.select_dtypes(include=[np.number]).groupby("timestamp")
-            raw = raw[self.metric].sum().values
+    def allocate(self, shape, dtype):
+        """
+        :param shape (tuple): The shape of the array.
+        :param dtype (type): The type of the array.
+        :return: np.array: An uninitialized array; with out_of_core, mapped to a file in the spill folder.
+        """
+        if self.out_of_core:
+            return spill_array(self.spill_folder_path, shape, dtype)
+        return np.empty(shape, dtype=dtype)
 
-            if self.unit_scaling is None:
-                raise ValueError("Unit scaling factor is not set. Please ensure it is set correctly.")
+    def release(self, model):
+        """
+        In the out-of-core mode, drops the caches derived from a model's raw data once they have been used, such that
+        they are not held in memory for every model; they are loaded (the pyramid, memory-mapped) or computed again if
+        needed.
 
-            raw = np.divide(raw, self.unit_scaling)
+        :param model (Model): A model.
+        :return: None
+        :side effect: Resets the model's pyramid and prefix sums, with out_of_core.
+        """
+        if self.out_of_core:
+            model.pyramid = None
+            model.prefix_sums = np.empty(0)
 
-            if self.user_input["samples_per_minute"] > 0:
-                MINUTES_IN_DAY = 1440
-                self.workload_time = len(raw) * self.user_input["samples_per_minute"] / MINUTES_IN_DAY
+    def set_model_lengths(self):
+        """
+        Derives the length-based statistics from the loaded models: the sample count of the shortest model (with the
+        models aligned on their timestamps, the sample count of every model), and the workload time (of the last model),
+        if the sample rate is known.
 
-            model = Model(raw_sim_data=raw, id=model_id, path=self.output_folder_path)
-            self.models.append(model)
-            model_id += 1
+        :return: None
+        """
+        if self.user_input["samples_per_minute"] > 0:
+            MINUTES_IN_DAY = 1440
+            self.workload_time = len(self.models[-1].raw_sim_data) * self.user_input["samples_per_minute"] / MINUTES_IN_DAY
 
         self.max_model_len = min([len(model.raw_sim_data) for model in self.models])
 
@@ -224,225 +358,119 @@ class MultiModel:
         """
         Applies a windowed aggregation function to each model's dataset. This method is typically used for smoothing
         or reducing data granularity. It involves segmenting the dataset into windows of specified size and applying
-        an aggregation function to each segment.
+        an aggregation function to each segment. Models already aggregated with the same window size and function
+        are not aggregated again. A model with several seeds is windowed seed by seed (in one reduction over its block),
+        and its processed data is the mean of the windowed seeds, with the margins of error of that mean. The windows of
+        a model with one seed are answered from its aggregate pyramid, when possible (see answers_from_pyramid). In the
+        out-of-core mode, the processed data (and margins of error) of the models are rows of memory-mapped matrices.
 
         :return: None
-        :side effect: Modifies each model's processed_sim_data attribute to contain aggregated data.
+        :side effect: Modifies each model's processed_sim_data, margins_of_error and processed_window attributes; loads,
+            or builds and saves, the models' aggregate pyramids.
         """
         if self.plot_type != "cumulative":
-            for model in self.models:
-                numeric_values = model.raw_sim_data
-                model.processed_sim_data = self.mean_of_chunks(numeric_values, self.window_size)
+            window = (self.window_size, self.window_function)
+            models = [model for model in self.models if model.processed_window != window]
+            processed_rows = self.window_rows(len(models))
+            margins_rows = self.window_rows(len(models) if self.multi_seed else 0)
+            for row, model in enumerate(models):
+                with self.profiler.stage("window", model=model.id):
+                    if model.seed_data.ndim == 2:
+                        windowed = self.aggregate_chunks(model.seed_data, self.window_size)
+                        model.processed_sim_data, _, model.margins_of_error = confidence_band(
+                            windowed, self.confidence_level)
+                        model.margins_of_error = self.spill_row(margins_rows, row, model.margins_of_error)
+                    elif self.answers_from_pyramid():
+                        model.processed_sim_data = model.aggregate_pyramid().windows(
+                            self.window_size, self.window_function).astype(self.precision, copy=False)
+                    else:
+                        model.processed_sim_data = self.aggregate_chunks(model.raw_sim_data, self.window_size)
+                    model.processed_sim_data = self.spill_row(processed_rows, row, model.processed_sim_data)
+                model.processed_window = window
+                self.release(model)
+
+    def window_rows(self, rows):
+        """
+        :param rows (int): The number of windowed series.
+        :return: np.array: In the out-of-core mode, with windows of more than one sample, the memory-mapped (rows x
+            windows) matrix receiving the windowed series; None otherwise (with windows of one sample, the windowed
+            series are the raw data itself).
+        """
+        if not self.out_of_core or self.window_size == 1 or rows == 0:
+            return None
+        return self.allocate((rows, -(-self.max_model_len // self.window_size)), self.precision)
+
+    @staticmethod
+    def spill_row(matrix, row, values):
+        """
+        :param matrix (np.array): The matrix receiving the series (see window_rows), or None.
+        :param row (int): The row of the series.
+        :param values (np.array): The series.
+        :return: np.array: The row of the matrix, holding the series; the series itself, if there is no matrix or the
+            series does not fit in its row.
+        """
+        if matrix is None or values.shape != matrix[row].shape:
+            return values
+        matrix[row] = values
+        return matrix[row]
+
+    def answers_from_pyramid(self):
+        """
+        :return: bool: True if the windows are answered from the aggregate pyramids: if they are enabled, span more than
+            one sample, and are reduced with one of the pyramid functions (the median and percentiles need every sample).
+            Not in the out-of-core mode, where building a pyramid would hold the float64 blocks of a whole series.
+        """
+        return self.aggregate_pyramids and not self.out_of_core and self.window_size > 1 \
+            and self.window_function in PYRAMID_FUNCTIONS
 
     def generate_plot(self):
         """
-        Creates and saves plots based on the processed data from multiple models. This method determines
-        the type of plot to generate based on user input and invokes the appropriate plotting function.
+        Creates and saves plots based on the processed data from multiple models (and the Meta-Model, if it has been
+        added to the models). This method determines the type of plot to generate based on user input and invokes the
+        appropriate plotting function. It is the final, rendering stage of the analysis and is skipped in headless runs.
 
-        The plotting options supported are 'time_series', 'cumulative', and 'cumulative_time_series'.
-        Depending on the type specified, this method delegates to specific plot-generating functions.
+        The plotting options supported are 'time_series', 'cumulative', 'cumulative_time_series', and 'fan_chart'.
+        Depending on the type specified, this method delegates to specific plot-generating functions, which describe
+        the figure; the figure is then drawn off-screen and written in each of the plot formats (see rendering.py). If
+        a render queue is set (as in batch runs with several render workers), the figure is queued instead, to be
+        rendered in parallel with the other figures of the batch.
 
         :return: None
         :raises ValueError: If the plot type specified is not recognized or supported by the system.
         :side effect:
-            - Generates and saves a plot to the file system.
+            - Generates and saves a plot to the file system, or adds its specification to the render queue.
             - Updates the plot attributes based on the generated plot.
-            - Displays the plot on the matplotlib figure canvas.
-        """
-        plt.figure(figsize=(12, 10))
-        plt.xticks(size=22)
-        plt.yticks(size=22)
-        plt.ylabel(self.y_label, size=26)
-        plt.xlabel(self.x_label, size=26)
-        plt.title(self.plot_title, size=26)
-        plt.grid()
-
-        formatter = FuncFormatter(lambda x, _: '{:,}'.format(int(x)) if x >= 1000 else int(x))
-        ax = plt.gca()
-        ax.xaxis.set_major_formatter(formatter)
-        # ax.yaxis.set_major_formatter(formatter) yaxis has formatting issues - to solve in a future iteration
-
-        if self.user_input['x_ticks_count'] is not None:
-            ax = plt.gca()
-            ax.xaxis.set_major_locator(MaxNLocator(self.user_input['x_ticks_count']))
-
-        if self.user_input['y_ticks_count'] is not None:
-            ax = plt.gca()
-            ax.yaxis.set_major_locator(MaxNLocator(self.user_input['y_ticks_count']))
-
-        self.set_x_axis_lim()
-        self.set_y_axis_lim()
-
-        if self.plot_type == "time_series":
-            self.generate_time_series_plot()
-        elif self.plot_type == "cumulative":
-            self.generate_cumulative_plot()
-        elif self.plot_type == "cumulative_time_series":
-            self.generate_cumulative_time_series_plot()
-        else:
-            raise ValueError(
-                "Plot type not recognized. Please enter a valid plot type. The plot can be either "
-                "'time_series', 'cumulative', or 'cumulative_time_series'."
-            )
-
-        plt.tight_layout()
-        plt.subplots_adjust(right=0.85)
-        plt.legend(fontsize=12, bbox_to_anchor=(1, 1))
-        self.save_plot()
-        self.output_stats()
-
-    def generate_time_series_plot(self):
-        """
-        Plots time series data for each model. This function iterates over each model, applies the defined
-        windowing function to smooth the data, and plots the resulting series.
-
-        :return: None
-        :side effect: Plots are displayed on the matplotlib figure canvas.
-        """
-        for model in self.models:
-            label = "Meta-Model" if is_meta_model(model) else "Model " + str(model.id)
-            if is_meta_model(model):
-                repeated_means = np.repeat(means, self.window_size)[:len(model.processed_sim_data) * self.window_size]
-                plt.plot(
-                    repeated_means,
-                    drawstyle='steps-mid',
-                    label=label,
-                    color="red",
-                    linestyle="--",
-                    marker="o",
-                    markevery=max(1, len(repeated_means) // 50),
-                    linewidth=2
-                )
-            else:
-                means = self.mean_of_chunks(model.raw_sim_data, self.window_size)
-                repeated_means = np.repeat(means, self.window_size)[:len(model.raw_sim_data)]
-                plt.plot(repeated_means, drawstyle='steps-mid', label=label)
-
-    def generate_cumulative_plot(self):
         """
-        Generates a horizontal bar chart showing cumulative data for each model. This function
-        aggregates total values per model and displays them in a bar chart, providing a visual
-        comparison of total values across models.
-
-        :return: None
-        :side effect: Plots are displayed on the matplotlib figure canvas.
-        """
-        plt.xlim(self.get_cumulative_limits(model_sums=self.sum_models_entries()))
-        plt.ylabel("Model ID", size=20)
-        plt.xlabel("Total " + self.metric + " [" + self.measure_unit + "]")
-        plt.yticks(range(len(self.models)), [model.id for model in self.models])
-        plt.grid(False)
-
-        cumulated_energies = self.sum_models_entries()
-        for i, model in enumerate(self.models):
-            label = "Meta-Model" if is_meta_model(model) else "Model " + str(model.id)
-            if is_meta_model(model):
-                plt.barh(label=label, y=i, width=cumulated_energies[i], color="red")
-            else:
-                plt.barh(label=label, y=i, width=cumulated_energies[i])
-            plt.text(cumulated_energies[i], i, str(cumulated_energies[i]), ha='left', va='center', size=26)
+        with self.profiler.stage("render"):
+            spec = self.renderer.plot_spec()
 
-    def generate_cumulative_time_series_plot(self):
-        """
-        Generates a plot showing the cumulative data over time for each model. This visual representation is
-        useful for analyzing trends and the accumulation of values over time.
+        if self.render_queue is not None:
+            self.render_queue.append(spec)
+            return
 
-        :return: None
-        :side effect: Displays the cumulative data over time on the matplotlib figure canvas.
-        """
-        self.compute_cumulative_time_series()
-
-        for model in self.models:
-            if is_meta_model(model):
-                cumulative_repeated = np.repeat(model.cumulative_time_series_values, self.window_size)[
-                                      :len(model.processed_sim_data) * self.window_size]
-                plt.plot(
-                    cumulative_repeated,
-                    drawstyle='steps-mid',
-                    label=("Meta-Model"),
-                    color="red",
-                    linestyle="--",
-                    marker="o",
-                    markevery=max(1, len(cumulative_repeated) // 10),
-                    linewidth=3
-                )
-            else:
-                cumulative_repeated = np.repeat(model.cumulative_time_series_values, self.window_size)[
-                                      :len(model.raw_sim_data)]
-                plt.plot(cumulative_repeated, drawstyle='steps-mid', label=("Model " + str(model.id)))
+        with self.profiler.stage("save"):
+            render_figure(spec)
 
     def compute_cumulative_time_series(self):
         """
-        Computes the cumulative sum of processed data over time for each model, storing the result for use in plotting.
+        Computes the cumulative sum of the data over time for each model, one value per window, storing the result for
+        use in plotting. With the 'mean' window function, the value of a window is the exact total of the raw data up to
+        the window's end, looked up in the model's cached prefix sums. Otherwise (and for the Meta-Model, which has no
+        raw data), it is the prefix sum of the windowed values, each counted for the samples of its window.
 
         :return: None
         :side effect: Updates each model's 'cumulative_time_series_values' attribute with the cumulative sums.
         """
-        for model in self.models:
-            cumulative_array = []
-            _sum = 0
-            for value in model.processed_sim_data:
-                _sum += value
-                cumulative_array.append(_sum * self.window_size)
-            model.cumulative_time_series_values = cumulative_array
-
-    def save_plot(self):
-        """
-        Saves the current plot to a PDF file in the specified directory, constructing the file path from the
-        plot attributes and ensuring that the directory exists before saving.
-
-        :return: None
-        :side effect: Creates or overwrites a PDF file containing the plot in the designated folder.
-        """
-        folder_prefix = self.output_folder_path + "/simulation-analysis/" + self.metric + "/"
-        self.plot_path = folder_prefix + self.plot_type + "_plot_multimodel_metric=" + self.metric + "_window=" + str(
-            self.window_size) + ".pdf"
-        plt.savefig(self.plot_path)
-
-    def set_x_axis_lim(self):
-        """
-        Sets the x-axis limits for the plot based on user-defined minimum and maximum values. If values
-        are not specified, the axis limits will default to encompassing all data points.
-
-        :return: None
-        :side effect: Adjusts the x-axis limits of the current matplotlib plot.
-        """
-        if self.x_min is not None:
-            plt.xlim(left=self.x_min)
-
-        if self.x_max is not None:
-            plt.xlim(right=self.x_max)
-
-    def set_y_axis_lim(self):
-        """
-        Dynamically sets the y-axis limits to be slightly larger than the range of the data, enhancing
-        the readability of the plot by ensuring all data points are comfortably within the view.
-
-        :return: None
-        :side effect: Adjusts the y-axis limits of the current matplotlib plot.
-        """
-        if self.y_min is not None:
-            plt.ylim(bottom=self.y_min)
-        if self.y_max is not None:
-            plt.ylim(top=self.y_max)
-
-    def sum_models_entries(self):
-        """
-        Computes the total values from each model for use in cumulative plotting. This method aggregates
-        the data across all models and prepares it for cumulative display.
-
-        :return: List of summed values for each model, useful for plotting and analysis.
-        """
-        models_sums = []
-        for (i, model) in enumerate(self.models):
-            if is_meta_model(model):
-                models_sums.append(model.cumulated)
+        cumulative_rows = self.window_rows(len(self.models))
+        for row, model in enumerate(self.models):
+            if self.window_function == "mean" and not is_meta_model(model):
+                cumulative_array = window_cumulative(model.cumulative_prefix(), self.window_size)
             else:
-                cumulated_energy = model.raw_sim_data.sum()
-                cumulated_energy = round(cumulated_energy, 2)
-                models_sums.append(cumulated_energy)
-
-        return models_sums
+                cumulative_array = np.cumsum(model.processed_sim_data, dtype=np.float64)
+                cumulative_array *= self.window_size
+            model.cumulative_time_series_values = self.spill_row(
+                cumulative_rows, row, cumulative_array.astype(self.precision, copy=False))
+            self.release(model)
 
     def output_stats(self):
         """
@@ -456,46 +484,57 @@ class MultiModel:
         with open(self.analysis_file_path, "a") as f:
             f.write("\n\n========================================\n")
             f.write("Simulation made at " + time.strftime("%Y-%m-%d %H:%M:%S") + "\n")
+            if self.user_input["variant"]:
+                f.write("Variant: " + self.user_input["variant"] + "\n")
             f.write("Metric: " + self.metric + "\n")
             f.write("Unit: " + self.measure_unit + "\n")
             f.write("Window size: " + str(self.window_size) + "\n")
             f.write("Sample count in raw sim data: " + str(self.max_model_len) + "\n")
+            if self.model_filters:
+                f.write("Model filters: " + str(self.model_filters) + "\n")
+                f.write("Models: " + ", ".join(str(model.id) for model in self.models if not is_meta_model(model)) + "\n")
+            if self.multi_seed:
+                seed_counts = sorted(set(len(model.seed_data) for model in self.models if model.seed_data.ndim == 2))
+                f.write("Seeds per model: " + ", ".join(map(str, seed_counts)) + "\n")
+                f.write("Confidence level: " + str(self.confidence_level) + "\n")
             f.write("Computing time " + str(round(self.end_time - self.starting_time, 1)) + "s\n")
             if (self.user_input["samples_per_minute"] > 0):
                 f.write("Workload time: " + str(round(self.workload_time, 2)) + " days\n")
-            f.write("Plot path" + self.plot_path + "\n")
+            if self.plot_path is not None:
+                f.write("Plot path" + self.plot_path + "\n")
             f.write("========================================\n")
 
-    def mean_of_chunks(self, np_array, window_size):
+    def output_profile(self):
         """
-        Calculates the mean of data within each chunk for a given array. This method helps in smoothing the data by
-        averaging over specified 'window_size' segments.
+        Writes the profile of the analysis (per-stage and per-model timings, volumes read and peak memory) next to the
+        analysis file, if profiling is enabled. The file names hold the metric, as the analyses of several metrics may
+        run together.
 
-        :param np_array (np.array): Array of numerical data to be chunked and averaged.
-        :param window_size (int): The size of each segment to average over.
-        :return: np.array: An array of mean values for each chunk.
-        :side effect: None
+        :return: None
+        :side effect: Creates or overwrites the profile files in the simulation analysis directory.
         """
-        if window_size == 1:
-            return np_array
+        self.profiler.write(os.path.dirname(self.analysis_file_path), "_metric=" + self.metric + self.variant_suffix())
 
-        chunks = [np_array[i:i + window_size] for i in range(0, len(np_array), window_size)]
-        means = [np.mean(chunk) for chunk in chunks]
-        return np.array(means)
-
-    def get_cumulative_limits(self, model_sums):
+    def variant_suffix(self):
         """
-        Calculates the appropriate x-axis limits for cumulative plots based on the summarized data from each model.
+        Returns the suffix distinguishing the output files of this analysis from those of the other variants of a
+        batch run (see batch.py).
 
-        :param model_sums (list of float): The total values for each model.
-        :return: tuple: A tuple containing the minimum and maximum x-axis limits.
+        :return: str: '_variant=<name>' for a named variant, otherwise an empty string.
         """
-        axis_min = min(model_sums) * 0.9
-        axis_max = max(model_sums) * 1.1
+        if self.user_input["variant"]:
+            return "_variant=" + self.user_input["variant"]
+        return ""
 
-        if self.user_input["x_min"] is not None:
-            axis_min = self.user_input["x_min"]
-        if self.user_input["x_max"] is not None:
-            axis_max = self.user_input["x_max"]
+    def aggregate_chunks(self, np_array, window_size):
+        """
+        Reduces the data within each chunk (window) of a given array with the user's window function (e.g., mean,
+        median, min, max, sum, or a percentile such as 'p95'). This method helps in smoothing the data by aggregating
+        over specified 'window_size' segments; the last chunk may hold fewer samples.
 
-        return [axis_min * 0.9, axis_max * 1.1]
+        :param np_array (np.array): Array of numerical data to be chunked and aggregated.
+        :param window_size (int): The size of each segment to aggregate over.
+        :return: np.array: An array of aggregated values for each chunk.
+        :side effect: None
+        """
+        return aggregate_windows(np_array, window_size, self.window_function)
@@ -0,0 +1,344 @@
+import numpy as np
+import os
+from functools import partial
+
+from alignment import sample_range
+from out_of_core import apply_tiled
+from fan_chart import fan_bands, percentile_envelopes, percentile_label
+from downsampling import BUCKETS_PER_PIXEL, band_envelope, min_max_envelope, step_points
+from rendering import FIGURE_DPI, FIGURE_SIZE
+from .MetaModel import is_meta_model
+
+
+class PlotRenderer:
+    """
+    Describes the plot of a Multi-Model as a picklable figure specification (see rendering.render_figure): the calls
+    drawing the models' windowed (or cumulative) data, decimated to the resolution of the figure, its labels and axis
+    limits, and the paths of its files. The plot settings (plot type, labels, limits, formats, percentiles) are those
+    of the Multi-Model.
+
+    Attributes:
+        multi_model (MultiModel): The Multi-Model whose models are plotted.
+        figure_calls (list of tuple): The Axes calls of the figure being described (see plot_spec).
+
+    Methods:
+        plot_spec(): Describes the plot as a picklable figure specification, rendered off-screen by rendering.py.
+        x_limits(): Returns the x-axis limits of the plot, resolved to samples for limits in simulation time.
+        draw(method, *args, **kwargs): Adds an Axes call to the figure specification.
+        generate_time_series_plot(): Generates a time series plot of the aggregated data.
+        generate_cumulative_plot(): Creates a bar chart showing cumulative data for each model.
+        generate_cumulative_time_series_plot(): Produces a plot that displays cumulative data over time for each model.
+        generate_fan_chart_plot(): Plots the spread of the models as a percentile fan chart.
+        plot_band(model, color): Shades the confidence band of a model with several seeds.
+        plot_points(values, length): Computes the (decimated) points of the step line of a windowed series.
+        plot_paths(): Constructs the paths of the plot files, one per plot format.
+        sum_models_entries(): Computes the total value of each model, for the cumulative plot.
+        get_cumulative_limits(model_sums): Determines the x-axis limits of the cumulative plot from the models' totals.
+    """
+
+    def __init__(self, multi_model):
+        """
+        :param multi_model (MultiModel): The Multi-Model whose models are plotted, with its settings parsed.
+        """
+        self.multi_model = multi_model
+        self.figure_calls = []
+
+    def plot_spec(self):
+        """
+        Describes the plot of the configured type as a figure specification (see rendering.render_figure): its labels
+        and axis settings, the calls drawing the models' data, and the paths of its files. The specification holds
+        plain values only, such that it can be rendered in another process.
+
+        :return: dict: The figure specification.
+        :raises ValueError: If the plot type specified is not recognized or supported by the system.
+        :side effect: Sets the Multi-Model's plot_path, and creates the folder of the plot files.
+        """
+        multi_model = self.multi_model
+        self.figure_calls = []
+        if multi_model.plot_type == "time_series":
+            self.generate_time_series_plot()
+        elif multi_model.plot_type == "cumulative":
+            self.generate_cumulative_plot()
+        elif multi_model.plot_type == "cumulative_time_series":
+            self.generate_cumulative_time_series_plot()
+        elif multi_model.plot_type == "fan_chart":
+            self.generate_fan_chart_plot()
+        else:
+            raise ValueError(
+                "Plot type not recognized. Please enter a valid plot type. The plot can be either "
+                "'time_series', 'cumulative', 'cumulative_time_series', or 'fan_chart'."
+            )
+
+        return {
+            "title": multi_model.plot_title,
+            "x_label": multi_model.x_label,
+            "y_label": multi_model.y_label,
+            "x_ticks_count": multi_model.user_input['x_ticks_count'],
+            "y_ticks_count": multi_model.user_input['y_ticks_count'],
+            "x_lim": self.x_limits(),
+            "y_lim": (multi_model.y_min, multi_model.y_max),
+            "calls": self.figure_calls,
+            "paths": self.plot_paths(),
+        }
+
+    def x_limits(self):
+        """
+        :return: tuple: The x-axis limits of the plot, (x_min, x_max). For the time-based plots with limits in
+            simulation time (see x_limits_unit), the limits are resolved to samples, by binary search over the models'
+            timestamps.
+        """
+        multi_model = self.multi_model
+        if multi_model.x_limits_unit != "timestamp" or multi_model.plot_type == "cumulative":
+            return multi_model.x_min, multi_model.x_max
+
+        start, stop = sample_range(multi_model.timestamps, multi_model.x_min, multi_model.x_max)
+        return (None if multi_model.x_min is None else start), (None if multi_model.x_max is None else stop)
+
+    def draw(self, method, *args, **kwargs):
+        """
+        Adds a call drawing on the axes of the figure (e.g., 'plot', or 'barh') to the figure specification.
+
+        :param method (str): The name of the matplotlib Axes method.
+        :return: None
+        """
+        self.figure_calls.append((method, args, kwargs))
+
+    def generate_time_series_plot(self):
+        """
+        Plots time series data for each model. This function iterates over each model and plots its windowed
+        data, as computed by compute_windowed_aggregation. The models take the colors of matplotlib's color cycle, in
+        order, such that the confidence band of a model can be drawn in the color of its line.
+
+        :return: None
+        :side effect: Adds the lines (and bands) of the models to the figure specification.
+        """
+        multi_model = self.multi_model
+        color_index = 0
+        for model in multi_model.models:
+            label = "Meta-Model" if is_meta_model(model) else "Model " + str(model.id)
+            if is_meta_model(model):
+                x, y = self.plot_points(model.processed_sim_data,
+                                        len(model.processed_sim_data) * multi_model.window_size)
+                self.draw(
+                    "plot",
+                    x,
+                    y,
+                    drawstyle='steps-post',
+                    label=label,
+                    color="red",
+                    linestyle="--",
+                    marker="o",
+                    markevery=max(1, len(y) // 50),
+                    linewidth=2
+                )
+            else:
+                x, y = self.plot_points(model.processed_sim_data, len(model.raw_sim_data))
+                color = "C" + str(color_index % 10)
+                color_index += 1
+                self.draw("plot", x, y, drawstyle='steps-post', label=label, color=color)
+                if len(model.margins_of_error) > 0:
+                    self.plot_band(model, color)
+
+    def generate_cumulative_plot(self):
+        """
+        Generates a horizontal bar chart showing cumulative data for each model. This function
+        aggregates total values per model and displays them in a bar chart, providing a visual
+        comparison of total values across models.
+
+        :return: None
+        :side effect: Adds the bars of the models to the figure specification.
+        """
+        multi_model = self.multi_model
+        cumulated_energies = self.sum_models_entries()
+        self.draw("set_xlim", self.get_cumulative_limits(model_sums=cumulated_energies))
+        self.draw("set_ylabel", "Model ID", size=20)
+        self.draw("set_xlabel", "Total " + multi_model.metric + " [" + multi_model.measure_unit + "]")
+        self.draw("set_yticks", range(len(multi_model.models)), [model.id for model in multi_model.models])
+        self.draw("grid", False)
+
+        for i, model in enumerate(multi_model.models):
+            label = "Meta-Model" if is_meta_model(model) else "Model " + str(model.id)
+            if is_meta_model(model):
+                self.draw("barh", label=label, y=i, width=cumulated_energies[i], color="red")
+            else:
+                self.draw("barh", label=label, y=i, width=cumulated_energies[i])
+            self.draw("text", cumulated_energies[i], i, str(cumulated_energies[i]), ha='left', va='center', size=26)
+
+    def generate_cumulative_time_series_plot(self):
+        """
+        Generates a plot showing the cumulative data over time for each model. This visual representation is
+        useful for analyzing trends and the accumulation of values over time.
+
+        :return: None
+        :side effect: Adds the cumulative lines of the models to the figure specification.
+        """
+        multi_model = self.multi_model
+        multi_model.compute_cumulative_time_series()
+
+        for model in multi_model.models:
+            if is_meta_model(model):
+                x, y = self.plot_points(
+                    model.cumulative_time_series_values,
+                    len(model.processed_sim_data) * multi_model.window_size
+                )
+                self.draw(
+                    "plot",
+                    x,
+                    y,
+                    drawstyle='steps-post',
+                    label=("Meta-Model"),
+                    color="red",
+                    linestyle="--",
+                    marker="o",
+                    markevery=max(1, len(y) // 10),
+                    linewidth=3
+                )
+            else:
+                x, y = self.plot_points(model.cumulative_time_series_values, len(model.raw_sim_data))
+                self.draw("plot", x, y, drawstyle='steps-post', label=("Model " + str(model.id)))
+
+    def generate_fan_chart_plot(self):
+        """
+        Plots the spread of the models as a percentile fan chart: the models' windowed data is stacked into one
+        (models x samples) matrix, reduced per sample to the configured percentiles in one vectorized pass, and drawn
+        as nested bands around the median line (see fan_chart.py), with the Meta-Model's line on top. The figure holds
+        a few bands whatever the number of models, so its rendering time and size do not grow with it. In the
+        out-of-core mode, the percentiles are computed tile by tile (see out_of_core.apply_tiled), without the matrix.
+
+        :return: None
+        :side effect: Adds the bands and lines to the figure specification.
+        """
+        multi_model = self.multi_model
+        models = [model for model in multi_model.models if not is_meta_model(model)]
+        length = min(len(model.processed_sim_data) for model in models)
+        samples = min(len(model.raw_sim_data) for model in models)
+        percentiles = sorted(multi_model.fan_percentiles)
+        if multi_model.out_of_core:
+            envelopes = apply_tiled(partial(percentile_envelopes, percentiles=percentiles),
+                                    [model.processed_sim_data for model in models], length,
+                                    multi_model.memory_budget_bytes(), multi_model.precision,
+                                    allocate=multi_model.allocate)
+        else:
+            models_matrix = np.empty((len(models), length), dtype=multi_model.precision)
+            for row, model in enumerate(models):
+                models_matrix[row] = model.processed_sim_data[:length]
+            envelopes = percentile_envelopes(models_matrix, percentiles)
+        bands, middle = fan_bands(percentiles)
+        for lower, upper in bands:
+            x, lower_values = step_points(envelopes[lower], multi_model.window_size, samples)
+            _, upper_values = step_points(envelopes[upper], multi_model.window_size, samples)
+            if multi_model.downsample_plot:
+                x, lower_values, upper_values = band_envelope(x, lower_values, upper_values,
+                                                              buckets=self.plot_buckets())
+            label = percentile_label(percentiles[lower]) + "-" + percentile_label(percentiles[upper])
+            self.draw("fill_between", x, lower_values, upper_values, step="post", color="C0", alpha=0.25,
+                      linewidth=0, label=label)
+
+        if middle is not None:
+            x, y = self.plot_points(envelopes[middle], samples)
+            self.draw("plot", x, y, drawstyle='steps-post', color="C0", linewidth=2,
+                      label=percentile_label(percentiles[middle]))
+
+        for model in multi_model.models:
+            if is_meta_model(model):
+                x, y = self.plot_points(model.processed_sim_data,
+                                        len(model.processed_sim_data) * multi_model.window_size)
+                self.draw(
+                    "plot",
+                    x,
+                    y,
+                    drawstyle='steps-post',
+                    label="Meta-Model",
+                    color="red",
+                    linestyle="--",
+                    marker="o",
+                    markevery=max(1, len(y) // 50),
+                    linewidth=2
+                )
+
+    def plot_band(self, model, color):
+        """
+        Shades the confidence band of a model with several seeds, between its processed data minus and plus its margins
+        of error. Like the lines, the band is drawn from one point per window and, unless disabled, decimated to the
+        resolution of the figure's width, keeping the outer envelope of the band.
+
+        :param model (Model): The model, with its margins of error computed.
+        :param color (str): The color of the model's line.
+        :return: None
+        :side effect: Adds the band to the figure specification.
+        """
+        multi_model = self.multi_model
+        length = len(model.raw_sim_data)
+        x, lower = step_points(model.processed_sim_data - model.margins_of_error, multi_model.window_size, length)
+        _, upper = step_points(model.processed_sim_data + model.margins_of_error, multi_model.window_size, length)
+        if multi_model.downsample_plot:
+            x, lower, upper = band_envelope(x, lower, upper, buckets=self.plot_buckets())
+        self.draw("fill_between", x, lower, upper, step="post", color=color, alpha=0.2, linewidth=0)
+
+    def plot_points(self, values, length):
+        """
+        Computes the points of the step line of a windowed series, spanning 'length' samples. The line is drawn from
+        one point per window (rather than from each value repeated 'window_size' times) and, unless disabled, is
+        decimated to a min/max envelope at the resolution of the figure's width, so that rendering time and file
+        size do not grow with the number of samples.
+
+        :param values (np.array): One value per window.
+        :param length (int): The number of samples covered by the line.
+        :return: tuple of np.array: The x and y coordinates to plot with drawstyle='steps-post'.
+        """
+        x, y = step_points(values, self.multi_model.window_size, length)
+        if self.multi_model.downsample_plot:
+            x, y = min_max_envelope(x, y, buckets=self.plot_buckets())
+        return x, y
+
+    @staticmethod
+    def plot_buckets():
+        """
+        :return: int: The number of buckets to which the plotted lines are decimated, from the figure's width in pixels.
+        """
+        return int(FIGURE_SIZE[0] * FIGURE_DPI * BUCKETS_PER_PIXEL)
+
+    def plot_paths(self):
+        """
+        Constructs the paths of the plot files from the plot attributes, one per plot format, and ensures that their
+        directory exists. The first path (the first format, PDF by default) is kept as plot_path.
+
+        :return: list of str: The paths of the plot files.
+        :side effect: Creates the directory of the plot files, and sets plot_path.
+        """
+        multi_model = self.multi_model
+        folder_prefix = multi_model.output_folder_path + "/simulation-analysis/" + multi_model.metric + "/"
+        os.makedirs(folder_prefix, exist_ok=True)
+        file_prefix = folder_prefix + multi_model.plot_type + "_plot_multimodel_metric=" + multi_model.metric + \
+            "_window=" + str(multi_model.window_size) + multi_model.variant_suffix()
+        paths = [file_prefix + "." + plot_format for plot_format in multi_model.plot_formats]
+        multi_model.plot_path = paths[0]
+        return paths
+
+    def sum_models_entries(self):
+        """
+        Computes the total values from each model for use in cumulative plotting. The total of a model is a lookup into
+        its cached prefix sums, so repeated calls do not sum the data again.
+
+        :return: List of summed values for each model, useful for plotting and analysis.
+        """
+        return [model.cumulated if is_meta_model(model) else round(model.total(), 2)
+                for model in self.multi_model.models]
+
+    def get_cumulative_limits(self, model_sums):
+        """
+        Calculates the appropriate x-axis limits for cumulative plots based on the summarized data from each model.
+
+        :param model_sums (list of float): The total values for each model.
+        :return: tuple: A tuple containing the minimum and maximum x-axis limits.
+        """
+        multi_model = self.multi_model
+        axis_min = min(model_sums) * 0.9
+        axis_max = max(model_sums) * 1.1
+
+        if multi_model.user_input["x_min"] is not None:
+            axis_min = multi_model.user_input["x_min"]
+        if multi_model.user_input["x_max"] is not None:
+            axis_max = multi_model.user_input["x_max"]
+
+        return [axis_min * 0.9, axis_max * 1.1]
\ No newline at end of file
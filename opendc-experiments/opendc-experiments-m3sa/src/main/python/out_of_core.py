@@ -0,0 +1,132 @@
+import tempfile
+
+import numpy as np
+
+"""
+Out-of-core analysis, for sweeps whose (models x samples) data does not fit in memory. The reduced series of the
+models, and the matrices derived from them, are spilled to memory-mapped temporary files in the analysis folder, such
+that the operating system pages them in and out as they are used, instead of holding them in memory. The reductions
+across the models (the meta-functions and the percentiles of the fan chart) are computed tile by tile, over ranges of
+samples sized to a memory budget: within a tile, the reduction runs as in memory, over a contiguous (models x samples)
+block, such that the results are identical to those of the in-memory analysis, and written to memory-mapped arrays.
+The budget bounds these reductions; the series of the few models being read or windowed at a time are held besides.
+
+The temporary files are unlinked as soon as they are created, and are removed by the operating system once their last
+mapping is released.
+"""
+
+SPILL_FOLDER_NAME = "out-of-core"
+
+"""
+The number of tile-sized arrays alive at once while a tile is reduced: the tile itself, and the temporaries of the
+reduction (e.g., the partition of the median, or the sorted copy of the percentiles).
+"""
+TILE_COPIES = 4
+
+"""
+The alignment, in bytes, of the series appended to a spill file, such that each of them can be viewed in its type.
+"""
+SPILL_ALIGNMENT = 64
+
+
+class SpillFile:
+    """
+    An append-only temporary file holding series (e.g., the series read from the simulation data files), mapped back
+    once all of them are written. All the series share one file, and one mapping, whatever their number.
+
+    Attributes:
+        file (file): The unlinked temporary file.
+        entries (list of tuple): The (offset, dtype, shape) of each series appended.
+        size (int): The size of the file, in bytes.
+
+    Methods:
+        append(array): Writes a series to the file.
+        map(): Returns the series appended, as views of the mapped file.
+    """
+
+    def __init__(self, folder_path):
+        """
+        :param folder_path (str): The folder in which the temporary file is created.
+        """
+        self.file = tempfile.TemporaryFile(dir=folder_path)
+        self.entries = []
+        self.size = 0
+
+    def append(self, array):
+        """
+        :param array (np.array): A series.
+        :return: int: The index of the series in the file.
+        :side effect: Writes the series at the end of the file.
+        """
+        array = np.ascontiguousarray(array)
+        offset = -(-self.size // SPILL_ALIGNMENT) * SPILL_ALIGNMENT
+        self.file.seek(offset)
+        array.tofile(self.file)
+        self.entries.append((offset, array.dtype, array.shape))
+        self.size = offset + array.nbytes
+        return len(self.entries) - 1
+
+    def map(self):
+        """
+        :return: list of np.array: The series appended, in order, as read-only views of the mapped file.
+        """
+        self.file.flush()
+        if self.size == 0:
+            return [np.empty(shape, dtype=dtype) for _, dtype, shape in self.entries]
+
+        mapped = np.memmap(self.file, dtype=np.uint8, mode="r", shape=(self.size,))
+        return [
+            mapped[offset:offset + dtype.itemsize * int(np.prod(shape))].view(dtype).reshape(shape)
+            for offset, dtype, shape in self.entries
+        ]
+
+
+def spill_array(folder_path, shape, dtype):
+    """
+    :param folder_path (str): The folder in which the temporary file is created.
+    :param shape (tuple): The shape of the array.
+    :param dtype (type): The type of the array.
+    :return: np.array: A writable array of the given shape, mapped to a temporary file (or in memory, if empty).
+    """
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(tempfile.TemporaryFile(dir=folder_path), dtype=dtype, mode="w+", shape=shape)
+
+
+def tile_width(rows, itemsize, budget_bytes):
+    """
+    :param rows (int): The number of rows (e.g., models) of the tiles.
+    :param itemsize (int): The size of one value, in bytes.
+    :param budget_bytes (int): The memory budget of a tile and its temporaries, in bytes.
+    :return: int: The number of samples of each tile; at least one.
+    """
+    return max(1, int(budget_bytes // (max(rows, 1) * itemsize * TILE_COPIES)))
+
+
+def apply_tiled(function, rows, length, budget_bytes, dtype, allocate=np.empty):
+    """
+    Applies a reduction across rows (e.g., a meta-function across the models) tile by tile: the samples [start, stop)
+    of every row are gathered into one contiguous (rows x samples) tile, reused from tile to tile, and reduced.
+
+    :param function (function): Reduces a (rows x samples) tile to the values of its samples, along the last axis
+        (e.g., one value per sample, or one row of values per percentile).
+    :param rows (list of np.array): The rows, e.g., the models' processed data, or the rows of a (mapped) matrix.
+    :param length (int): The number of samples reduced, from the start of the rows.
+    :param budget_bytes (int): The memory budget of a tile and its temporaries, in bytes.
+    :param dtype (type): The type of the tiles.
+    :param allocate (function): Allocates the array receiving the reduced values, from its shape and type; e.g., an
+        array mapped to a file (see spill_array), such that the reduced values are not held in memory either.
+    :return: np.array: The reduced values of all the samples.
+    """
+    out = None
+    width = min(tile_width(len(rows), np.dtype(dtype).itemsize, budget_bytes), max(length, 1))
+    tile = np.empty((len(rows), width), dtype=dtype)
+    for start in range(0, length, width):
+        stop = min(start + width, length)
+        for row, series in enumerate(rows):
+            tile[row, :stop - start] = series[start:stop]
+        values = function(tile[:, :stop - start])
+        if out is None:
+            out = allocate(values.shape[:-1] + (length,), values.dtype)
+        out[..., start:stop] = values
+    return out if out is not None else function(tile[:, :0])
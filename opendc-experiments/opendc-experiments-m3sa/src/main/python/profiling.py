@@ -0,0 +1,177 @@
+import cProfile
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+"""
+Instrumentation of the analysis. Records, per stage (and per model, where a stage runs per model), the wall time, CPU
+time and peak resident memory, plus the volume of data read during ingestion.
+"""
+
+PROFILE_FILE_NAME = "profile"
+
+
+def peak_rss_mb():
+    """
+    :return: float or None: The peak resident set size of the process so far, in megabytes, or None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+@contextmanager
+def timed(timings, key):
+    """
+    Adds the wall time and the CPU time of the calling thread spent in the block to timings[key]. Thread CPU time is
+    used such that blocks running concurrently in a thread pool are measured independently. Does nothing if timings is
+    None, such that callers can be instrumented at no cost when profiling is disabled.
+
+    :param timings: Dictionary accumulating the measurements, or None.
+    :param key: The name under which the measurement is accumulated.
+    """
+    if timings is None:
+        yield
+        return
+
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        entry = timings.setdefault(key, {"wall_time": 0.0, "cpu_time": 0.0})
+        entry["wall_time"] += time.perf_counter() - wall_start
+        entry["cpu_time"] += time.thread_time() - cpu_start
+
+
+class Profiler:
+    """
+    Collects the measurements of the analysis stages, and writes them as a structured profile (JSON and CSV) next to
+    the analysis file. Optionally, it also runs cProfile over the whole analysis, and dumps its statistics in the
+    pstats format (readable with pstats, snakeviz, or flameprof); external samplers such as py-spy need no hook.
+
+    Attributes:
+        enabled (bool): Whether measurements are recorded. When disabled, the stages run without any overhead.
+        records (list of dict): One record per measured stage (and model).
+        cprofiler (cProfile.Profile): The running cProfile profiler, or None.
+
+    Methods:
+        stage(name, model): Context manager measuring a stage of the analysis.
+        add(record): Adds a record measured elsewhere (e.g., in an ingestion worker).
+        pause(): Stops cProfile until resume is called.
+        resume(): Restarts cProfile.
+        write(folder_path, suffix): Writes the profile files.
+    """
+
+    def __init__(self, enabled=False, cprofile=False):
+        """
+        :param enabled (bool): Whether measurements are recorded.
+        :param cprofile (bool): Whether to run cProfile from now until the profile is written.
+        """
+        self.enabled = enabled
+        self.records = []
+        self.cprofiler = None
+        if cprofile:
+            self.cprofiler = cProfile.Profile()
+            self.cprofiler.enable()
+
+    @contextmanager
+    def stage(self, name, model=None):
+        """
+        Measures the wall time, the process CPU time and the peak memory of a stage. The yielded record can be extended
+        by the caller with counters (e.g., rows decoded).
+
+        :param name (str): The name of the stage: 'ingest', 'reduce', 'window', 'meta-aggregate', 'render' or 'save'.
+        :param model (int): The id of the model the stage runs for, or None for a stage over all models.
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        record = {"stage": name, "model": model}
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_time"] = time.perf_counter() - wall_start
+            record["cpu_time"] = time.process_time() - cpu_start
+            record["peak_rss_mb"] = peak_rss_mb()
+            self.records.append(record)
+
+    def add(self, record):
+        """
+        :param record (dict): A record measured elsewhere, holding at least the 'stage' key.
+        :return: None
+        """
+        if self.enabled:
+            self.records.append({"model": None, "peak_rss_mb": peak_rss_mb(), **record})
+
+    def pause(self):
+        """
+        Stops cProfile, if it runs, e.g., while the analysis of another variant runs in the same process (in watch
+        mode), as only one cProfile profiler can run at a time.
+
+        :return: None
+        """
+        if self.cprofiler is not None:
+            self.cprofiler.disable()
+
+    def resume(self):
+        """
+        Restarts cProfile, if it was started for this profile, after pause (or after the profile was written).
+
+        :return: None
+        """
+        if self.cprofiler is not None:
+            self.cprofiler.enable()
+
+    def totals(self):
+        """
+        :return: dict: Per stage, the summed wall time, CPU time, rows decoded and bytes read of its records.
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {})
+            for key in ["wall_time", "cpu_time", "rows_decoded", "bytes_read"]:
+                if record.get(key) is not None:
+                    total[key] = total.get(key, 0) + record[key]
+        return totals
+
+    def write(self, folder_path, suffix=""):
+        """
+        Writes the profile as profile<suffix>.json (records and per-stage totals) and profile<suffix>.csv (records),
+        and, if cProfile runs, stops it and dumps its statistics to profile<suffix>.prof.
+
+        :param folder_path (str): The folder in which the profile files are written.
+        :param suffix (str): The suffix of the file names (e.g., the variant of a batch run).
+        :return: None
+        :side effect: Creates or overwrites the profile files.
+        """
+        base_path = os.path.join(folder_path, PROFILE_FILE_NAME + suffix)
+
+        if self.cprofiler is not None:
+            self.cprofiler.disable()
+            self.cprofiler.dump_stats(base_path + ".prof")
+
+        if not self.enabled:
+            return
+
+        with open(base_path + ".json", "w") as f:
+            json.dump({"stages": self.records, "totals": self.totals()}, f, indent=2)
+
+        fields = ["stage", "model"]
+        for record in self.records:
+            fields += [key for key in record if key not in fields]
+        with open(base_path + ".csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.records)
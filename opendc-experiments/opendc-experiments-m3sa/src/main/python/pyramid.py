@@ -0,0 +1,281 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+
+import numpy as np
+
+"""
+Multi-resolution aggregate pyramid of a series. Level k of the pyramid holds the sum, count, minimum and maximum of
+every block of 2^k consecutive samples (level 0 being the series itself), such that the aggregate of any range of
+samples is combined from at most two blocks per level, instead of from every sample of the range. Windowing a series
+with any window size, over the whole series or over a zoomed [start, stop) range, then takes at most O(log(window_size))
+work per window. The pyramids are saved beside the raw output, and memory-mapped back, such that a later run with other
+windows reads only the blocks of the levels it uses, instead of rescanning the series.
+"""
+
+PYRAMID_FOLDER_NAME = "pyramids"
+
+"""
+The window functions answered from the pyramid; the others (the median and the percentiles) need every sample.
+"""
+PYRAMID_FUNCTIONS = ["mean", "sum", "min", "max"]
+
+"""
+The window functions which commute with the mean across models: the mean across models of the windowed models is the
+windowed mean of the models, such that the Meta-Model can be windowed from its own pyramid.
+"""
+LINEAR_FUNCTIONS = ["mean", "sum"]
+WINDOW_REDUCTIONS = {"min": np.min, "max": np.max}
+
+"""
+The cost of combining one block into one window, relative to the cost of reducing one block of an aligned level: the
+vectorized decomposition (see combine_blocks) gathers its blocks by index, level by level, while an aligned level is
+reduced in one contiguous pass.
+"""
+BLOCK_STEP_COST = 20
+
+
+class AggregatePyramid:
+    """
+    The aggregate pyramid of a series.
+
+    Attributes:
+        base (np.array): The series (level 0).
+        sums (list of np.array): The float64 sum of each block, per level from level 1 on.
+        counts (list of np.array): The number of samples of each block, per level from level 1 on; all blocks hold 2^k
+            samples, but the last block of a level, which holds the samples left.
+        minima (list of np.array): The minimum of each block, per level from level 1 on.
+        maxima (list of np.array): The maximum of each block, per level from level 1 on.
+
+    Methods:
+        windows(window_size, window_function, start, stop): Returns one aggregated value per window of a sample range.
+        save(path): Writes the pyramid to a file.
+    """
+
+    def __init__(self, base, sums, counts, minima, maxima):
+        self.base = base
+        self.sums = sums
+        self.counts = counts
+        self.minima = minima
+        self.maxima = maxima
+
+    def __len__(self):
+        return len(self.base)
+
+    def level(self, k, statistic):
+        """
+        :param k (int): The level; 0 for the series itself.
+        :param statistic (str): One of 'sum', 'count', 'min' and 'max'.
+        :return: np.array: The statistic of each block of the level.
+        """
+        if k == 0:
+            return np.ones(len(self.base), dtype=np.int64) if statistic == "count" else self.base
+        return {"sum": self.sums, "count": self.counts, "min": self.minima, "max": self.maxima}[statistic][k - 1]
+
+    def windows(self, window_size, window_function="mean", start=0, stop=None):
+        """
+        Aggregates each window of 'window_size' consecutive samples of the range [start, stop), the last window holding
+        the samples left, as aggregate_windows (see windowing.py) does over the samples. The windows are answered from
+        the nearest level of the pyramid: the highest level whose blocks align with the windows, if reducing its blocks
+        is cheaper than decomposing each window into blocks (see combine_blocks); e.g., windows of 100 samples are
+        reduced from 25 blocks of level 2 each, and windows of 999 samples are decomposed.
+
+        :param window_size (int): The number of samples in each window.
+        :param window_function (str): One of PYRAMID_FUNCTIONS.
+        :param start (int): The first sample of the range; clipped to the series.
+        :param stop (int): The sample after the last one of the range; the end of the series if None.
+        :return: np.array: One value per window; float64 for the mean and the sum, in the series' type otherwise.
+        :raise ValueError: If the window function cannot be answered from the pyramid.
+        """
+        if window_function not in PYRAMID_FUNCTIONS:
+            raise ValueError(f"Window function not answered by the pyramid. Please select between {PYRAMID_FUNCTIONS}.")
+
+        length = len(self.base)
+        stop = length if stop is None else min(max(int(stop), 0), length)
+        start = min(max(int(start), 0), stop)
+        lower = np.arange(start, stop, window_size, dtype=np.int64)
+        upper = np.minimum(lower + window_size, stop)
+        statistic = "sum" if window_function == "mean" else window_function
+
+        alignment = math.gcd(window_size, start)
+        k = min((alignment & -alignment).bit_length() - 1, len(self.sums))
+        full_windows = (stop - start) // window_size
+        if full_windows and (stop - start) >> k <= BLOCK_STEP_COST * len(lower) * window_size.bit_length():
+            blocks = self.level(k, statistic)[start >> k:(start + full_windows * window_size) >> k]
+            blocks = blocks.reshape(full_windows, window_size >> k)
+            result = np.empty(len(lower), dtype=np.float64)
+            if blocks.shape[1] == 1:
+                result[:full_windows] = blocks[:, 0]
+            elif statistic == "sum":
+                result[:full_windows] = np.sum(blocks, axis=1, dtype=np.float64)
+            else:
+                result[:full_windows] = WINDOW_REDUCTIONS[statistic](blocks, axis=1)
+            result[full_windows:] = self.combine_blocks(lower[full_windows:], upper[full_windows:], statistic)
+        else:
+            result = self.combine_blocks(lower, upper, statistic)
+
+        if window_function == "mean":
+            result /= upper - lower
+        return result if statistic == "sum" else result.astype(self.base.dtype, copy=False)
+
+    def combine_blocks(self, lower, upper, statistic):
+        """
+        Combines the statistic over each range [lower, upper), from the largest aligned blocks of the pyramid which
+        cover it, at most two per level (as in a segment tree): on each level, from the bottom up, a range whose start
+        (or end) is not aligned with the next level takes the block at its start (or end). All the ranges are
+        decomposed together, in one vectorized step per level.
+
+        :param lower (np.array): The first sample of each range.
+        :param upper (np.array): The sample after the last one of each range.
+        :param statistic (str): One of 'sum', 'min' and 'max'.
+        :return: np.array: The float64 statistic of each range.
+        """
+        lower, upper = lower.copy(), upper.copy()
+        combine = {"sum": np.add, "min": np.minimum, "max": np.maximum}[statistic]
+        result = np.full(len(lower), {"sum": 0.0, "min": np.inf, "max": -np.inf}[statistic], dtype=np.float64)
+
+        for k in range(len(self.sums) + 1):
+            if not np.any(lower < upper):
+                break
+            block = 1 << k
+            take = ((lower >> k) & 1 == 1) & (lower + block <= upper)
+            result[take] = combine(result[take], self.level(k, statistic)[lower[take] >> k])
+            lower[take] += block
+
+            take = ((upper >> k) & 1 == 1) & (upper - block >= lower)
+            result[take] = combine(result[take], self.level(k, statistic)[(upper[take] >> k) - 1])
+            upper[take] -= block
+        return result
+
+    def save(self, folder_path):
+        """
+        Writes the pyramid to a folder, with one file per statistic, holding the blocks of all its levels one level
+        after the other, such that the pyramid can be memory-mapped back (see load_pyramid).
+
+        :param folder_path (str): The folder of the pyramid.
+        :return: None
+        :side effect: Creates the folder and its files; a pyramid already saved there is kept.
+        """
+        temporary_path = f"{folder_path}.{os.getpid()}.tmp"
+        os.makedirs(temporary_path, exist_ok=True)
+        np.save(os.path.join(temporary_path, "base.npy"), self.base)
+        for statistic, levels in [("sum", self.sums), ("count", self.counts), ("min", self.minima),
+                                  ("max", self.maxima)]:
+            blocks = np.concatenate(levels) if levels else np.empty(0, dtype=self.level(0, statistic).dtype)
+            np.save(os.path.join(temporary_path, f"{statistic}.npy"), blocks)
+        try:
+            os.rename(temporary_path, folder_path)
+        except OSError:
+            # saved concurrently, e.g., by another analysis of the same output
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+
+def build_pyramid(series):
+    """
+    Builds the pyramid of a series, each level from the level below, by combining its blocks pairwise.
+
+    :param series (np.array): The series.
+    :return: AggregatePyramid: The pyramid, with levels up to a single block.
+    """
+    base = np.ascontiguousarray(series)
+    sums, counts, minima, maxima = [], [], [], []
+    level_sums, level_counts = base.astype(np.float64), np.ones(len(base), dtype=np.int64)
+    level_minima, level_maxima = base, base
+
+    while len(level_sums) > 1:
+        if len(level_sums) % 2 == 1:
+            level_sums = np.append(level_sums, 0.0)
+            level_counts = np.append(level_counts, 0)
+            level_minima = np.append(level_minima, np.inf).astype(base.dtype)
+            level_maxima = np.append(level_maxima, -np.inf).astype(base.dtype)
+        level_sums = level_sums[0::2] + level_sums[1::2]
+        level_counts = level_counts[0::2] + level_counts[1::2]
+        level_minima = np.minimum(level_minima[0::2], level_minima[1::2])
+        level_maxima = np.maximum(level_maxima[0::2], level_maxima[1::2])
+        sums.append(level_sums)
+        counts.append(level_counts)
+        minima.append(level_minima)
+        maxima.append(level_maxima)
+
+    return AggregatePyramid(base, sums, counts, minima, maxima)
+
+
+def load_pyramid(folder_path):
+    """
+    :param folder_path (str): The folder of a pyramid, as written by AggregatePyramid.save.
+    :return: AggregatePyramid: The pyramid, its files memory-mapped, such that only the blocks used are read; None if
+        the folder is missing or unreadable.
+    """
+    try:
+        base = np.load(os.path.join(folder_path, "base.npy"), mmap_mode="r")
+        blocks = {
+            statistic: np.load(os.path.join(folder_path, f"{statistic}.npy"), mmap_mode="r")
+            for statistic in ["sum", "count", "min", "max"]
+        }
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+
+    lengths, length = [], len(base)
+    while length > 1:
+        length = -(-length // 2)
+        lengths.append(length)
+    if any(len(statistic_blocks) != sum(lengths) for statistic_blocks in blocks.values()):
+        return None
+
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+    levels = {
+        statistic: [statistic_blocks[offsets[k]:offsets[k + 1]] for k in range(len(lengths))]
+        for statistic, statistic_blocks in blocks.items()
+    }
+    return AggregatePyramid(base, levels["sum"], levels["count"], levels["min"], levels["max"])
+
+
+def cached_pyramid(output_folder_path, key, length, series):
+    """
+    Returns the pyramid of a series, loaded from the pyramids of the output if it was saved there under the key, or
+    built and saved otherwise.
+
+    :param output_folder_path (str): Path where the simulation output is stored; the pyramids are saved beside the raw
+        output, in its PYRAMID_FOLDER_NAME folder.
+    :param key (str): The key of the series (see pyramid_key); the pyramid is only built, not saved, if empty.
+    :param length (int): The length of the series, against which a saved pyramid is checked.
+    :param series (function): Returns the series; only called if the pyramid is built.
+    :return: AggregatePyramid: The pyramid of the series.
+    """
+    folder_path = os.path.join(output_folder_path, PYRAMID_FOLDER_NAME, key) if key else None
+    pyramid = load_pyramid(folder_path) if folder_path else None
+    if pyramid is None or len(pyramid) != length:
+        pyramid = build_pyramid(series())
+        if folder_path:
+            os.makedirs(os.path.dirname(folder_path), exist_ok=True)
+            pyramid.save(folder_path)
+    return pyramid
+
+
+def pyramid_key(source_paths, **parameters):
+    """
+    Computes the key of the pyramid of a series read from the given files: the key changes whenever one of the files is
+    rewritten, or the series is read with other parameters.
+
+    :param source_paths (list of str): The files from which the series is read.
+    :param parameters: The parameters of the read (e.g., metric, unit scaling, timestamp range).
+    :return: str: The hexadecimal key.
+    """
+    fingerprint = {
+        "sources": [
+            (os.path.abspath(path), os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in source_paths
+        ],
+        "parameters": parameters,
+    }
+    return hashlib.sha1(json.dumps(fingerprint, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def derived_key(keys, **parameters):
+    """
+    :param keys (list of str): The keys of the series from which a series is derived, e.g., the models of a Meta-Model.
+    :param parameters: The parameters of the derivation (e.g., the meta-function).
+    :return: str: The hexadecimal key of the derived series.
+    """
+    return hashlib.sha1(json.dumps({"keys": keys, "parameters": parameters}, sort_keys=True).encode()).hexdigest()
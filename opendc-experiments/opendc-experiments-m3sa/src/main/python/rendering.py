@@ -0,0 +1,80 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from constants import PLOT_FORMATS
+
+"""
+Off-screen rendering of the M3SA figures. A figure is described by a plain, picklable specification (its labels, axis
+settings, the calls drawing its data on the axes, and the files to write), and drawn with matplotlib's object-oriented
+Figure API on the Agg canvas, without pyplot's global state. Independent figures can therefore be rendered in parallel,
+by a pool of processes.
+"""
+
+FIGURE_SIZE = (12, 10)
+FIGURE_DPI = 100
+
+
+def render_figure(spec):
+    """
+    Draws a figure from its specification, and writes it to each of its paths, in the format given by the extension.
+    matplotlib is imported here, on the first rendered figure, such that headless runs never load it.
+
+    :param spec (dict): The figure specification, with the keys:
+        title, x_label, y_label (str): The title and axis labels.
+        x_ticks_count, y_ticks_count (int): The maximum number of ticks per axis, or None.
+        x_lim, y_lim (tuple): The (lower, upper) limits of the axes; None for a limit fitted to the data.
+        calls (list of tuple): The (method name, args, kwargs) of each Axes call drawing the data, in order.
+        paths (list of str): The files the figure is written to.
+    :return: list of str: The written paths.
+    :side effect: Creates or overwrites the figure's files.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+    figure = Figure(figsize=FIGURE_SIZE, dpi=FIGURE_DPI)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+
+    ax.tick_params(axis="both", labelsize=22)
+    ax.set_ylabel(spec["y_label"], size=26)
+    ax.set_xlabel(spec["x_label"], size=26)
+    ax.set_title(spec["title"], size=26)
+    ax.grid()
+
+    ax.xaxis.set_major_formatter(FuncFormatter(lambda x, _: '{:,}'.format(int(x)) if x >= 1000 else int(x)))
+    # ax.yaxis.set_major_formatter(formatter) yaxis has formatting issues - to solve in a future iteration
+
+    if spec["x_ticks_count"] is not None:
+        ax.xaxis.set_major_locator(MaxNLocator(spec["x_ticks_count"]))
+    if spec["y_ticks_count"] is not None:
+        ax.yaxis.set_major_locator(MaxNLocator(spec["y_ticks_count"]))
+
+    for limits, set_limits in [(spec["x_lim"], ax.set_xlim), (spec["y_lim"], ax.set_ylim)]:
+        if limits is not None and any(limit is not None for limit in limits):
+            set_limits(*limits)
+
+    for method, args, kwargs in spec["calls"]:
+        getattr(ax, method)(*args, **kwargs)
+
+    figure.tight_layout()
+    figure.subplots_adjust(right=0.85)
+    ax.legend(fontsize=12, bbox_to_anchor=(1, 1))
+
+    for path in spec["paths"]:
+        figure.savefig(path)
+    return spec["paths"]
+
+
+def render_figures(specs, workers=1):
+    """
+    Renders independent figures, sequentially or, with several workers, in a pool of processes.
+
+    :param specs (list of dict): The specifications of the figures (see render_figure).
+    :param workers (int): The number of processes rendering figures concurrently.
+    :return: list of list of str: The written paths of each figure, in the order of the specifications.
+    """
+    if workers <= 1 or len(specs) <= 1:
+        return [render_figure(spec) for spec in specs]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(specs))) as pool:
+        return list(pool.map(render_figure, specs))
@@ -0,0 +1,190 @@
+import numpy as np
+
+"""
+Running aggregate of the models' series, maintained incrementally as models are added (e.g., while a simulation sweep
+is still running), such that the Meta-Model is updated per new model without revisiting the earlier ones.
+
+The mean is kept exactly, from running sums. The median and other quantiles are read from a bounded quantile sketch, a
+per-sample compactor hierarchy (as in the KLL sketch): each level holds at most SKETCH_CAPACITY rows of values, each
+standing for 2^level series; a full level is sorted per sample, and every other row is promoted to the next level, with
+twice the weight. The quantiles are exact as long as at most SKETCH_CAPACITY series are added; beyond, their rank error
+grows with the number of levels, i.e., logarithmically with the number of series, while the memory of the sketch stays
+within SKETCH_CAPACITY rows per level.
+"""
+
+SKETCH_CAPACITY = 256
+
+
+class RunningAggregate:
+    """
+    The per-sample aggregate of the series added so far, over the samples covered by all of them. It keeps the running
+    sums (for the mean), and a quantile sketch of the values of each sample (for the median and other quantiles), into
+    which each new series is added in amortized O(samples) time, whatever the number of series added before. Two
+    aggregates can be merged as well, e.g., when partial sweeps are analyzed separately.
+
+    Attributes:
+        count (int): The number of series added.
+        sums (np.array): The float64 sum of the series, per sample.
+        capacity (int): The number of rows of each level of the sketch.
+        levels (list of np.array): The (capacity x samples) buffer of each level of the sketch; the rows of level k
+            stand for 2^k series each.
+        sizes (list of int): The number of rows filled in each level.
+        compactions (list of int): The number of compactions of each level, alternating the rows promoted.
+
+    Methods:
+        add(series): Adds a series.
+        merge(other): Adds the series of another aggregate.
+        exact(): Returns whether the sketch holds every series added.
+        mean(): Returns the mean of the series, per sample.
+        quantile(q): Returns a quantile of the series, per sample.
+        sorted_values(): Returns values representative of the series, sorted per sample.
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY):
+        """
+        :param capacity (int): The number of rows of each level of the sketch; an even number, at least 2.
+        :raise ValueError: If the capacity is not an even number of at least 2.
+        """
+        if capacity < 2 or capacity % 2:
+            raise ValueError("Sketch capacity not valid. Please enter an even number of at least 2.")
+        self.count = 0
+        self.sums = np.empty(0, dtype=np.float64)
+        self.capacity = capacity
+        self.levels = []
+        self.sizes = []
+        self.compactions = []
+
+    def add(self, series):
+        """
+        :param series (np.array): The series of a model; the aggregate is truncated to the shortest series added.
+        :return: None
+        :side effect: Updates the count, sums and sketch.
+        """
+        series = np.asarray(series)
+        self.add_sums(series.astype(np.float64))
+        self.count += 1
+        self.push(0, series[np.newaxis, :len(self.sums)])
+
+    def merge(self, other):
+        """
+        :param other (RunningAggregate): Another aggregate, whose series are added to this one.
+        :return: None
+        :side effect: Updates the count, sums and sketch.
+        """
+        if other.count == 0:
+            return
+        self.add_sums(other.sums.copy())
+        self.count += other.count
+        for level, (values, size) in enumerate(zip(other.levels, other.sizes)):
+            self.push(level, values[:size, :len(self.sums)])
+
+    def add_sums(self, sums):
+        """
+        :param sums (np.array): The float64 sums of the series added, owned by the aggregate from now on.
+        :return: None
+        :side effect: Adds the sums, and truncates the sums and the sketch to the shortest series.
+        """
+        if self.count == 0:
+            self.sums = sums
+            return
+
+        length = min(len(self.sums), len(sums))
+        self.sums = self.sums[:length] + sums[:length]
+        self.levels = [values[:, :length] for values in self.levels]
+
+    def push(self, level, rows):
+        """
+        :param level (int): The level of the sketch receiving the rows.
+        :param rows (np.array): The (rows x samples) values, each row standing for 2^level series.
+        :return: None
+        :side effect: Writes the rows into the level, compacting it into the next level whenever it is full.
+        """
+        while len(rows):
+            if level == len(self.levels):
+                self.levels.append(np.empty((self.capacity, rows.shape[1]), dtype=rows.dtype))
+                self.sizes.append(0)
+                self.compactions.append(0)
+            if self.sizes[level] == self.capacity:
+                self.push(level + 1, self.compact(level))
+
+            size = self.sizes[level]
+            taken = min(len(rows), self.capacity - size)
+            self.levels[level][size:size + taken] = rows[:taken]
+            self.sizes[level] = size + taken
+            rows = rows[taken:]
+
+    def compact(self, level):
+        """
+        :param level (int): A full level of the sketch.
+        :return: np.array: Every other row of the level, sorted per sample; half the rows, each standing for twice as
+            many series.
+        :side effect: Empties the level.
+        """
+        values = np.sort(self.levels[level], axis=0)
+        offset = self.compactions[level] % 2
+        self.compactions[level] += 1
+        self.sizes[level] = 0
+        return values[offset::2]
+
+    def exact(self):
+        """
+        :return: bool: Whether the sketch holds every series added, such that its quantiles are exact.
+        """
+        return len(self.levels) <= 1
+
+    def mean(self):
+        """
+        :return: np.array: The mean of the series, per sample.
+        """
+        return self.sums / self.count
+
+    def quantile(self, q):
+        """
+        Reads a quantile of each sample from the sketch, with linear interpolation between the closest ranks (as
+        np.quantile does by default, which it matches while the sketch is exact); q=0.5 gives the median.
+
+        :param q (float): The quantile, between 0 and 1.
+        :return: np.array: The quantile of the series, per sample.
+        """
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        """
+        :param qs (list of float): The quantiles, between 0 and 1.
+        :return: np.array: The (quantiles x samples) quantiles of the series.
+        """
+        values = np.concatenate([values[:size] for values, size in zip(self.levels, self.sizes)])
+        weights = np.concatenate([np.full(size, 2 ** level) for level, size in enumerate(self.sizes)])
+        order = np.argsort(values, axis=0)
+        values = np.take_along_axis(values, order, axis=0)
+        ranks = np.cumsum(weights[order], axis=0)
+
+        quantiles = np.empty((len(qs), values.shape[1]), dtype=values.dtype)
+        for row, q in enumerate(qs):
+            position = (self.count - 1) * q
+            lower = int(np.floor(position))
+            upper = min(lower + 1, self.count - 1)
+            fraction = position - lower
+            quantiles[row] = ranked(values, ranks, lower) * (1 - fraction) + ranked(values, ranks, upper) * fraction
+        return quantiles
+
+    def sorted_values(self):
+        """
+        :return: np.array: The values of the series, sorted per sample, while the sketch is exact; otherwise, capacity
+            quantiles of the series, evenly spaced from the minimum to the maximum, standing for them.
+        """
+        if self.exact():
+            return np.sort(self.levels[0][:self.sizes[0]], axis=0)
+        return self.quantiles(np.linspace(0, 1, self.capacity))
+
+
+def ranked(values, ranks, rank):
+    """
+    :param values (np.array): The (n x samples) values, sorted per sample.
+    :param ranks (np.array): The (n x samples) cumulative weights of the sorted values: value i stands for the ranks
+        [ranks[i - 1], ranks[i]).
+    :param rank (int): A rank, from 0.
+    :return: np.array: The value of the rank, per sample.
+    """
+    rows = np.count_nonzero(ranks <= rank, axis=0)
+    return np.take_along_axis(values, rows[np.newaxis, :], axis=0)[0]
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+"""
+On-disk cache of the reduced (per-timestamp) simulation data, such that re-runs which only change presentation or
+aggregation parameters do not decode the simulation data files again.
+"""
+
+CACHE_FOLDER_NAME = "cache"
+CACHE_FILE_EXTENSION = ".npy"
+BYTES_IN_MEGABYTE = 1024 * 1024
+
+
+class SeriesCache:
+    """
+    Stores reduced data series as .npy files, in a folder of the simulation analysis directory. An entry is keyed by the
+    fingerprint of the source file (path, size and modification time) and by the parameters of the reduction, so a
+    changed or regenerated source file is never served from a stale entry.
+
+    The folder is scanned once, when the cache is opened; the size and last use of its entries are then tracked as
+    series are stored and served, such that storing a series does not list the folder again, and the entries are only
+    sorted by last use when the size limit is exceeded.
+
+    Attributes:
+        cache_folder_path (str): The folder where the cached series are stored.
+        size_limit (int): The maximum total size of the cached series, in bytes. When exceeded, the least recently
+            used entries are evicted.
+        entries (dict): Per entry path, its last use (in nanoseconds) and its size (in bytes).
+        total_size (int): The total size of the entries, in bytes.
+
+    Methods:
+        key(source_path, **parameters): Computes the cache key of a series reduced from the source file.
+        get(key): Returns the cached series for the key, or None on a miss.
+        put(key, series): Stores the series under the key and enforces the size limit.
+        track(entry_path): Updates the last use and size of an entry, and the total size.
+        invalidate(): Removes all cached series.
+    """
+
+    def __init__(self, analysis_folder_path, size_limit_mb=1024):
+        """
+        Initializes the cache in the given simulation analysis directory.
+
+        :param analysis_folder_path (str): The simulation analysis directory, in which the cache folder is created.
+        :param size_limit_mb (float): The maximum total size of the cache, in megabytes.
+        :return: None
+        :side effect: Creates the cache folder if it does not exist, and scans its entries.
+        """
+        self.cache_folder_path = os.path.join(analysis_folder_path, CACHE_FOLDER_NAME)
+        self.size_limit = int(size_limit_mb * BYTES_IN_MEGABYTE)
+        os.makedirs(self.cache_folder_path, exist_ok=True)
+        self.entries = {}
+        for entry in os.scandir(self.cache_folder_path):
+            if entry.is_file() and entry.name.endswith(CACHE_FILE_EXTENSION):
+                stat = entry.stat()
+                self.entries[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        self.total_size = sum(size for _, size in self.entries.values())
+
+    def key(self, source_path, **parameters):
+        """
+        Computes the cache key of a series reduced from the source file with the given parameters.
+
+        :param source_path (str): The path of the file from which the series is reduced.
+        :param parameters: The parameters of the reduction (e.g., metric, timestamp range).
+        :return: str: The hexadecimal cache key.
+        """
+        stat = os.stat(source_path)
+        fingerprint = {
+            "path": os.path.abspath(source_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "parameters": parameters,
+        }
+        return hashlib.sha1(json.dumps(fingerprint, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached series for the key. A hit marks the entry as recently used.
+
+        :param key (str): The cache key.
+        :return: np.array or None: The cached series, or None if the key is not cached.
+        """
+        entry_path = self.entry_path(key)
+        try:
+            series = np.load(entry_path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        os.utime(entry_path)
+        self.track(entry_path)
+        return series
+
+    def put(self, key, series):
+        """
+        Stores the series under the key, then evicts the least recently used entries while the cache exceeds its limit.
+
+        :param key (str): The cache key.
+        :param series (np.array): The series to store.
+        :return: None
+        :side effect: Writes (and possibly deletes) files in the cache folder.
+        """
+        entry_path = self.entry_path(key)
+        temporary_path = entry_path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            np.save(f, np.asarray(series))
+        os.replace(temporary_path, entry_path)
+        self.track(entry_path)
+        if self.total_size > self.size_limit:
+            self.evict()
+
+    def track(self, entry_path):
+        """
+        :param entry_path (str): The path of an entry just stored or served.
+        :return: None
+        :side effect: Updates the last use and size of the entry, and the total size of the cache.
+        """
+        try:
+            stat = os.stat(entry_path)
+        except FileNotFoundError:
+            return
+        _, previous_size = self.entries.get(entry_path, (0, 0))
+        self.entries[entry_path] = (stat.st_mtime_ns, stat.st_size)
+        self.total_size += stat.st_size - previous_size
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the total size of the cache is within the size limit.
+
+        :return: None
+        :side effect: Deletes files in the cache folder.
+        """
+        for path, (_, size) in sorted(self.entries.items(), key=lambda entry: entry[1]):
+            if self.total_size <= self.size_limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self.entries[path]
+            self.total_size -= size
+
+    def invalidate(self):
+        """
+        Removes all cached series.
+
+        :return: None
+        :side effect: Deletes and recreates the cache folder.
+        """
+        shutil.rmtree(self.cache_folder_path, ignore_errors=True)
+        os.makedirs(self.cache_folder_path, exist_ok=True)
+        self.entries = {}
+        self.total_size = 0
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_folder_path, key + CACHE_FILE_EXTENSION)
@@ -0,0 +1,289 @@
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import socketserver
+import sys
+import traceback
+from collections import OrderedDict
+
+from batch import run_batch
+from input_parser import switch_to_root_dir
+from main import run_analysis
+
+"""
+Long-lived analysis server of M3SA. Instead of starting a new interpreter for every analysis, the launcher submits its
+analyses to this server, which keeps the recently loaded models in memory. The server starts without the heavy
+libraries; NumPy and PyArrow (and matplotlib, unless headless) are imported by the first analysis which needs them, and
+stay imported for the later ones.
+
+The server speaks JSON-RPC 2.0, one request (and one response) per line, either over a Unix domain socket or over
+stdin/stdout. The methods are:
+    analyze(output_folder_path, setup_path): Runs the analysis, as `python main.py <output_folder_path> <setup_path>`.
+        'setup_path' may also be a list of setup files, which then run as a batch (see batch.py).
+    ping(): Returns {"status": "ready"}.
+    shutdown(): Stops the server, after answering.
+
+Usage (from the python directory):
+    python server.py                       # listens on m3sa.sock, next to this file
+    python server.py --socket /tmp/m3sa.sock --max-datasets 8
+    python server.py --stdio
+"""
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "m3sa.sock")
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+ANALYSIS_ERROR = -32000
+
+
+def output_fingerprint(path):
+    """
+    :param path (str): Path where the simulation output is stored.
+    :return: tuple: The name, size and modification time of every file of the raw output; it changes whenever the
+        simulation output is rewritten. The folder in which the Meta-Model is exported is left out, as every analysis
+        with a Meta-Model rewrites it.
+    """
+    from ingestion import META_MODEL_FOLDER_NAME
+
+    raw_output_path = os.path.join(path, "raw-output")
+    fingerprint = []
+    for folder_path, folder_names, file_names in os.walk(raw_output_path):
+        if folder_path == raw_output_path and META_MODEL_FOLDER_NAME in folder_names:
+            folder_names.remove(META_MODEL_FOLDER_NAME)
+        folder_names.sort()
+        for file_name in sorted(file_names):
+            stat = os.stat(os.path.join(folder_path, file_name))
+            fingerprint.append((os.path.join(folder_path, file_name), stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+class WarmModels:
+    """
+    The models loaded by past analyses, per simulation output, such that an analysis of an output analyzed recently
+    does not read its simulation data again. The models of an output are dropped when its raw output changes, and the
+    least recently analyzed outputs are dropped beyond 'max_datasets'.
+
+    Attributes:
+        max_datasets (int): The maximum number of simulation outputs whose models are kept.
+        datasets (OrderedDict): Per output path, its fingerprint and its loaded models (as used by run_batch), from
+            the least to the most recently analyzed.
+
+    Methods:
+        models_for(path): Returns the loaded models of an output, to be passed to (and filled by) run_batch.
+    """
+
+    def __init__(self, max_datasets=4):
+        """
+        :param max_datasets (int): The maximum number of simulation outputs whose models are kept; 0 disables keeping.
+        """
+        self.max_datasets = max_datasets
+        self.datasets = OrderedDict()
+
+    def models_for(self, path):
+        """
+        :param path (str): Path where the simulation output is stored.
+        :return: dict: The loaded models of the output, per ingestion key; empty if the output is new or has changed.
+        """
+        if self.max_datasets < 1:
+            return {}
+
+        key = os.path.abspath(path)
+        fingerprint = output_fingerprint(path)
+        if key not in self.datasets or self.datasets[key][0] != fingerprint:
+            self.datasets[key] = (fingerprint, {})
+        self.datasets.move_to_end(key)
+
+        while len(self.datasets) > self.max_datasets:
+            self.datasets.popitem(last=False)
+        return self.datasets[key][1]
+
+
+class AnalysisServer:
+    """
+    Dispatches the JSON-RPC requests of the launcher to the analysis.
+
+    Attributes:
+        warm_models (WarmModels): The models kept in memory across analyses.
+        running (bool): False once a shutdown has been requested.
+
+    Methods:
+        handle(line): Handles one request line, and returns the response line.
+        call(request_id, method, params): Calls a method, and returns the response line.
+        analyze(output_folder_path, setup_path): Runs one analysis.
+    """
+
+    def __init__(self, max_datasets=4):
+        """
+        :param max_datasets (int): The maximum number of simulation outputs whose models are kept in memory.
+        """
+        self.warm_models = WarmModels(max_datasets)
+        self.running = True
+
+    def handle(self, line):
+        """
+        :param line (str): A JSON-RPC request.
+        :return: str: The JSON-RPC response, or None for a notification (a request without id).
+        """
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            return response(None, error=(PARSE_ERROR, f"Failed to decode JSON: {e}"))
+
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return response(None, error=(INVALID_REQUEST, "Invalid request."))
+
+        request_id = request.get("id")
+        params = request.get("params") or {}
+        methods = {"analyze": self.analyze, "ping": self.ping, "shutdown": self.shutdown}
+        if request["method"] not in methods:
+            result = response(request_id, error=(METHOD_NOT_FOUND, f"Method not found: {request['method']}."))
+        elif not isinstance(params, dict):
+            result = response(request_id, error=(INVALID_PARAMS, "Please provide the params as an object."))
+        else:
+            result = self.call(request_id, methods[request["method"]], params)
+
+        return result if "id" in request else None
+
+    def call(self, request_id, method, params):
+        """
+        :param request_id: The id of the request.
+        :param method (function): The method called by the request.
+        :param params (dict): The named parameters of the call.
+        :return: str: The JSON-RPC response, holding the result of the call or the error it raised.
+        """
+        try:
+            inspect.signature(method).bind(**params)
+        except TypeError as e:
+            return response(request_id, error=(INVALID_PARAMS, str(e)))
+
+        try:
+            return response(request_id, result=method(**params))
+        except Exception as e:
+            return response(request_id, error=(ANALYSIS_ERROR, f"{type(e).__name__}: {e}"), data=traceback.format_exc())
+
+    def analyze(self, output_folder_path, setup_path):
+        """
+        :param output_folder_path (str): Path where the simulation output is stored, relative to the project root.
+        :param setup_path (str or list of str): The path(s) of the setup file(s), relative to the project root.
+        :return: dict: The status of the analysis.
+        :side effect: Writes the analysis output, as main.py does.
+        """
+        setup_paths = [setup_path] if isinstance(setup_path, str) else list(setup_path)
+        with contextlib.redirect_stdout(sys.stderr):
+            run_batch(
+                path=output_folder_path,
+                setup_paths=setup_paths,
+                analysis=run_analysis,
+                loaded_models=self.warm_models.models_for(output_folder_path),
+            )
+        return {"status": "completed"}
+
+    def ping(self):
+        """
+        :return: dict: The status of the server.
+        """
+        return {"status": "ready"}
+
+    def shutdown(self):
+        """
+        :return: dict: The status of the server, which stops after answering.
+        """
+        self.running = False
+        return {"status": "stopping"}
+
+
+def response(request_id, result=None, error=None, data=None):
+    """
+    :param request_id: The id of the answered request.
+    :param result: The result of the request, if it succeeded.
+    :param error (tuple): The code and message of the error, if the request failed.
+    :param data (str): Additional information on the error, e.g., the traceback.
+    :return: str: The JSON-RPC response.
+    """
+    message = {"jsonrpc": "2.0", "id": request_id}
+    if error is None:
+        message["result"] = result
+    else:
+        message["error"] = {"code": error[0], "message": error[1]}
+        if data is not None:
+            message["error"]["data"] = data
+    return json.dumps(message)
+
+
+def serve_stdio(server):
+    """
+    Serves the requests read from stdin, answering on stdout, until stdin closes or a shutdown is requested.
+
+    :param server (AnalysisServer): The server handling the requests.
+    :return: None
+    """
+    stdout = sys.stdout
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        answer = server.handle(line)
+        if answer is not None:
+            stdout.write(answer + "\n")
+            stdout.flush()
+        if not server.running:
+            break
+
+
+def serve_socket(server, socket_path):
+    """
+    Serves the requests of the clients connecting to a Unix domain socket, one client at a time (the analyses share the
+    working directory), until a shutdown is requested. A stale socket file is replaced.
+
+    :param server (AnalysisServer): The server handling the requests.
+    :param socket_path (str): The path of the socket.
+    :return: None
+    :side effect: Creates the socket file, and removes it on exit.
+    """
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                answer = server.handle(line.decode("utf-8"))
+                if answer is not None:
+                    self.wfile.write((answer + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                if not server.running:
+                    break
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    with socketserver.UnixStreamServer(socket_path, RequestHandler) as unix_server:
+        try:
+            while server.running:
+                unix_server.handle_request()
+        finally:
+            os.remove(socket_path)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Serves M3SA analyses to the OpenDC launcher.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="path of the Unix domain socket to listen on")
+    parser.add_argument("--stdio", action="store_true", help="serve on stdin/stdout instead of a socket")
+    parser.add_argument("--max-datasets", type=int, default=4,
+                        help="number of simulation outputs whose loaded models are kept in memory")
+    args = parser.parse_args(args)
+
+    socket_path = os.path.abspath(args.socket)
+    switch_to_root_dir()
+    server = AnalysisServer(max_datasets=args.max_datasets)
+    if args.stdio:
+        serve_stdio(server)
+    else:
+        print(f"M3SA analysis server listening on {socket_path}", file=sys.stderr)
+        serve_socket(server, socket_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+from batch import expand_variants, ingestion_key
+from input_parser import set_root_dir
+from simulator_specifics import SIMULATION_DATA_FILE
+
+"""
+Watch mode of M3SA. Analyzes a simulation output while the simulations are still running: the raw output is polled,
+each model is read once all its simulation data files are complete, and the analysis artifacts (the plot, the
+Meta-Model file and the statistics) are refreshed on a throttled schedule, instead of only once the whole sweep is done.
+
+The Meta-Model is maintained incrementally, from a running aggregate of the models' processed data (see
+running_aggregate.py), such that a new model is added without reading or aggregating the earlier ones again.
+
+The watcher runs until it is interrupted (SIGINT or SIGTERM, e.g., by the launcher once the simulations are done), or,
+with an idle timeout, until no file has completed for that long; it then reads the remaining files, and refreshes the
+artifacts one last time.
+
+Usage (from the python directory):
+    python watch.py <output_path> <setup_path>...
+    python watch.py --interval 5 --refresh 60 --idle-timeout 600 <output_path> <setup_path>
+"""
+
+PARQUET_MAGIC = b"PAR1"
+
+
+def is_complete(path, previous_size=None):
+    """
+    Checks whether a simulation data file has been written completely: a Parquet file ends with its footer, closed by
+    the magic bytes 'PAR1', which are written last. As a file being rewritten may still end with the magic bytes of an
+    earlier write, its size must also be unchanged since the previous poll, if given.
+
+    :param path (str): The path of the Parquet file.
+    :param previous_size (int): The size of the file at the previous poll, or None to skip the stability check.
+    :return: tuple: Whether the file is complete, and its current size (None if it does not exist).
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            if size < 2 * len(PARQUET_MAGIC):
+                return False, size
+            f.seek(-len(PARQUET_MAGIC), os.SEEK_END)
+            complete = f.read(len(PARQUET_MAGIC)) == PARQUET_MAGIC
+    except FileNotFoundError:
+        return False, None
+    return complete and (previous_size is None or previous_size == size), size
+
+
+class OutputWatcher:
+    """
+    Polls the raw output of a simulation, and reports the simulation folders whose data files (one per watched seed)
+    have all been written completely.
+
+    Attributes:
+        raw_output_path (str): The path of the raw output folder.
+        seeds (list of int): The seeds whose data files must be complete for a model to be read.
+        sizes (dict): The size of each incomplete data file at the previous poll.
+        completed (set of str): The simulation folders reported as complete so far.
+
+    Methods:
+        poll(final): Returns the simulation folders completed since the previous poll.
+    """
+
+    def __init__(self, output_folder_path, seeds):
+        """
+        :param output_folder_path (str): Path where the simulation output is stored.
+        :param seeds (list of int): The seeds whose data files must be complete for a model to be read.
+        """
+        self.raw_output_path = os.path.join(output_folder_path, "raw-output")
+        self.seeds = seeds
+        self.sizes = {}
+        self.completed = set()
+
+    def poll(self, final=False):
+        """
+        :param final (bool): True once the simulations are done, such that the files are not expected to grow anymore,
+            and need not keep their size across two polls.
+        :return: list of str: The simulation folders whose data files have all completed since the previous poll.
+        """
+        from ingestion import META_MODEL_FOLDER_NAME
+
+        if not os.path.isdir(self.raw_output_path):
+            return []
+
+        completed = []
+        for simulation_folder in os.listdir(self.raw_output_path):
+            if simulation_folder in self.completed or simulation_folder == META_MODEL_FOLDER_NAME:
+                continue
+
+            complete = True
+            for seed in self.seeds:
+                path = os.path.join(self.raw_output_path, simulation_folder, f"seed={seed}",
+                                    f"{SIMULATION_DATA_FILE}.parquet")
+                file_complete, self.sizes[path] = is_complete(path, None if final else self.sizes.get(path))
+                complete = complete and file_complete
+
+            if complete:
+                self.completed.add(simulation_folder)
+                completed.append(simulation_folder)
+        return completed
+
+
+class WatchedAnalysis:
+    """
+    The analysis of one variant (see batch.py) in watch mode: the models read so far, per simulation folder, and the
+    running aggregate of their processed data, from which the Meta-Model is refreshed.
+
+    Attributes:
+        user_input (dict): The user input of the variant.
+        path (str): Path where the simulation output is stored, and where the analysis is written.
+        models (dict): The models read so far, per simulation folder.
+        model_ids (dict): The id of each model read so far, per simulation folder, assigned when it is first read.
+        aggregate (RunningAggregate): The running aggregate of the models' processed data.
+        timestamps (np.array): The timestamps on which the aggregated data is aligned: the common timestamps of the
+            models read so far (see alignment.common_timestamps), on which refresh aligns the models as well.
+        pending (int): The number of models added since the last refresh.
+        profiler (Profiler): The measurements of every read and refresh of the variant, written at each refresh.
+
+    Methods:
+        ingest(simulation_folders, loaded_models): Reads and adds the models of newly completed simulation folders.
+        model_id(position): Returns the id of a model read for the first time.
+        aggregate_models(multimodel, models): Adds the processed data of new models to the running aggregate.
+        aligned_processed(multimodel, model): Returns the processed data of a model, on the timestamps of the aggregate.
+        refresh(): Writes the analysis artifacts of the models read so far.
+    """
+
+    def __init__(self, user_input, path):
+        """
+        :param user_input (dict): The user input of the variant.
+        :param path (str): Path where the simulation output is stored, and where the analysis is written.
+        """
+        from profiling import Profiler
+        from running_aggregate import RunningAggregate
+
+        # cProfile runs in the variant's profiler, over its reads and refreshes, rather than in each Multi-Model
+        self.user_input = dict(user_input, cprofile=False)
+        self.path = path
+        self.models = {}
+        self.model_ids = {}
+        self.aggregate = RunningAggregate()
+        self.timestamps = None
+        self.pending = 0
+        self.profiler = Profiler(enabled=user_input["profile"], cprofile=user_input["cprofile"])
+        self.profiler.pause()
+
+    def ingest(self, simulation_folders, loaded_models):
+        """
+        Reads the models of newly completed simulation folders, and adds their processed data to the running aggregate.
+        Variants which load the same data (see batch.ingestion_key) share the models read in the same poll.
+
+        :param simulation_folders (list of str): The simulation folders completed since the previous poll.
+        :param loaded_models (dict): The new models read by the other variants in this poll, per ingestion key.
+        :return: None
+        :side effect: Adds the new models to the models and the running aggregate, and assigns their ids.
+        """
+        from metadata_index import load_metadata_index
+        from models.MultiModel import MultiModel
+
+        metadata_index = load_metadata_index(os.path.join(os.getcwd(), self.path))
+        if not set(simulation_folders) & set(metadata_index.model_ids(self.user_input["model_filters"])):
+            return
+
+        key = ingestion_key(self.user_input)
+        self.profiler.resume()
+        try:
+            multimodel = MultiModel(
+                user_input=self.user_input,
+                path=self.path,
+                models=loaded_models.get(key),
+                simulation_folders=simulation_folders,
+            )
+        finally:
+            self.profiler.pause()
+        loaded_models.setdefault(key, multimodel.models[:])
+        self.profiler.records.extend(multimodel.profiler.records)
+
+        for model in multimodel.models:
+            simulation_folder = multimodel.metadata_index.simulation_folders[model.id]
+            self.model_ids.setdefault(simulation_folder, self.model_id(model.id))
+            self.models[simulation_folder] = model
+            self.pending += 1
+        if multimodel.plot_type != "cumulative":
+            self.aggregate_models(multimodel, multimodel.models)
+
+    def model_id(self, position):
+        """
+        The id of a model is assigned once, when it is first read, and kept across refreshes: its position among the
+        simulation folders at that time, unless a model read earlier already holds it (e.g., a folder which sorts
+        before the folders read so far, but completed after them), in which case it follows the ids assigned so far.
+
+        :param position (int): The position of the model's simulation folder among the folders of the raw output.
+        :return: int: The id of the model.
+        """
+        ids = set(self.model_ids.values())
+        return position if position not in ids else max(ids) + 1
+
+    def aggregate_models(self, multimodel, models):
+        """
+        The models read in different polls are aligned on different timestamps (see alignment.py), while refresh aligns
+        all the models read so far on their common timestamps. The aggregate is kept on those same timestamps: the new
+        models are added to it, unless they change the common timestamps (e.g., a model covering fewer timestamps, with
+        the 'intersect' alignment), in which case the aggregate is rebuilt from all the models, on the new timestamps.
+
+        :param multimodel (MultiModel): The Multi-Model which read the new models.
+        :param models (list of Model): The new models.
+        :return: None
+        :side effect: Updates the timestamps of the aggregate, and adds the models to it, or rebuilds it.
+        """
+        from alignment import common_timestamps, same_timestamps
+        from running_aggregate import RunningAggregate
+
+        previous = [] if self.timestamps is None else [self.timestamps]
+        timestamps = common_timestamps(previous + [model.timestamps for model in models], multimodel.model_alignment)
+        if self.timestamps is not None and not same_timestamps(timestamps, self.timestamps):
+            self.aggregate = RunningAggregate()
+            models = list(self.models.values())
+        self.timestamps = timestamps
+
+        for model in models:
+            self.aggregate.add(self.aligned_processed(multimodel, model))
+
+    def aligned_processed(self, multimodel, model):
+        """
+        A model whose timestamps differ from those of the aggregate is placed on them, and windowed again, as refresh
+        does (see ModelLoader.realign_models): a model with several seeds is windowed seed by seed, and its processed
+        data is the mean of the windowed seeds.
+
+        :param multimodel (MultiModel): The Multi-Model which read the model.
+        :param model (Model): A model read.
+        :return: np.array: The processed data of the model, aligned on the timestamps of the aggregate.
+        """
+        from alignment import align, same_timestamps
+
+        if same_timestamps(model.timestamps, self.timestamps):
+            return model.processed_sim_data
+
+        raw = model.seed_data if model.seed_data.ndim == 2 else model.raw_sim_data
+        raw = align(raw, model.timestamps, self.timestamps, multimodel.alignment_fill_value)
+        windowed = multimodel.aggregate_chunks(raw.astype(multimodel.precision, copy=False), multimodel.window_size)
+        return windowed.mean(axis=0) if windowed.ndim == 2 else windowed
+
+    def refresh(self):
+        """
+        Writes the analysis artifacts of the models read so far: the Meta-Model (from the running aggregate), the plot
+        (unless headless) and the statistics, with the models in the order of their ids (see model_id).
+
+        The models read so far are shared with the refreshed Multi-Model, which copies them; the ids are set on the
+        copies, as the models read may be shared with other variants.
+
+        :return: None
+        :side effect: Overwrites the plot, the Meta-Model file and the profile, and appends the statistics to the
+            analysis file.
+        """
+        from models.IncrementalMetaModel import IncrementalMetaModel
+        from models.MultiModel import MultiModel
+
+        if not self.models:
+            return
+
+        self.profiler.resume()
+        simulation_folders = sorted(self.models, key=self.model_ids.get)
+        multimodel = MultiModel(
+            user_input=self.user_input,
+            path=self.path,
+            models=[self.models[simulation_folder] for simulation_folder in simulation_folders],
+        )
+        for simulation_folder, model in zip(simulation_folders, multimodel.models):
+            model.id = self.model_ids[simulation_folder]
+        if self.user_input["multimodel"] and self.user_input["metamodel"]:
+            IncrementalMetaModel(multimodel, self.aggregate).output()
+
+        if not self.user_input["headless"]:
+            multimodel.generate_plot()
+
+        multimodel.output_stats()
+        self.profiler.records.extend(multimodel.profiler.records)
+        multimodel.profiler = self.profiler
+        multimodel.output_profile()
+        self.pending = 0
+        variant = f" ({self.user_input['variant']})" if self.user_input["variant"] else ""
+        print(f"[M3SA says] Refreshed {self.user_input['metric']}{variant} with {len(self.models)} model(s).",
+              flush=True)
+
+
+def watched_seeds(variants):
+    """
+    :param variants (list of dict): The user input of each variant.
+    :return: list of int: The seeds whose data files must be complete for a model to be read, over all the variants.
+    :raise ValueError: If a variant reads all the seeds, as the watcher cannot know when all of them are written.
+    """
+    seeds = set()
+    for user_input in variants:
+        if user_input["seed"] == "all":
+            raise ValueError("Watch mode cannot wait for 'all' seeds. Please enter the seeds as a list of integers.")
+        seeds.update(user_input["seed"] if isinstance(user_input["seed"], list) else [user_input["seed"]])
+    return sorted(seeds)
+
+
+def watch(path, setup_paths, interval=5.0, refresh=60.0, idle_timeout=None, overrides=None, stop=None):
+    """
+    Watches a simulation output, and analyzes its models as they complete, for every variant of the setup files.
+
+    :param path (str): Path where the simulation output is stored, and where the analysis is written.
+    :param setup_paths (list of str): The paths of the setup files.
+    :param interval (float): The time between two polls of the raw output, in seconds.
+    :param refresh (float): The minimum time between two refreshes of the artifacts, in seconds.
+    :param idle_timeout (float): The time after which the watcher stops if no model has completed, in seconds; None to
+        watch until stopped.
+    :param overrides (dict): Settings applied to every variant, over those of the setup files.
+    :param stop (threading.Event): Set to stop watching, e.g., by a signal handler.
+    :return: None
+    :side effect: Writes the analysis output of every variant, refreshed as the models complete.
+    """
+    variants = expand_variants(setup_paths, overrides)
+    watcher = OutputWatcher(os.path.join(os.getcwd(), path), watched_seeds(variants))
+    analyses = [WatchedAnalysis(user_input, path) for user_input in variants]
+    stop = stop or threading.Event()
+
+    last_refresh = last_completion = time.monotonic()
+    while True:
+        final = stop.is_set()
+        simulation_folders = filter_folders(path, variants, watcher.poll(final=final))
+        if simulation_folders:
+            last_completion = time.monotonic()
+            loaded_models = {}
+            for analysis in analyses:
+                analysis.ingest(simulation_folders, loaded_models)
+
+        now = time.monotonic()
+        if final or now - last_refresh >= refresh:
+            for analysis in analyses:
+                if analysis.pending or final:
+                    analysis.refresh()
+            last_refresh = now
+
+        if final:
+            return
+        if idle_timeout is not None and now - last_completion >= idle_timeout:
+            stop.set()
+        else:
+            stop.wait(interval)
+
+
+def filter_folders(path, variants, simulation_folders):
+    """
+    :param path (str): Path where the simulation output is stored.
+    :param variants (list of dict): The user input of each variant.
+    :param simulation_folders (list of str): The completed simulation folders.
+    :return: list of str: The completed folders which match the model filters of at least one variant.
+    """
+    from metadata_index import load_metadata_index
+
+    if not simulation_folders:
+        return []
+
+    metadata_index = load_metadata_index(os.path.join(os.getcwd(), path))
+    matching = set()
+    for user_input in variants:
+        matching.update(metadata_index.model_ids(user_input["model_filters"]))
+    return [folder for folder in simulation_folders if folder in matching]
+
+
+def main(args=None):
+    """
+    :param args (list of str): The command line arguments; sys.argv[1:] if None.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Watch mode of M3SA: analyzes the models as the simulations finish.")
+    parser.add_argument("output_path", help="path of the simulation output, relative to the project root")
+    parser.add_argument("setup_paths", nargs="+", help="path(s) of the setup file(s), relative to the project root")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between two polls of the raw output")
+    parser.add_argument("--refresh", type=float, default=60.0, help="minimum seconds between two refreshes")
+    parser.add_argument("--idle-timeout", type=float, help="stop after this many seconds without a completed model")
+    parser.add_argument("--headless", action="store_true", help="skip rendering the plot(s)")
+    parser.add_argument("--root", help="the project root; searched for (by its README.md) if not given")
+    args = parser.parse_args(args)
+
+    set_root_dir(args.root)
+    stop = threading.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: stop.set())
+
+    watch(
+        path=args.output_path,
+        setup_paths=args.setup_paths,
+        interval=args.interval,
+        refresh=args.refresh,
+        idle_timeout=args.idle_timeout,
+        overrides={"headless": True} if args.headless else None,
+        stop=stop,
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
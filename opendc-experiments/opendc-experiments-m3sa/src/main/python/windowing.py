@@ -0,0 +1,61 @@
+from functools import partial
+
+import numpy as np
+
+from constants import PERCENTILE_PATTERN, is_window_function
+
+"""
+Windowing engine of M3SA. Splits a data series into consecutive windows and reduces each window to a single value.
+"""
+
+WINDOW_FUNCTIONS = {
+    "mean": np.mean,
+    "median": np.median,
+    "min": np.min,
+    "max": np.max,
+    "sum": np.sum,
+}
+
+
+def get_window_function(name):
+    """
+    Returns the reduction behind a window function name. Every reduction takes an array and an 'axis' keyword.
+
+    :param name: The name of the window function (see is_window_function).
+    :return: function: The reduction.
+    :raise ValueError: If the window function is not supported.
+    """
+    if name in WINDOW_FUNCTIONS:
+        return WINDOW_FUNCTIONS[name]
+    if is_window_function(name):
+        return partial(np.percentile, q=float(PERCENTILE_PATTERN.match(name).group(1)))
+    raise ValueError(
+        f"Window function not recognized. Please select between {list(WINDOW_FUNCTIONS)} or a percentile (e.g., 'p95')."
+    )
+
+
+def aggregate_windows(np_array, window_size, window_function="mean"):
+    """
+    Reduces each window of 'window_size' consecutive samples to a single value. The full windows are reduced together,
+    as one reduction over a (windows x window_size) view of the array; the trailing partial window, if any, is reduced
+    over the samples it holds. A 2-D array (e.g., seeds x samples) is windowed row by row, in the same reduction.
+
+    :param np_array: Array of numerical data to be windowed, along its last axis.
+    :param window_size: The number of samples in each window.
+    :param window_function: The name of the reduction applied to each window (see is_window_function).
+    :return: np.array: One value per window (per row); the input itself if the window size is 1.
+    """
+    if window_size == 1:
+        return np_array
+
+    reduction = get_window_function(window_function)
+    np_array = np.asarray(np_array)
+    samples = np_array.shape[-1]
+    full_windows = samples // window_size
+    split = full_windows * window_size
+
+    aggregated = reduction(np_array[..., :split].reshape(np_array.shape[:-1] + (full_windows, window_size)), axis=-1)
+    if split < samples:
+        tail = reduction(np_array[..., split:], axis=-1)
+        aggregated = np.concatenate([aggregated, np.expand_dims(tail, axis=-1)], axis=-1)
+    return aggregated